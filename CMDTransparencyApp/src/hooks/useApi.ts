@@ -1,6 +1,6 @@
 import { useState, useEffect, useCallback } from 'react';
 import { projectsApi, reviewsApi, handleApiError } from '../services/apiService';
-import { Project, ProjectFilter, Statistics, FilterOptions, CitizenReport, ReviewSummary } from '../types';
+import { Project, ProjectField, ProjectBatchResponse, ProjectFilter, Statistics, FilterOptions, CitizenReport, ReviewSummary } from '../types';
 
 // Generic API hook
 interface ApiState<T> {
@@ -52,6 +52,13 @@ export const useProject = (projectId: string) => {
   );
 };
 
+export const useProjectsBatch = (projectIds: string[], fields?: ProjectField[], reportsLimit?: number) => {
+  return useApiCall<ProjectBatchResponse>(
+    () => projectsApi.getProjectsBatch(projectIds, fields, reportsLimit),
+    [projectIds.join(','), fields?.join(','), reportsLimit]
+  );
+};
+
 export const useStatistics = () => {
   return useApiCall<Statistics>(
     () => projectsApi.getStatistics(),
@@ -1,7 +1,7 @@
 import axios, { AxiosResponse } from 'axios';
 import { Platform } from 'react-native';
 import AsyncStorage from '@react-native-async-storage/async-storage';
-import { Project, ProjectFilter, Statistics, FilterOptions, CitizenReport, ReviewSubmission, ReviewSubmissionResponse, ImageUploadResponse, ReviewSummary } from '../types';
+import { Project, ProjectField, ProjectBatchResponse, ProjectFilter, Statistics, FilterOptions, CitizenReport, ReviewSubmission, ReviewSubmissionResponse, ImageUploadResponse, ReviewSummary } from '../types';
 
 // API Configuration
 const getApiBaseUrl = () => {
@@ -134,6 +134,30 @@ export const projectsApi = {
     };
   },
 
+  // Get several projects in one request, optionally only some of their fields
+  getProjectsBatch: async (
+    projectIds: string[],
+    fields?: ProjectField[],
+    reportsLimit?: number
+  ): Promise<ProjectBatchResponse> => {
+    const response: AxiosResponse<ProjectBatchResponse> = await apiClient.post('/api/projects/batch', {
+      ids: projectIds,
+      fields,
+      reports_limit: reportsLimit,
+    });
+    return {
+      ...response.data,
+      projects: response.data.projects.map(project => ({
+        ...project,
+        citizen_reports: project.citizen_reports?.map(report => ({
+          ...report,
+          work_completed: Boolean(report.work_completed),
+          verified: Boolean(report.verified),
+        })),
+      })),
+    };
+  },
+
   // Get project progress
   getProjectProgress: async (projectId: string): Promise<any> => {
     const response = await apiClient.get(`/api/projects/${projectId}/progress`);
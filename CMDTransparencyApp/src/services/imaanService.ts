@@ -17,34 +17,42 @@ export interface IMaanResponse {
 
 class IMaanApiService {
   private baseURL: string;
+  private sessionId: string | null = null;
 
   constructor() {
     this.baseURL = RAG_API_BASE_URL;
   }
 
   /**
-   * Send text message to e-maan RAG chatbot
+   * Start a new conversation (the server forgets the old one)
    */
-  async sendTextMessage(message: string, chatHistory: any[] = []): Promise<IMaanResponse> {
+  async resetSession(): Promise<void> {
+    const sessionId = this.sessionId;
+    this.sessionId = null;
+    if (!sessionId) {
+      return;
+    }
+    try {
+      await axios.delete(`${this.baseURL}/chatbot/sessions/${sessionId}`, { timeout: 10000 });
+    } catch (error) {
+      // Sessions also expire on their own
+      console.warn('⚠️ Failed to delete chat session:', error);
+    }
+  }
+
+  /**
+   * Send text message to e-maan RAG chatbot.
+   * The conversation history is kept on the server; only the new message
+   * and the session id are sent.
+   */
+  async sendTextMessage(message: string, _chatHistory: any[] = []): Promise<IMaanResponse> {
     try {
       console.log('🌐 Sending request to:', `${this.baseURL}/chatbot`);
       console.log('📝 Message:', message);
-      
-      // Convert chat history to the expected format
-      const messages: ChatMessage[] = chatHistory
-        .filter(msg => msg.role === 'user' || msg.role === 'assistant')
-        .map(msg => ({
-          role: msg.role,
-          content: msg.content
-        }));
-
-      // Add the new message
-      messages.push({
-        role: 'user',
-        content: message
-      });
 
-      const requestData = { messages };
+      const requestData = this.sessionId
+        ? { session_id: this.sessionId, message }
+        : { message };
       console.log('📤 Request data:', requestData);
 
       const response = await axios.post(`${this.baseURL}/chatbot`, requestData, {
@@ -57,14 +65,12 @@ class IMaanApiService {
       console.log('📥 Response status:', response.status);
       console.log('📥 Response data:', response.data);
 
-      if (response.data && response.data.messages) {
-        // Get the last assistant message
-        const assistantMessage = response.data.messages
-          .filter((msg: ChatMessage) => msg.role === 'assistant')
-          .pop();
+      if (response.data && typeof response.data.response === 'string') {
+        // The server starts a new session if ours expired
+        this.sessionId = response.data.session_id || null;
 
         return {
-          response: assistantMessage?.content || 'माफ गर्नुहोस्, मैले तपाईंको प्रश्न बुझिन।'
+          response: response.data.response || 'माफ गर्नुहोस्, मैले तपाईंको प्रश्न बुझिन।'
         };
       } else {
         throw new Error('Invalid response format from server');
@@ -100,6 +100,24 @@ export interface FilterOptions {
   procurement_methods: string[];
 }
 
+// Fields that can be requested from POST /api/projects/batch (id is always returned)
+export type ProjectField =
+  | 'fiscal_year'
+  | 'ministry'
+  | 'budget_subtitle'
+  | 'procurement_plan'
+  | 'signatures'
+  | 'status'
+  | 'progress_percentage'
+  | 'location'
+  | 'citizen_reports'
+  | 'citizen_reports_count';
+
+export interface ProjectBatchResponse {
+  projects: Partial<Project>[];
+  missing: string[];
+}
+
 export interface ProjectFilter {
   ministry?: string;
   status?: string;
@@ -2,12 +2,17 @@
 Authentication dependencies for FastAPI
 """
 
+import logging
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 from app.auth.utils import verify_token
 from app.models.schemas import User, TokenData
 from app.auth.service_db import get_user_by_id
+from app.logging_config import LOG_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
 
 # Security scheme
 security = HTTPBearer()
@@ -37,7 +42,8 @@ def get_current_user(
         return user
 
     except Exception as e:
-        print(f"Auth error: {e}")
+        # Expired/invalid tokens are routine and frequent: sampled
+        logger.warning("Auth error: %s", e, extra={"sample_rate": LOG_SAMPLE_RATE})
         raise credentials_exception
 
 
@@ -2,6 +2,7 @@
 Authentication utilities for JWT token handling and password management
 """
 
+import logging
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Union
 from passlib.context import CryptContext
@@ -11,6 +12,8 @@ import os
 import hashlib
 from app.models.schemas import TokenData
 
+logger = logging.getLogger(__name__)
+
 # Security settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production-2024")
 ALGORITHM = "HS256"
@@ -40,7 +43,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         preprocessed_password = _preprocess_password(plain_password)
         return pwd_context.verify(preprocessed_password, hashed_password)
     except Exception as e:
-        print(f"Password verification error: {e}")
+        logger.error("Password verification error: %s", e)
         return False
 
 
@@ -50,7 +53,7 @@ def get_password_hash(password: str) -> str:
         preprocessed_password = _preprocess_password(password)
         return pwd_context.hash(preprocessed_password)
     except Exception as e:
-        print(f"Password hashing error: {e}")
+        logger.error("Password hashing error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Password processing error",
@@ -0,0 +1,497 @@
+"""
+Bulk import of procurement exports (CSV, JSON/JSON Lines, Excel)
+
+Rows are streamed from the file into a temporary staging table with
+PostgreSQL COPY (asyncpg copy_records_to_table), then merged into
+`projects` / `citizen_reports` with one set-based upsert per table, all in
+one transaction. Ministries referenced by imported projects are added too.
+
+Accepted layouts:
+- projects: one row per project. `procurement_plan`, `signatures` and
+  `location` may be JSON columns; otherwise columns that are not project
+  fields become procurement plan fields (dotted names nest, e.g.
+  `tender.open_date`) and lat/lng/address become the location. JSON
+  projects may carry their `citizen_reports` (the mock_data format).
+- reports: one row per citizen report with its `project_id`. Reports of
+  unknown projects are skipped.
+
+Rows that cannot be converted are skipped and logged. project_statistics
+is recalculated for every project the import touched, in the same
+transaction.
+
+Usage (from backend/):
+    python -m app.database.bulk_import plans_2081.xlsx
+    python -m app.database.bulk_import reports.csv --kind reports
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.database.config import database
+from app.database.statistics import statistics_upsert
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 10_000
+# Rejected rows logged individually before only counting them
+MAX_LOGGED_REJECTS = 20
+
+PROJECT_COLUMNS = (
+    "id",
+    "fiscal_year",
+    "ministry",
+    "budget_subtitle",
+    "procurement_plan",
+    "signatures",
+    "status",
+    "progress_percentage",
+    "location",
+    "created_at",
+    "updated_at",
+)
+REPORT_COLUMNS = (
+    "review_id",
+    "project_id",
+    "reporter_name",
+    "reporter_contact",
+    "review_type",
+    "review_text",
+    "work_completed",
+    "quality_rating",
+    "geolocation",
+    "photo_urls",
+    "verified",
+    "created_at",
+    "updated_at",
+)
+
+# Columns of a flat project export that are not procurement plan fields
+_PROJECT_FIELDS = set(PROJECT_COLUMNS) | {"lat", "lng", "address", "citizen_reports"}
+_PLAN_NUMBERS = {"sl_no": int, "no_of_package": int, "contract_amount": float}
+
+# Staging tables live for the import transaction only. CREATE TABLE AS
+# leaves out the NOT NULL constraints (citizen_reports.id is not staged);
+# _row keeps the file order so the last occurrence of a duplicate id wins.
+STAGING_DDL = f"""
+    CREATE TEMP TABLE staging_projects ON COMMIT DROP AS
+        SELECT {", ".join(PROJECT_COLUMNS)}, NULL::bigint AS _row
+        FROM projects WITH NO DATA;
+    CREATE TEMP TABLE staging_reports ON COMMIT DROP AS
+        SELECT {", ".join(REPORT_COLUMNS)}, NULL::bigint AS _row
+        FROM citizen_reports WITH NO DATA;
+"""
+
+MERGE_MINISTRIES = """
+    INSERT INTO ministries (name, created_at)
+    SELECT DISTINCT ministry, now() FROM staging_projects
+    ON CONFLICT (name) DO NOTHING
+"""
+
+MERGE_PROJECTS = """
+    INSERT INTO projects
+    (id, fiscal_year, ministry, budget_subtitle, procurement_plan,
+     signatures, status, progress_percentage, location, created_at, updated_at)
+    SELECT DISTINCT ON (id)
+        id, fiscal_year, ministry, budget_subtitle, procurement_plan,
+        signatures, status, progress_percentage, location, created_at, updated_at
+    FROM staging_projects
+    ORDER BY id, _row DESC
+    ON CONFLICT (id) DO UPDATE SET
+        fiscal_year = EXCLUDED.fiscal_year,
+        ministry = EXCLUDED.ministry,
+        budget_subtitle = EXCLUDED.budget_subtitle,
+        procurement_plan = EXCLUDED.procurement_plan,
+        signatures = EXCLUDED.signatures,
+        status = EXCLUDED.status,
+        progress_percentage = EXCLUDED.progress_percentage,
+        location = EXCLUDED.location,
+        updated_at = EXCLUDED.updated_at
+"""
+
+MERGE_REPORTS = """
+    INSERT INTO citizen_reports
+    (review_id, project_id, reporter_name, reporter_contact, review_type,
+     review_text, work_completed, quality_rating, geolocation, photo_urls,
+     verified, created_at, updated_at)
+    SELECT DISTINCT ON (s.review_id)
+        s.review_id, s.project_id, s.reporter_name, s.reporter_contact, s.review_type,
+        s.review_text, s.work_completed, s.quality_rating, s.geolocation, s.photo_urls,
+        s.verified, s.created_at, s.updated_at
+    FROM staging_reports s
+    JOIN projects p ON p.id = s.project_id
+    ORDER BY s.review_id, s._row DESC
+    ON CONFLICT (review_id) DO UPDATE SET
+        reporter_name = EXCLUDED.reporter_name,
+        reporter_contact = EXCLUDED.reporter_contact,
+        review_type = EXCLUDED.review_type,
+        review_text = EXCLUDED.review_text,
+        work_completed = EXCLUDED.work_completed,
+        quality_rating = EXCLUDED.quality_rating,
+        geolocation = EXCLUDED.geolocation,
+        photo_urls = EXCLUDED.photo_urls,
+        verified = EXCLUDED.verified,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+class RowError(ValueError):
+    """A source row that cannot be imported"""
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    rejected: int = 0
+    projects: int = 0
+    reports: int = 0
+    skipped_reports: int = 0
+    ministries: int = 0
+    statistics: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+# -------------------------------------------------------------------
+# Readers: every format yields plain dicts
+# -------------------------------------------------------------------
+def read_csv(path: Path) -> Iterator[Dict[str, Any]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+def read_json(path: Path) -> Iterator[Dict[str, Any]]:
+    """A JSON array of objects, or JSON Lines (.jsonl / .ndjson)"""
+    with open(path, encoding="utf-8") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            data = json.load(f)
+            yield from data if isinstance(data, list) else [data]
+
+
+def read_excel(path: Path, sheet: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """First row holds the column names. Needs `pip install openpyxl`."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise RuntimeError("Excel import needs openpyxl: pip install openpyxl") from e
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = (workbook[sheet] if sheet else workbook.active).iter_rows(
+            values_only=True
+        )
+        header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        for values in rows:
+            if any(v is not None for v in values):
+                yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def read_records(path: Path, sheet: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        return read_csv(path)
+    if suffix in (".json", ".jsonl", ".ndjson"):
+        return read_json(path)
+    if suffix in (".xlsx", ".xlsm"):
+        return read_excel(path, sheet)
+    raise ValueError(f"Unsupported file type: {path.name}")
+
+
+# -------------------------------------------------------------------
+# Conversion to table rows (types must match the columns for COPY)
+# -------------------------------------------------------------------
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _text(value) -> Optional[str]:
+    return None if _blank(value) else str(value).strip()
+
+
+def _int(value) -> Optional[int]:
+    return None if _blank(value) else int(float(value))
+
+
+def _float(value) -> Optional[float]:
+    if _blank(value):
+        return None
+    if isinstance(value, str):
+        value = value.replace(",", "")
+    return float(value)
+
+
+def _bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y", "t")
+    return bool(value)
+
+
+def _json_value(value):
+    """Decode JSON held in a text cell; other values pass through"""
+    if isinstance(value, str):
+        value = value.strip()
+        if value[:1] in ("{", "["):
+            return json.loads(value)
+        return value or None
+    return value
+
+
+def _timestamp(value, default: datetime) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    if _blank(value):
+        return default
+    return datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+
+
+def _required(record: Dict[str, Any], key: str) -> str:
+    value = _text(record.get(key))
+    if value is None:
+        raise RowError(f"missing {key}")
+    return value
+
+
+def _procurement_plan(record: Dict[str, Any]) -> dict:
+    if not _blank(record.get("procurement_plan")):
+        plan = _json_value(record["procurement_plan"])
+        if not isinstance(plan, dict):
+            raise RowError("procurement_plan is not a JSON object")
+        return plan
+
+    plan: Dict[str, Any] = {}
+    for key, value in record.items():
+        if not key or key in _PROJECT_FIELDS:
+            continue
+        if isinstance(value, datetime):
+            value = value.strftime("%d-%m-%Y")
+        elif key.split(".")[-1] in _PLAN_NUMBERS:
+            value = _PLAN_NUMBERS[key.split(".")[-1]](_float(value) or 0)
+        elif value is None:
+            value = ""
+        target = plan
+        *parents, leaf = key.split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = value
+    return plan
+
+
+def project_row(record: Dict[str, Any], row: int, now: datetime) -> tuple:
+    location = _json_value(record.get("location"))
+    if location is None and not _blank(record.get("lat")):
+        location = {
+            "lat": _float(record["lat"]),
+            "lng": _float(record.get("lng")),
+            "address": _text(record.get("address")),
+        }
+    values = {
+        "id": _required(record, "id"),
+        "fiscal_year": _required(record, "fiscal_year"),
+        "ministry": _required(record, "ministry"),
+        "budget_subtitle": _text(record.get("budget_subtitle")),
+        "procurement_plan": json.dumps(_procurement_plan(record)),
+        "signatures": json.dumps(_json_value(record.get("signatures"))),
+        "status": _text(record.get("status")) or "Planning",
+        "progress_percentage": _int(record.get("progress_percentage")) or 0,
+        "location": json.dumps(location),
+        "created_at": _timestamp(record.get("created_at"), now),
+        "updated_at": now,
+    }
+    return tuple(values[c] for c in PROJECT_COLUMNS) + (row,)
+
+
+def report_row(
+    record: Dict[str, Any], row: int, now: datetime, project_id: Optional[str] = None
+) -> tuple:
+    project_id = project_id or _required(record, "project_id")
+
+    geolocation = _json_value(record.get("geolocation"))
+    if geolocation is None and not _blank(record.get("lat")):
+        geolocation = {"lat": _float(record["lat"]), "lng": _float(record.get("lng"))}
+
+    photo_urls = _json_value(record.get("photo_urls"))
+    if isinstance(photo_urls, str):
+        photo_urls = [p.strip() for p in photo_urls.replace("|", ";").split(";")]
+    if not photo_urls and not _blank(record.get("photo_url")):
+        photo_urls = [record["photo_url"]]
+
+    rating = _int(record.get("quality_rating"))
+    if rating is not None and not 1 <= rating <= 5:
+        raise RowError(f"quality_rating {rating} is not between 1 and 5")
+
+    values = {
+        "review_id": _required(record, "review_id"),
+        "project_id": project_id,
+        "reporter_name": _text(record.get("reporter_name")),
+        "reporter_contact": _text(record.get("reporter_contact")),
+        "review_type": _text(record.get("review_type")) or "Progress Update",
+        "review_text": _text(record.get("review_text") or record.get("report_text"))
+        or "",
+        "work_completed": _bool(record.get("work_completed")),
+        "quality_rating": rating,
+        "geolocation": json.dumps(geolocation),
+        "photo_urls": json.dumps([p for p in photo_urls or [] if p]),
+        "verified": _bool(record.get("verified")),
+        "created_at": _timestamp(
+            record.get("created_at") or record.get("timestamp"), now
+        ),
+        "updated_at": now,
+    }
+    return tuple(values[c] for c in REPORT_COLUMNS) + (row,)
+
+
+def convert(
+    records: Iterable[Dict[str, Any]], kind: str, result: ImportResult
+) -> Iterator[Tuple[str, tuple]]:
+    """(staging table, row) pairs; bad rows are logged and counted"""
+    now = datetime.now()
+    for row, record in enumerate(records, start=1):
+        result.rows += 1
+        try:
+            if kind == "reports":
+                yield "staging_reports", report_row(record, row, now)
+                continue
+
+            project = project_row(record, row, now)
+            reports = [
+                report_row(
+                    {"review_id": f"REV-{project[0]}-{i + 1:03d}", **report},
+                    row,
+                    now,
+                    project_id=project[0],
+                )
+                for i, report in enumerate(
+                    _json_value(record.get("citizen_reports")) or []
+                )
+            ]
+        except (RowError, ValueError, TypeError, KeyError) as e:
+            result.rejected += 1
+            if result.rejected <= MAX_LOGGED_REJECTS:
+                logger.warning("Skipping row %d: %s", row, e)
+            continue
+        yield "staging_projects", project
+        for report in reports:
+            yield "staging_reports", report
+
+
+def _row_count(status: str) -> int:
+    """Row count of an asyncpg command status such as 'INSERT 0 42'"""
+    return int(status.split()[-1])
+
+
+async def import_file(
+    path,
+    kind: str = "projects",
+    sheet: Optional[str] = None,
+    batch_size: int = BATCH_SIZE,
+) -> ImportResult:
+    """Import one file; `database` must be connected"""
+    path = Path(path)
+    result = ImportResult()
+    started = time.perf_counter()
+    staged = {"staging_projects": 0, "staging_reports": 0}
+
+    async with database.connection() as connection:
+        raw = connection.raw_connection
+        async with raw.transaction():
+            await raw.execute(STAGING_DDL)
+
+            batches: Dict[str, List[tuple]] = {name: [] for name in staged}
+
+            async def flush(table: str) -> None:
+                columns = (
+                    PROJECT_COLUMNS if table == "staging_projects" else REPORT_COLUMNS
+                )
+                await raw.copy_records_to_table(
+                    table, records=batches[table], columns=columns + ("_row",)
+                )
+                staged[table] += len(batches[table])
+                batches[table].clear()
+
+            for table, row in convert(read_records(path, sheet), kind, result):
+                batches[table].append(row)
+                if len(batches[table]) >= batch_size:
+                    await flush(table)
+            for table in batches:
+                if batches[table]:
+                    await flush(table)
+            logger.info(
+                "Staged %d projects and %d reports from %s",
+                staged["staging_projects"],
+                staged["staging_reports"],
+                path.name,
+            )
+
+            if staged["staging_projects"]:
+                result.ministries = _row_count(await raw.execute(MERGE_MINISTRIES))
+                result.projects = _row_count(await raw.execute(MERGE_PROJECTS))
+            if staged["staging_reports"]:
+                result.reports = _row_count(await raw.execute(MERGE_REPORTS))
+                distinct = await raw.fetchval(
+                    "SELECT count(DISTINCT review_id) FROM staging_reports"
+                )
+                result.skipped_reports = distinct - result.reports
+
+            result.statistics = _row_count(
+                await raw.execute(
+                    statistics_upsert(
+                        "p.id IN (SELECT id FROM staging_projects"
+                        " UNION SELECT project_id FROM staging_reports)"
+                    )
+                )
+            )
+
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+async def _run(args) -> None:
+    await database.connect()
+    try:
+        for path in args.files:
+            result = await import_file(path, args.kind, args.sheet, args.batch_size)
+            print(
+                f"{path}: {result.rows} rows in {result.seconds:.1f}s "
+                f"({result.rows_per_second:,.0f} rows/s) - "
+                f"{result.projects} projects, {result.reports} reports, "
+                f"{result.ministries} new ministries, "
+                f"{result.statistics} statistics refreshed; "
+                f"{result.rejected} rows rejected, "
+                f"{result.skipped_reports} reports of unknown projects skipped"
+            )
+    finally:
+        await database.disconnect()
+
+
+def main():
+    from app.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--kind", choices=("projects", "reports"), default="projects")
+    parser.add_argument("--sheet", help="Excel sheet (default: the active one)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    setup_logging(fmt="text")
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Opt-in query profiler for DatabaseService (DB_PROFILE=1)
+
+Every query that goes through the shared `databases` instance is recorded
+against the request that issued it. Logged (logger app.database.profiler):
+- slow queries (over DB_SLOW_QUERY_MS): fingerprint, duration, rows, route
+- N+1 patterns: one fingerprint run DB_N_PLUS_ONE_THRESHOLD+ times in a
+  request with different parameters
+- duplicates: the same query with the same parameters run more than once
+  in a request
+
+DB_PROFILE_EXPLAIN=plan|analyze also captures the execution plan of each
+offending fingerprint, once per process. `analyze` runs EXPLAIN ANALYZE on
+plain SELECTs only, inside a transaction that is rolled back; other
+statements (including WITH ... INSERT/UPDATE CTEs) get a plain EXPLAIN.
+"""
+
+import asyncio
+import contextvars
+import functools
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.metrics import current_request, route_template
+
+logger = logging.getLogger(__name__)
+
+DB_PROFILE = os.getenv("DB_PROFILE", "0") == "1"
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "5"))
+# off | plan | analyze
+DB_PROFILE_EXPLAIN = os.getenv("DB_PROFILE_EXPLAIN", "off").lower()
+
+PROFILED_OPERATIONS = ("fetch_all", "fetch_one", "fetch_val", "execute", "execute_many")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(query: str) -> str:
+    """Query text with literals replaced and whitespace collapsed"""
+    query = _STRING_LITERAL.sub("?", query)
+    query = _NUMBER_LITERAL.sub("?", query)
+    query = _IN_LIST.sub("IN (?)", query)
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def fingerprint_id(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def _row_count(operation: str, result: Any) -> Optional[int]:
+    if operation == "fetch_all":
+        return len(result)
+    if operation in ("fetch_one", "fetch_val"):
+        return 0 if result is None else 1
+    return None
+
+
+def _values_key(values: Any) -> str:
+    if isinstance(values, dict):
+        return repr(sorted(values.items()))
+    return repr(values)
+
+
+def _shorten(text: str, limit: int = 300) -> str:
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+@dataclass
+class QueryRecord:
+    fingerprint: str
+    values_key: str
+    duration_ms: float
+    rows: Optional[int]
+
+
+@dataclass
+class RequestQueries:
+    """Queries issued while handling one request"""
+
+    route: str
+    records: List[QueryRecord] = field(default_factory=list)
+
+
+current_queries: contextvars.ContextVar[Optional[RequestQueries]] = (
+    contextvars.ContextVar("current_queries", default=None)
+)
+
+
+class QueryProfiler:
+    def __init__(
+        self,
+        database,
+        slow_ms: float = DB_SLOW_QUERY_MS,
+        n_plus_one_threshold: int = DB_N_PLUS_ONE_THRESHOLD,
+        explain: str = DB_PROFILE_EXPLAIN,
+    ):
+        self.database = database
+        self.slow_ms = slow_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.explain = explain if explain in ("plan", "analyze") else None
+        self._raw_fetch_all = database.fetch_all
+        # Fingerprints whose plan was already captured
+        self._explained = set()
+        # Fingerprint -> a sample query text and its latest parameters
+        self._queries: Dict[str, str] = {}
+        self._last_values: Dict[str, Any] = {}
+
+    def install(self) -> None:
+        """Wrap the database's query methods"""
+        for operation in PROFILED_OPERATIONS:
+            method = getattr(self.database, operation)
+
+            @functools.wraps(method)
+            async def profiled(*args, _method=method, _operation=operation, **kwargs):
+                started = time.perf_counter()
+                result = await _method(*args, **kwargs)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self._record(_operation, args, kwargs, result, elapsed_ms)
+                return result
+
+            setattr(self.database, operation, profiled)
+
+    def _record(self, operation, args, kwargs, result, elapsed_ms) -> None:
+        query = kwargs.get("query", args[0] if args else "")
+        values = kwargs.get("values", args[1] if len(args) > 1 else None)
+        if not isinstance(query, str):
+            # SQLAlchemy Core clause
+            query = str(query)
+
+        text = fingerprint(query)
+        fp = fingerprint_id(text)
+        self._queries.setdefault(fp, query)
+        if operation != "execute_many":
+            self._last_values[fp] = values
+        rows = _row_count(operation, result)
+
+        request = current_queries.get()
+        route = request.route if request else "-"
+        if request is not None:
+            request.records.append(
+                QueryRecord(fp, _values_key(values), elapsed_ms, rows)
+            )
+
+        if elapsed_ms >= self.slow_ms:
+            logger.warning(
+                "Slow query %s %.1fms rows=%s route=%s: %s",
+                fp,
+                elapsed_ms,
+                rows,
+                route,
+                _shorten(text),
+                extra={
+                    "event": "slow_query",
+                    "fingerprint": fp,
+                    "duration_ms": round(elapsed_ms, 1),
+                    "rows": rows,
+                    "route": route,
+                },
+            )
+            self._maybe_explain(fp, values)
+
+    def finish_request(self, request: RequestQueries) -> None:
+        """Report N+1 and duplicate queries of a finished request"""
+        by_fingerprint = defaultdict(list)
+        for record in request.records:
+            by_fingerprint[record.fingerprint].append(record)
+
+        for fp, records in by_fingerprint.items():
+            text = _shorten(fingerprint(self._queries.get(fp, "")))
+            total_ms = sum(r.duration_ms for r in records)
+            distinct = {r.values_key for r in records}
+
+            if len(distinct) >= self.n_plus_one_threshold:
+                logger.warning(
+                    "N+1 suspected on %s: %s ran %dx (%.1fms total): %s",
+                    request.route,
+                    fp,
+                    len(records),
+                    total_ms,
+                    text,
+                    extra={
+                        "event": "n_plus_one",
+                        "fingerprint": fp,
+                        "count": len(records),
+                        "route": request.route,
+                    },
+                )
+                self._maybe_explain(fp, self._last_values.get(fp))
+
+            duplicates = len(records) - len(distinct)
+            if duplicates:
+                logger.warning(
+                    "Duplicate queries on %s: %s repeated %dx with identical "
+                    "parameters: %s",
+                    request.route,
+                    fp,
+                    duplicates,
+                    text,
+                    extra={
+                        "event": "duplicate_query",
+                        "fingerprint": fp,
+                        "count": duplicates,
+                        "route": request.route,
+                    },
+                )
+
+    def _maybe_explain(self, fp: str, values) -> None:
+        if not self.explain or fp in self._explained:
+            return
+        if values is not None and not isinstance(values, dict):
+            # execute_many parameter lists cannot be explained
+            return
+        query = self._queries[fp]
+        # EXPLAIN ANALYZE executes the statement: never for writes, and a
+        # leading WITH may hold INSERT/UPDATE/DELETE (refresh_statistics)
+        analyze = self.explain == "analyze" and query.lstrip().lower().startswith(
+            "select"
+        )
+        self._explained.add(fp)
+        asyncio.ensure_future(self._explain(fp, query, values, analyze))
+
+    async def _explain(self, fp: str, query: str, values, analyze: bool) -> None:
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+        # Not part of any request's figures
+        token = current_queries.set(None)
+        metrics_token = current_request.set(None)
+        try:
+            if analyze:
+                # Rolled back, in case the SELECT calls volatile functions
+                async with self.database.transaction(force_rollback=True):
+                    rows = await self._raw_fetch_all(
+                        query=prefix + query, values=values
+                    )
+            else:
+                rows = await self._raw_fetch_all(query=prefix + query, values=values)
+            plan = "\n".join(f"    {row[0]}" for row in rows)
+            logger.info(
+                "Plan for %s:\n%s",
+                fp,
+                plan,
+                extra={"event": "explain", "fingerprint": fp},
+            )
+        except Exception as e:
+            logger.warning("EXPLAIN failed for %s: %s", fp, e)
+        finally:
+            current_queries.reset(token)
+            current_request.reset(metrics_token)
+
+
+class QueryProfilerMiddleware:
+    """Collects each request's queries and reports N+1/duplicates at the end"""
+
+    def __init__(self, app, profiler: QueryProfiler, routes_app=None):
+        self.app = app
+        self.profiler = profiler
+        self.routes_app = routes_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = (
+            f"{scope['method']} {route_template(self.routes_app or self.app, scope)}"
+        )
+        request = RequestQueries(route=route)
+        token = current_queries.set(request)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_queries.reset(token)
+            self.profiler.finish_request(request)
+
+
+def install_profiler(app, database) -> Optional[QueryProfiler]:
+    """Enable the profiler on `app` if DB_PROFILE=1"""
+    if not DB_PROFILE:
+        return None
+    profiler = QueryProfiler(database)
+    profiler.install()
+    app.add_middleware(QueryProfilerMiddleware, profiler=profiler, routes_app=app)
+    logger.info(
+        "Query profiler on: slow >= %.0fms, N+1 >= %d, explain=%s",
+        DB_SLOW_QUERY_MS,
+        DB_N_PLUS_ONE_THRESHOLD,
+        DB_PROFILE_EXPLAIN,
+    )
+    return profiler
@@ -8,9 +8,49 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, text
 from app.database.config import database
 from app.database.models import Project, CitizenReport, Ministry, ProjectStatistics
+from app.database.statistics import (
+    RebuildResult,
+    rebuild_statistics,
+    refresh_statistics,
+)
 import json
 from datetime import datetime
 
+# Project columns the batch endpoint can select, and the JSON ones among them
+# (with the value used when they are empty)
+BATCH_PROJECT_COLUMNS = (
+    "fiscal_year",
+    "ministry",
+    "budget_subtitle",
+    "procurement_plan",
+    "signatures",
+    "status",
+    "progress_percentage",
+    "location",
+)
+JSON_PROJECT_COLUMNS = {"procurement_plan": {}, "signatures": None, "location": None}
+
+
+def _format_citizen_report(report_row) -> Dict[Any, Any]:
+    """A citizen_reports row as returned with a project"""
+    return {
+        "review_id": report_row["review_id"],
+        "reporter_name": report_row["reporter_name"],
+        "reporter_contact": report_row["reporter_contact"],
+        "review_type": report_row["review_type"],
+        "report_text": report_row["review_text"],
+        "work_completed": report_row["work_completed"],
+        "quality_rating": report_row["quality_rating"],
+        "geolocation": (
+            json.loads(report_row["geolocation"]) if report_row["geolocation"] else None
+        ),
+        "photo_urls": (
+            json.loads(report_row["photo_urls"]) if report_row["photo_urls"] else []
+        ),
+        "verified": report_row["verified"],
+        "timestamp": report_row["created_at"].isoformat(),
+    }
+
 
 class DatabaseService:
     """Service layer for database operations"""
@@ -120,30 +160,7 @@ class DatabaseService:
         )
 
         # Format citizen reports
-        citizen_reports = []
-        for report_row in reports_rows:
-            report = {
-                "review_id": report_row["review_id"],
-                "reporter_name": report_row["reporter_name"],
-                "reporter_contact": report_row["reporter_contact"],
-                "review_type": report_row["review_type"],
-                "report_text": report_row["review_text"],
-                "work_completed": report_row["work_completed"],
-                "quality_rating": report_row["quality_rating"],
-                "geolocation": (
-                    json.loads(report_row["geolocation"])
-                    if report_row["geolocation"]
-                    else None
-                ),
-                "photo_urls": (
-                    json.loads(report_row["photo_urls"])
-                    if report_row["photo_urls"]
-                    else []
-                ),
-                "verified": report_row["verified"],
-                "timestamp": report_row["created_at"].isoformat(),
-            }
-            citizen_reports.append(report)
+        citizen_reports = [_format_citizen_report(row) for row in reports_rows]
 
         # Format project
         project = {
@@ -171,6 +188,80 @@ class DatabaseService:
 
         return project
 
+    @staticmethod
+    async def get_projects_by_ids(
+        project_ids: List[str],
+        fields: Optional[List[str]] = None,
+        reports_limit: Optional[int] = None,
+    ) -> Dict[str, Dict[Any, Any]]:
+        """
+        Get several projects by ID (one projects query, plus one query for
+        all their citizen reports if requested). Only `fields` are returned,
+        besides id; by default the same fields as get_project_by_id.
+        Returns the projects found, keyed by ID.
+        """
+        fields = set(fields or BATCH_PROJECT_COLUMNS + ("citizen_reports",))
+        columns = [column for column in BATCH_PROJECT_COLUMNS if column in fields]
+
+        select = ["p.id"] + [f"p.{column}" for column in columns]
+        join = ""
+        if "citizen_reports_count" in fields:
+            select.append("COALESCE(ps.total_reviews, 0) as review_count")
+            join = "LEFT JOIN project_statistics ps ON p.id = ps.project_id"
+        query = f"""
+            SELECT {", ".join(select)}
+            FROM projects p
+            {join}
+            WHERE p.id = ANY(:project_ids)
+        """
+        rows = await database.fetch_all(
+            query=query, values={"project_ids": list(project_ids)}
+        )
+
+        projects = {}
+        for row in rows:
+            project = {"id": row["id"]}
+            for column in columns:
+                value = row[column]
+                if column in JSON_PROJECT_COLUMNS:
+                    value = json.loads(value) if value else JSON_PROJECT_COLUMNS[column]
+                project[column] = value
+            if "citizen_reports_count" in fields:
+                project["citizen_reports_count"] = row["review_count"] or 0
+            projects[row["id"]] = project
+
+        if "citizen_reports" in fields and projects:
+            values = {"project_ids": list(projects)}
+            if reports_limit:
+                reports_query = """
+                    SELECT * FROM (
+                        SELECT r.*, ROW_NUMBER() OVER (
+                            PARTITION BY r.project_id ORDER BY r.created_at DESC
+                        ) AS position
+                        FROM citizen_reports r
+                        WHERE r.project_id = ANY(:project_ids)
+                    ) ranked
+                    WHERE position <= :reports_limit
+                    ORDER BY project_id, created_at DESC
+                """
+                values["reports_limit"] = reports_limit
+            else:
+                reports_query = """
+                    SELECT * FROM citizen_reports
+                    WHERE project_id = ANY(:project_ids)
+                    ORDER BY project_id, created_at DESC
+                """
+            for project in projects.values():
+                project["citizen_reports"] = []
+            for report_row in await database.fetch_all(
+                query=reports_query, values=values
+            ):
+                projects[report_row["project_id"]]["citizen_reports"].append(
+                    _format_citizen_report(report_row)
+                )
+
+        return projects
+
     @staticmethod
     async def create_citizen_report(
         review_id: str,
@@ -366,92 +457,14 @@ class DatabaseService:
     @staticmethod
     async def recalculate_project_statistics(project_id: str):
         """Recalculate and update project statistics"""
+        await refresh_statistics("p.id = :project_id", {"project_id": project_id})
 
-        # Get all reports for the project
-        reports_query = "SELECT * FROM citizen_reports WHERE project_id = :project_id"
-        reports = await database.fetch_all(
-            query=reports_query, values={"project_id": project_id}
-        )
-
-        # Calculate statistics
-        total_reviews = len(reports)
-        work_completed_count = sum(1 for r in reports if r["work_completed"])
-        work_completed_percentage = (
-            (work_completed_count / total_reviews * 100) if total_reviews > 0 else 0
-        )
-
-        ratings = [r["quality_rating"] for r in reports if r["quality_rating"]]
-        avg_rating = sum(ratings) / len(ratings) if ratings else None
-
-        reviews_with_images = sum(
-            1 for r in reports if r["photo_urls"] and json.loads(r["photo_urls"])
-        )
-        verified_reviews = sum(1 for r in reports if r["verified"])
-
-        # Count review types
-        review_type_counts = {
-            "progress_updates": 0,
-            "quality_issues": 0,
-            "completion_verifications": 0,
-            "delay_reports": 0,
-            "fraud_alerts": 0,
-        }
-
-        for report in reports:
-            review_type = report["review_type"].lower().replace(" ", "_")
-            if review_type == "progress_update":
-                review_type_counts["progress_updates"] += 1
-            elif review_type == "quality_issue":
-                review_type_counts["quality_issues"] += 1
-            elif review_type == "completion_verification":
-                review_type_counts["completion_verifications"] += 1
-            elif review_type == "delay_report":
-                review_type_counts["delay_reports"] += 1
-            elif review_type == "fraud_alert":
-                review_type_counts["fraud_alerts"] += 1
-
-        # Update statistics
-        upsert_query = """
-            INSERT INTO project_statistics 
-            (project_id, total_reviews, work_completed_percentage, average_quality_rating,
-             reviews_with_images, verified_reviews, progress_updates, quality_issues,
-             completion_verifications, delay_reports, fraud_alerts, last_calculated) 
-            VALUES (:project_id, :total_reviews, :work_completed_percentage, :average_quality_rating,
-                    :reviews_with_images, :verified_reviews, :progress_updates, :quality_issues,
-                    :completion_verifications, :delay_reports, :fraud_alerts, :last_calculated)
-            ON CONFLICT (project_id) DO UPDATE SET
-                total_reviews = EXCLUDED.total_reviews,
-                work_completed_percentage = EXCLUDED.work_completed_percentage,
-                average_quality_rating = EXCLUDED.average_quality_rating,
-                reviews_with_images = EXCLUDED.reviews_with_images,
-                verified_reviews = EXCLUDED.verified_reviews,
-                progress_updates = EXCLUDED.progress_updates,
-                quality_issues = EXCLUDED.quality_issues,
-                completion_verifications = EXCLUDED.completion_verifications,
-                delay_reports = EXCLUDED.delay_reports,
-                fraud_alerts = EXCLUDED.fraud_alerts,
-                last_calculated = EXCLUDED.last_calculated
-        """
-
-        await database.execute(
-            query=upsert_query,
-            values={
-                "project_id": project_id,
-                "total_reviews": total_reviews,
-                "work_completed_percentage": work_completed_percentage,
-                "average_quality_rating": avg_rating,
-                "reviews_with_images": reviews_with_images,
-                "verified_reviews": verified_reviews,
-                "progress_updates": review_type_counts["progress_updates"],
-                "quality_issues": review_type_counts["quality_issues"],
-                "completion_verifications": review_type_counts[
-                    "completion_verifications"
-                ],
-                "delay_reports": review_type_counts["delay_reports"],
-                "fraud_alerts": review_type_counts["fraud_alerts"],
-                "last_calculated": datetime.now(),
-            },
-        )
+    @staticmethod
+    async def rebuild_all_statistics(
+        parallel: int = 1, ministries: Optional[List[str]] = None
+    ) -> RebuildResult:
+        """Recalculate statistics for all projects (or those of `ministries`)"""
+        return await rebuild_statistics(parallel=parallel, ministries=ministries)
 
     @staticmethod
     async def get_ministries() -> List[str]:
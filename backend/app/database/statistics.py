@@ -0,0 +1,176 @@
+"""
+Set-based project_statistics rebuild
+
+One INSERT ... SELECT ... GROUP BY ... ON CONFLICT computes the statistics
+of every selected project from citizen_reports inside PostgreSQL, instead
+of scanning each project's reports from Python. Used for single projects
+(DatabaseService.recalculate_project_statistics), after bulk imports, and
+for full rebuilds, which can run as parallel per-ministry chunks.
+
+Usage (from backend/):
+    python -m app.database.statistics
+    python -m app.database.statistics --parallel 4
+    python -m app.database.statistics --ministry "Ministry of Health"
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app.database.config import database
+
+logger = logging.getLogger(__name__)
+
+# Ratings of 0/NULL and empty photo lists do not count; review types are
+# matched case-insensitively ("Progress Update" -> progress_updates)
+_STATISTICS_UPSERT = """
+    INSERT INTO project_statistics
+    (project_id, total_reviews, work_completed_percentage, average_quality_rating,
+     reviews_with_images, verified_reviews, progress_updates, quality_issues,
+     completion_verifications, delay_reports, fraud_alerts, last_calculated)
+    SELECT
+        p.id,
+        COUNT(r.id),
+        COALESCE(100.0 * COUNT(r.id) FILTER (WHERE r.work_completed)
+                 / NULLIF(COUNT(r.id), 0), 0),
+        AVG(NULLIF(r.quality_rating, 0)),
+        COUNT(r.id) FILTER (WHERE CASE WHEN json_typeof(r.photo_urls) = 'array'
+                                       THEN json_array_length(r.photo_urls) > 0
+                                       ELSE false END),
+        COUNT(r.id) FILTER (WHERE r.verified),
+        COUNT(r.id) FILTER (WHERE replace(lower(r.review_type), ' ', '_') = 'progress_update'),
+        COUNT(r.id) FILTER (WHERE replace(lower(r.review_type), ' ', '_') = 'quality_issue'),
+        COUNT(r.id) FILTER (WHERE replace(lower(r.review_type), ' ', '_') = 'completion_verification'),
+        COUNT(r.id) FILTER (WHERE replace(lower(r.review_type), ' ', '_') = 'delay_report'),
+        COUNT(r.id) FILTER (WHERE replace(lower(r.review_type), ' ', '_') = 'fraud_alert'),
+        now()
+    FROM projects p
+    LEFT JOIN citizen_reports r ON r.project_id = p.id
+    {where}
+    GROUP BY p.id
+    ON CONFLICT (project_id) DO UPDATE SET
+        total_reviews = EXCLUDED.total_reviews,
+        work_completed_percentage = EXCLUDED.work_completed_percentage,
+        average_quality_rating = EXCLUDED.average_quality_rating,
+        reviews_with_images = EXCLUDED.reviews_with_images,
+        verified_reviews = EXCLUDED.verified_reviews,
+        progress_updates = EXCLUDED.progress_updates,
+        quality_issues = EXCLUDED.quality_issues,
+        completion_verifications = EXCLUDED.completion_verifications,
+        delay_reports = EXCLUDED.delay_reports,
+        fraud_alerts = EXCLUDED.fraud_alerts,
+        last_calculated = EXCLUDED.last_calculated
+"""
+
+
+def statistics_upsert(condition: Optional[str] = None) -> str:
+    """The upsert for the projects matching `condition` (SQL on `p`), or all"""
+    return _STATISTICS_UPSERT.format(where=f"WHERE {condition}" if condition else "")
+
+
+async def refresh_statistics(
+    condition: Optional[str] = None, values: Optional[dict] = None
+) -> int:
+    """Recalculate the statistics of the matching projects; returns the row count"""
+    query = f"""
+        WITH upserted AS ({statistics_upsert(condition)} RETURNING 1)
+        SELECT COUNT(*) FROM upserted
+    """
+    return await database.fetch_val(query=query, values=values)
+
+
+def _chunks(project_counts: Dict[str, int], parallel: int) -> List[List[str]]:
+    """Ministries split into `parallel` chunks of similar project counts"""
+    chunks: List[List[str]] = [[] for _ in range(parallel)]
+    sizes = [0] * parallel
+    for ministry, count in sorted(project_counts.items(), key=lambda m: -m[1]):
+        smallest = sizes.index(min(sizes))
+        chunks[smallest].append(ministry)
+        sizes[smallest] += count
+    return [chunk for chunk in chunks if chunk]
+
+
+@dataclass
+class RebuildResult:
+    projects: int
+    chunks: int
+    seconds: float
+
+
+async def rebuild_statistics(
+    parallel: int = 1, ministries: Optional[List[str]] = None
+) -> RebuildResult:
+    """
+    Rebuild project_statistics for all projects, or those of `ministries`.
+    With parallel > 1 the ministries are split into that many chunks, each
+    rebuilt by its own statement on its own pooled connection.
+    """
+    started = time.perf_counter()
+    if parallel <= 1:
+        if ministries:
+            projects = await refresh_statistics(
+                "p.ministry = ANY(:ministries)", {"ministries": ministries}
+            )
+        else:
+            projects = await refresh_statistics()
+        return RebuildResult(projects, 1, time.perf_counter() - started)
+
+    rows = await database.fetch_all(
+        "SELECT ministry, COUNT(*) AS projects FROM projects GROUP BY ministry"
+    )
+    project_counts = {
+        row["ministry"]: row["projects"]
+        for row in rows
+        if not ministries or row["ministry"] in ministries
+    }
+    chunks = _chunks(project_counts, parallel)
+
+    async def rebuild_chunk(chunk: List[str]) -> int:
+        count = await refresh_statistics(
+            "p.ministry = ANY(:ministries)", {"ministries": chunk}
+        )
+        logger.info(
+            "Rebuilt statistics of %d projects (%d ministries)", count, len(chunk)
+        )
+        return count
+
+    counts = await asyncio.gather(*(rebuild_chunk(chunk) for chunk in chunks))
+    return RebuildResult(sum(counts), len(chunks), time.perf_counter() - started)
+
+
+async def _run(args) -> None:
+    await database.connect()
+    try:
+        result = await rebuild_statistics(args.parallel, args.ministry)
+    finally:
+        await database.disconnect()
+    print(
+        f"Rebuilt statistics of {result.projects} projects "
+        f"in {result.chunks} chunk(s), {result.seconds:.1f}s"
+    )
+
+
+def main():
+    from app.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        help="Rebuild per-ministry chunks on this many connections",
+    )
+    parser.add_argument(
+        "--ministry", action="append", help="Only these ministries (repeatable)"
+    )
+    args = parser.parse_args()
+
+    setup_logging(fmt="text")
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
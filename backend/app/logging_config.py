@@ -0,0 +1,229 @@
+"""
+Structured logging for the API
+
+- JSON lines on stdout (LOG_FORMAT=json, default) or plain text (text)
+- Non-blocking: callers only enqueue records; formatting, redaction and
+  the stdout write happen on a QueueListener thread
+- Every record carries the request id of the request that logged it
+  (RequestIdMiddleware sets it from X-Request-ID or generates one)
+- Sampling: a record logged with extra={"sample_rate": r} is kept with
+  probability r; high-volume events use LOG_SAMPLE_RATE
+- Secrets (API keys, bearer tokens, JWTs, passwords and the values of
+  secret env vars) are redacted before anything is written
+
+Use module loggers as usual: `logger = logging.getLogger(__name__)`.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Fraction of high-volume events (access log, auth failures) that are kept
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+REQUEST_ID_HEADER = "x-request-id"
+SECRET_ENV_VARS = ("RAG_KEY", "OPENAI_API_KEY", "SECRET_KEY", "DB_PASSWORD")
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "request_id", default="-"
+)
+
+# Attributes every LogRecord has; anything else came in via `extra`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "sample_rate",
+}
+
+_SECRET_PATTERNS = [
+    # OpenAI-style API keys
+    (re.compile(r"\bsk-[A-Za-z0-9_\-]{16,}"), "sk-***"),
+    (re.compile(r"(?i)\bbearer\s+[A-Za-z0-9_\-\.=]+"), "Bearer ***"),
+    # JWTs (header.payload.signature)
+    (
+        re.compile(r"\beyJ[A-Za-z0-9_\-]+\.[A-Za-z0-9_\-]+\.[A-Za-z0-9_\-]+"),
+        "***jwt***",
+    ),
+    (
+        re.compile(
+            r"(?i)\b(password|passwd|secret|api_key|apikey|token)(\"?\s*[=:]\s*\"?)[^\s\",]+"
+        ),
+        r"\1\2***",
+    ),
+    # Credentials in connection URLs
+    (re.compile(r"(://[^:/\s]+:)[^@/\s]+@"), r"\1***@"),
+]
+
+
+def redact(text: str) -> str:
+    """Mask secrets in `text`"""
+    for name in SECRET_ENV_VARS:
+        value = os.getenv(name)
+        if value and len(value) >= 6 and value in text:
+            text = text.replace(value, "***")
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id (runs in the caller's context)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep records that carry `sample_rate` with that probability"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        return rate is None or rate >= 1 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": redact(record.getMessage()),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in record.__dict__.items():
+            if key in _RECORD_ATTRS or key in entry:
+                continue
+            entry[key] = redact(value) if isinstance(value, str) else value
+        if record.exc_text:
+            entry["exc"] = redact(record.exc_text)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        )
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        return redact(super().format(record))
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Like QueueHandler, but keeps the traceback apart from the message"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(fmt: str = LOG_FORMAT, level: str = LOG_LEVEL) -> None:
+    """Route the root logger through a queue to stdout (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(SamplingFilter())
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, stream)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def _clean_request_id(value: str) -> Optional[str]:
+    value = value.strip()
+    if 0 < len(value) <= 64 and re.fullmatch(r"[A-Za-z0-9._\-]+", value):
+        return value
+    return None
+
+
+access_logger = logging.getLogger("app.access")
+
+
+class RequestIdMiddleware:
+    """
+    Assign each request an id (the caller's X-Request-ID if it is sane),
+    echo it in the response and log a sampled access line.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for key, value in scope["headers"]:
+            if key == REQUEST_ID_HEADER.encode():
+                request_id = _clean_request_id(value.decode("latin-1"))
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.encode(), request_id.encode())
+                ]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            access_logger.info(
+                "%s %s %s",
+                scope["method"],
+                scope["path"],
+                status,
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": duration_ms,
+                    # Errors are always kept
+                    "sample_rate": 1.0 if status >= 500 else LOG_SAMPLE_RATE,
+                },
+            )
+            request_id_var.reset(token)
@@ -0,0 +1,288 @@
+"""
+Prometheus metrics for the API
+
+- PrometheusMiddleware: per-route latency, in-flight requests, status codes,
+  request/response sizes, and DB queries + DB time per request
+- instrument_database(): times every `databases` query and attributes it
+  to the request that issued it
+- rag_stage(): timings of the chatbot pipeline stages
+- ChatbotCollector: limiter / coalescing / session figures at scrape time
+
+Served by the /metrics endpoint in Prometheus text format. With several
+uvicorn workers, set PROMETHEUS_MULTIPROC_DIR so the workers' samples are
+aggregated; collectors added with register_collector() are exported too
+(with the figures of the worker that serves the scrape).
+"""
+
+import contextvars
+import functools
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.routing import Match
+
+# Label for requests that matched no route (keeps label cardinality bounded)
+UNMATCHED_ROUTE = "unmatched"
+
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route",
+    ["method", "route"],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests being handled",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+RESPONSES = Counter(
+    "http_responses_total",
+    "Responses by route and status code",
+    ["method", "route", "status"],
+)
+REQUEST_SIZE = Histogram(
+    "http_request_size_bytes",
+    "Request body size",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Response body size",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries issued per request",
+    ["method", "route"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Time spent in database queries per request",
+    ["method", "route"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Database query latency by operation",
+    ["operation"],
+)
+RAG_STAGE_LATENCY = Histogram(
+    "rag_stage_duration_seconds",
+    "Chatbot pipeline stage latency",
+    ["stage"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 45),
+)
+
+
+@dataclass
+class RequestStats:
+    """Per-request figures filled in while the request runs"""
+
+    method: str
+    route: str
+    db_queries: int = 0
+    db_seconds: float = 0.0
+
+
+current_request: contextvars.ContextVar[Optional[RequestStats]] = (
+    contextvars.ContextVar("current_request", default=None)
+)
+
+
+def route_template(app, scope) -> str:
+    """Path template of the route `scope` will be dispatched to"""
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE) or "/"
+    return UNMATCHED_ROUTE
+
+
+class PrometheusMiddleware:
+    """Pure ASGI middleware, so streamed responses are measured to the last byte"""
+
+    def __init__(self, app, routes_app=None):
+        self.app = app
+        # The FastAPI app whose routes provide the `route` label
+        self.routes_app = routes_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(self.routes_app or self.app, scope)
+        stats = RequestStats(method=method, route=route)
+        token = current_request.set(stats)
+
+        request_size = 0
+        response_size = 0
+        status = 500
+
+        async def receive_wrapper():
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status, response_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            current_request.reset(token)
+
+            REQUEST_LATENCY.labels(method, route).observe(elapsed)
+            RESPONSES.labels(method, route, str(status)).inc()
+            REQUEST_SIZE.labels(method, route).observe(request_size)
+            RESPONSE_SIZE.labels(method, route).observe(response_size)
+            REQUEST_DB_QUERIES.labels(method, route).observe(stats.db_queries)
+            REQUEST_DB_SECONDS.labels(method, route).observe(stats.db_seconds)
+
+
+def record_query(operation: str, elapsed: float) -> None:
+    DB_QUERY_LATENCY.labels(operation).observe(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+
+
+DATABASE_OPERATIONS = ("fetch_all", "fetch_one", "fetch_val", "execute", "execute_many")
+
+
+def instrument_database(database) -> None:
+    """Wrap the query methods of a `databases.Database` instance (idempotent)"""
+    if getattr(database, "_metrics_instrumented", False):
+        return
+
+    for operation in DATABASE_OPERATIONS:
+        method = getattr(database, operation)
+
+        @functools.wraps(method)
+        async def timed(*args, _method=method, _operation=operation, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await _method(*args, **kwargs)
+            finally:
+                record_query(_operation, time.perf_counter() - started)
+
+        setattr(database, operation, timed)
+    database._metrics_instrumented = True
+
+
+@contextmanager
+def rag_stage(stage: str):
+    """Time one chatbot pipeline stage (retrieve, pack, llm, ...)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        RAG_STAGE_LATENCY.labels(stage).observe(time.perf_counter() - started)
+
+
+def observe_rag_stage(stage: str, seconds: float) -> None:
+    RAG_STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+class ChatbotCollector:
+    """Reads the chatbot's in-process load figures when Prometheus scrapes"""
+
+    def __init__(self, stats: Callable[[], dict]):
+        self.stats = stats
+
+    def collect(self):
+        stats = self.stats()
+        limiter = stats["limiter"]
+
+        gauges = {
+            "chatbot_llm_concurrency_limit": (
+                "Adaptive LLM concurrency limit",
+                "limit",
+            ),
+            "chatbot_llm_in_flight": ("LLM calls in flight", "in_flight"),
+            "chatbot_llm_queue_depth": (
+                "Requests waiting for an LLM slot",
+                "queue_depth",
+            ),
+        }
+        for name, (documentation, key) in gauges.items():
+            yield GaugeMetricFamily(name, documentation, value=limiter[key])
+
+        counters = {
+            "chatbot_llm_admitted": ("Requests admitted by the limiter", "admitted"),
+            "chatbot_llm_queued": ("Requests that waited for a slot", "queued"),
+            "chatbot_llm_rejected": ("Requests shed with 503", "rejected"),
+            "chatbot_llm_overloads": ("Provider overloads (429/timeout)", "overloads"),
+        }
+        for name, (documentation, key) in counters.items():
+            yield CounterMetricFamily(name, documentation, value=limiter[key])
+
+        yield CounterMetricFamily(
+            "chatbot_coalesced_requests",
+            "Requests that joined an identical in-flight question",
+            value=stats["coalesced"],
+        )
+        yield GaugeMetricFamily(
+            "chatbot_sessions", "Live server-side sessions", value=stats["sessions"]
+        )
+        yield GaugeMetricFamily(
+            "chatbot_ready",
+            "1 once chatbot warm-up has finished",
+            value=1 if stats["warmup"]["status"] in ("ready", "failed") else 0,
+        )
+
+
+# Custom collectors, also added to the per-scrape multiprocess registry
+_collectors = []
+
+
+def register_collector(collector) -> None:
+    """Export `collector` in both single- and multi-process mode"""
+    REGISTRY.register(collector)
+    _collectors.append(collector)
+
+
+def render_metrics():
+    """(body, content type) of the current metrics in Prometheus text format"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _collectors:
+            registry.register(collector)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -155,6 +155,32 @@ class ProcurementFilter(BaseModel):
     max_amount: Optional[float] = None
 
 
+class ProjectField(str, Enum):
+    """Project fields that can be requested from the batch endpoint"""
+
+    FISCAL_YEAR = "fiscal_year"
+    MINISTRY = "ministry"
+    BUDGET_SUBTITLE = "budget_subtitle"
+    PROCUREMENT_PLAN = "procurement_plan"
+    SIGNATURES = "signatures"
+    STATUS = "status"
+    PROGRESS_PERCENTAGE = "progress_percentage"
+    LOCATION = "location"
+    CITIZEN_REPORTS = "citizen_reports"
+    CITIZEN_REPORTS_COUNT = "citizen_reports_count"
+
+
+class ProjectBatchRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=200)
+    fields: Optional[List[ProjectField]] = Field(
+        None,
+        description="Fields to return besides id (default: everything the project detail returns)",
+    )
+    reports_limit: Optional[int] = Field(
+        None, ge=1, le=100, description="Most recent citizen reports per project"
+    )
+
+
 # Authentication Models
 class UserBase(BaseModel):
     name: str = Field(..., min_length=2, max_length=100)
@@ -0,0 +1,239 @@
+"""
+Low-overhead sampling profiler for the live process
+
+A background thread snapshots every thread's Python stack with
+sys._current_frames() at a fixed interval (py-spy style: the profiled code
+is not instrumented, so overhead stays flat). Profiles render as
+speedscope JSON (https://www.speedscope.app) or as collapsed stacks for
+flamegraph.pl / inferno.
+
+Two modes, both admin only:
+- the whole process for N seconds (see app/routers/admin.py)
+- a single request, flagged with the `X-Profile: 1` header; the response
+  carries an `X-Profile-Id` to download the profile with
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+# Per-request profiles kept in memory for download
+PROFILE_KEEP_REQUESTS = int(os.getenv("PROFILE_KEEP_REQUESTS", "20"))
+
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "x-profile-id"
+
+Frame = Tuple[str, str, int]
+
+
+class Profile:
+    """Aggregated stack samples per thread"""
+
+    def __init__(self, name: str, interval: float):
+        self.name = name
+        self.interval = interval
+        self.frames: Dict[Frame, int] = {}
+        self.stacks: Dict[str, Counter] = {}
+        self.started = time.time()
+        self.duration = 0.0
+        self.samples = 0
+
+    def _frame_index(self, frame: Frame) -> int:
+        index = self.frames.get(frame)
+        if index is None:
+            index = self.frames[frame] = len(self.frames)
+        return index
+
+    def add(self, thread_name: str, frames: List[Frame]) -> None:
+        stack = tuple(self._frame_index(f) for f in frames)
+        self.stacks.setdefault(thread_name, Counter())[stack] += 1
+
+    def speedscope(self) -> dict:
+        frames = [
+            {"name": name, "file": file, "line": line}
+            for (file, name, line) in self.frames
+        ]
+        profiles = []
+        for thread_name, stacks in sorted(self.stacks.items()):
+            samples = [list(stack) for stack in stacks]
+            weights = [count * self.interval for count in stacks.values()]
+            profiles.append(
+                {
+                    "type": "sampled",
+                    "name": thread_name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            )
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "cmd-transparency-api",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def collapsed(self) -> str:
+        """One `thread;outer;...;inner count` line per distinct stack"""
+        names = [
+            f"{name} ({os.path.basename(file)}:{line})"
+            for (file, name, line) in self.frames
+        ]
+        lines = []
+        for thread_name, stacks in sorted(self.stacks.items()):
+            for stack, count in stacks.items():
+                path = ";".join([thread_name] + [names[i] for i in stack])
+                lines.append(f"{path} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class StackSampler:
+    """Samples all threads from a daemon thread until stopped"""
+
+    def __init__(self, name: str, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = max(interval_ms, 1) / 1000
+        self.profile = Profile(name, self.interval)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        started = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append((code.co_filename, code.co_name, code.co_firstlineno))
+                    frame = frame.f_back
+                frames.reverse()
+                self.profile.add(thread_names.get(thread_id, str(thread_id)), frames)
+            self.profile.samples += 1
+        self.profile.duration = time.perf_counter() - started
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        self._thread.join()
+        return self.profile
+
+
+# One profile at a time per process keeps the overhead predictable
+_profiling = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def profile_process(
+    seconds: float, interval_ms: float = PROFILE_INTERVAL_MS
+) -> Profile:
+    """Sample the whole process for `seconds` (blocking)"""
+    if not _profiling.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already being recorded")
+    try:
+        sampler = StackSampler(f"process {os.getpid()}", interval_ms).start()
+        time.sleep(min(seconds, PROFILE_MAX_SECONDS))
+        return sampler.stop()
+    finally:
+        _profiling.release()
+
+
+# Finished per-request profiles by id, oldest first
+request_profiles: "OrderedDict[str, Profile]" = OrderedDict()
+
+
+def _is_admin(headers: Dict[str, str]) -> bool:
+    """Same check as the get_admin_user dependency, for the Authorization header"""
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from app.auth.dependencies import get_admin_user, get_current_user
+
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+        get_admin_user(get_current_user(credentials))
+        return True
+    except Exception:
+        return False
+
+
+class RequestProfilerMiddleware:
+    """
+    Profiles requests sent with `X-Profile: 1` by an admin. Samples cover
+    every thread of the worker while the request runs, so concurrent
+    requests show up too; profile on a quiet worker for a clean picture.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]
+        }
+        if headers.get(PROFILE_HEADER) != "1" or not await asyncio.to_thread(
+            _is_admin, headers
+        ):
+            await self.app(scope, receive, send)
+            return
+        if not _profiling.acquire(blocking=False):
+            # Another profile is running; serve the request unprofiled
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_ID_HEADER.encode(), profile_id.encode())
+                ]
+            await send(message)
+
+        sampler = StackSampler(f"{scope['method']} {scope['path']}").start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile = sampler.stop()
+            _profiling.release()
+            request_profiles[profile_id] = profile
+            while len(request_profiles) > PROFILE_KEEP_REQUESTS:
+                request_profiles.popitem(last=False)
+
+
+def render_profile(profile: Profile, fmt: str) -> Tuple[str, str, str]:
+    """(body, media type, file extension) of `profile` in `fmt`"""
+    if fmt == "collapsed":
+        return profile.collapsed(), "text/plain", "txt"
+    return json.dumps(profile.speedscope()), "application/json", "speedscope.json"
+
+
+def get_request_profile(profile_id: str) -> Optional[Profile]:
+    return request_profiles.get(profile_id)
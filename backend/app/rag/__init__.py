@@ -0,0 +1 @@
+# Shared RAG helpers used by the chatbot and the ingestion scripts in /rag
@@ -0,0 +1,145 @@
+"""
+Local BM25 keyword index for the RAG corpus
+Built by rag/rag_system.py next to the Chroma store and loaded by the chatbot
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BM25_INDEX_FILENAME = "bm25_index.json"
+
+# Devanagari digits are folded to ASCII so "२०४८" and "2048" match each other
+_DEVANAGARI_DIGITS = str.maketrans("०१२३४५६७८९", "0123456789")
+# Zero-width joiners show up inside Devanagari words extracted from PDFs
+_ZERO_WIDTH = dict.fromkeys(map(ord, "\u200b\u200c\u200d\ufeff"))
+# Latin words, numbers, and Devanagari letters + vowel signs (danda excluded)
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u0900-\u0963\u0971-\u097f]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split English/Nepali text into lowercase index terms"""
+    text = (text or "").translate(_ZERO_WIDTH).translate(_DEVANAGARI_DIGITS)
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 inverted index keyed by Chroma chunk id"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_terms: Dict[str, Dict[str, int]] = {}
+        self.doc_sources: Dict[str, Optional[str]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_terms
+
+    def add(self, doc_id: str, text: str, source: Optional[str] = None):
+        """Index (or re-index) a single chunk"""
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+        self._add_terms(doc_id, dict(Counter(tokenize(text))), source)
+
+    def _add_terms(self, doc_id: str, terms: Dict[str, int], source: Optional[str]):
+        length = sum(terms.values())
+        self.doc_terms[doc_id] = terms
+        self.doc_sources[doc_id] = source
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+
+    def remove(self, doc_id: str):
+        """Drop a chunk from the index if present"""
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.doc_sources.pop(doc_id, None)
+        self.total_length -= self.doc_lengths.pop(doc_id, 0)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def remove_source(self, source: str) -> List[str]:
+        """Drop every chunk that came from `source`; returns the removed ids"""
+        doc_ids = [d for d, s in self.doc_sources.items() if s == source]
+        for doc_id in doc_ids:
+            self.remove(doc_id)
+        return doc_ids
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return the top-k (doc_id, score) pairs for `query`"""
+        n_docs = len(self.doc_terms)
+        if not n_docs:
+            return []
+
+        avgdl = self.total_length / n_docs or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (
+                    1 - self.b + self.b * self.doc_lengths[doc_id] / avgdl
+                )
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def save(self, path: str):
+        """Write the index to disk atomically (tmp file + rename)"""
+        payload = {
+            "version": 1,
+            "k1": self.k1,
+            "b": self.b,
+            "documents": {
+                doc_id: {"source": self.doc_sources.get(doc_id), "terms": terms}
+                for doc_id, terms in self.doc_terms.items()
+            },
+        }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Load an index written by `save`"""
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+
+        index = cls(k1=payload.get("k1", 1.5), b=payload.get("b", 0.75))
+        for doc_id, doc in payload.get("documents", {}).items():
+            index._add_terms(doc_id, doc.get("terms", {}), doc.get("source"))
+        return index
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[List[str]], k: int = 60
+) -> List[Tuple[str, float]]:
+    """Fuse several ranked id lists: score(d) = sum(1 / (k + rank))"""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
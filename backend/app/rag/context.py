@@ -0,0 +1,257 @@
+"""
+Token-budgeted prompt packing for the RAG chatbot
+Splits a fixed input-token budget between the system prompt, retrieved chunks
+and a sliding window of chat history
+"""
+
+import hashlib
+import logging
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from app.rag.bm25 import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Total input tokens per completion call, and the caps for each section
+RAG_PROMPT_TOKENS = int(os.getenv("RAG_PROMPT_TOKENS", "4000"))
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "2400"))
+RAG_HISTORY_TOKENS = int(os.getenv("RAG_HISTORY_TOKENS", "1000"))
+RAG_MAX_CHUNKS = int(os.getenv("RAG_MAX_CHUNKS", "3"))
+RAG_TOKENIZER_ENCODING = os.getenv("RAG_TOKENIZER_ENCODING", "o200k_base")
+
+# Chat-format overhead per message (role + separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# A truncated chunk shorter than this is not worth sending
+MIN_CHUNK_TOKENS = 100
+# Relevance vs. diversity trade-off for MMR selection
+MMR_LAMBDA = 0.7
+# Longest/shortest shared text treated as splitter overlap (chunk_overlap=300)
+MAX_OVERLAP_CHARS = 400
+MIN_OVERLAP_CHARS = 50
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(RAG_TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning("tiktoken unavailable (%s); estimating token counts.", e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the local tokenizer (falls back to ~3 chars/token)"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 2) // 3
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` down to at most `max_tokens` tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[: max_tokens * 3]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+@dataclass
+class PromptBudget:
+    total: int = RAG_PROMPT_TOKENS
+    context: int = RAG_CONTEXT_TOKENS
+    history: int = RAG_HISTORY_TOKENS
+    max_chunks: int = RAG_MAX_CHUNKS
+
+
+@dataclass
+class PackedPrompt:
+    messages: List[Dict[str, str]]
+    docs: list
+    token_counts: Dict[str, int] = field(default_factory=dict)
+
+
+def _trim_overlap(text: str, previous: str) -> str:
+    """Drop text that overlaps the start or end of an already-selected chunk"""
+    limit = min(len(text), len(previous), MAX_OVERLAP_CHARS)
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(text[:size]):
+            return text[size:]
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.startswith(text[-size:]):
+            return text[:-size]
+    return text
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _dedupe(docs) -> list:
+    seen = set()
+    unique = []
+    for doc in docs:
+        digest = hashlib.sha1(doc.page_content.strip().encode("utf-8")).hexdigest()
+        if doc.page_content.strip() and digest not in seen:
+            seen.add(digest)
+            unique.append(doc)
+    return unique
+
+
+def _mmr_order(docs) -> list:
+    """Reorder docs by maximal marginal relevance (rank = relevance)"""
+    terms = [set(tokenize(d.page_content)) for d in docs]
+    remaining = list(range(len(docs)))
+    selected: List[int] = []
+
+    while remaining:
+        best, best_score = remaining[0], float("-inf")
+        for i in remaining:
+            relevance = 1.0 - i / len(docs)
+            redundancy = max(
+                (_jaccard(terms[i], terms[j]) for j in selected), default=0
+            )
+            score = MMR_LAMBDA * relevance - (1 - MMR_LAMBDA) * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+        remaining.remove(best)
+
+    return [docs[i] for i in selected]
+
+
+def _format_chunk(doc, text: str) -> str:
+    source = doc.metadata.get("source", "Unknown")
+    page = doc.metadata.get("page", "Unknown")
+    return f"Source: {source}, Page: {page}\n{text}"
+
+
+def pack_context(docs, max_tokens: int, max_chunks: int = RAG_MAX_CHUNKS):
+    """
+    Select chunks for the prompt: deduplicated, overlap-trimmed and
+    MMR-diversified, until `max_tokens` or `max_chunks` is reached.
+
+    Returns (context_text, selected_docs, tokens_used).
+    """
+    parts: List[str] = []
+    selected = []
+    used = 0
+
+    for doc in _mmr_order(_dedupe(docs)):
+        if len(selected) >= max_chunks:
+            break
+
+        text = doc.page_content.strip()
+        for prev in selected:
+            if prev.metadata.get("source") == doc.metadata.get("source"):
+                text = _trim_overlap(text, prev.page_content.strip())
+        if not text.strip():
+            continue
+
+        separator_tokens = count_tokens(CONTEXT_SEPARATOR) if parts else 0
+        remaining = max_tokens - used - separator_tokens
+        chunk = _format_chunk(doc, text)
+        chunk_tokens = count_tokens(chunk)
+
+        if chunk_tokens > remaining:
+            if remaining < MIN_CHUNK_TOKENS:
+                break
+            chunk = truncate_tokens(chunk, remaining)
+            chunk_tokens = count_tokens(chunk)
+
+        parts.append(chunk)
+        selected.append(doc)
+        used += chunk_tokens + separator_tokens
+
+    return CONTEXT_SEPARATOR.join(parts), selected, used
+
+
+def window_history(messages, max_tokens: int) -> List[Dict[str, str]]:
+    """
+    Keep the most recent user/assistant messages that fit in `max_tokens`.
+    The latest message is always kept (truncated if it alone is too long).
+    """
+    cleaned = [
+        {"role": m["role"], "content": str(m["content"])}
+        for m in messages
+        if isinstance(m, dict)
+        and m.get("role") in ("user", "assistant")
+        and m.get("content")
+    ]
+
+    window: List[Dict[str, str]] = []
+    used = 0
+    for msg in reversed(cleaned):
+        cost = count_tokens(msg["content"]) + MESSAGE_OVERHEAD_TOKENS
+        if used + cost > max_tokens:
+            if not window:
+                budget = max_tokens - MESSAGE_OVERHEAD_TOKENS
+                window.append(
+                    {
+                        "role": msg["role"],
+                        "content": truncate_tokens(msg["content"], budget),
+                    }
+                )
+            break
+        window.append(msg)
+        used += cost
+
+    window.reverse()
+    return window
+
+
+def pack_prompt(
+    system_prompt: str,
+    docs,
+    messages,
+    budget: Optional[PromptBudget] = None,
+    summary: str = "",
+) -> PackedPrompt:
+    """
+    Build the message list for one completion call within `budget`.
+
+    `system_prompt` is the instruction text; the packed context block is
+    appended to it under a CONTEXT heading. `summary` (a server-side
+    session's rolling summary of older turns) is counted as system text.
+    """
+    budget = budget or PromptBudget()
+    if summary:
+        system_prompt = f"CONVERSATION SO FAR (summary):\n{summary}\n\n{system_prompt}"
+
+    system_tokens = count_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+    history = window_history(
+        messages, min(budget.history, max(budget.total - system_tokens, 0))
+    )
+    history_tokens = sum(
+        count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in history
+    )
+
+    context_budget = min(budget.context, budget.total - system_tokens - history_tokens)
+    context_text, selected, context_tokens = pack_context(
+        docs, context_budget, budget.max_chunks
+    )
+
+    system_content = f"{system_prompt}CONTEXT:\n{context_text}\n\n"
+    return PackedPrompt(
+        messages=[{"role": "system", "content": system_content}] + history,
+        docs=selected,
+        token_counts={
+            "system": system_tokens,
+            "context": context_tokens,
+            "history": history_tokens,
+            "total": system_tokens + context_tokens + history_tokens,
+        },
+    )
@@ -0,0 +1,171 @@
+"""
+Pluggable embedding backends for RAG ingestion and query embedding
+
+Backends (RAG_EMBEDDING_BACKEND):
+- openai: OpenAI text-embedding-3-small (default, needs network + key)
+- local:  sentence-transformers model on CPU/GPU via torch
+- onnx:   the same model exported to ONNX with int8 dynamic quantization
+
+Each backend and model writes to its own Chroma collection, so switching
+either never mixes vectors from different embedding spaces.
+"""
+
+import logging
+import os
+import re
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ("openai", "local", "onnx")
+
+RAG_EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "openai").lower()
+DEFAULT_OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+RAG_OPENAI_EMBEDDING_MODEL = os.getenv(
+    "RAG_OPENAI_EMBEDDING_MODEL", DEFAULT_OPENAI_EMBEDDING_MODEL
+)
+# multilingual-e5 covers Nepali and expects "query: " / "passage: " prefixes
+RAG_LOCAL_EMBEDDING_MODEL = os.getenv(
+    "RAG_LOCAL_EMBEDDING_MODEL", "intfloat/multilingual-e5-small"
+)
+RAG_EMBEDDING_BATCH_SIZE = int(os.getenv("RAG_EMBEDDING_BATCH_SIZE", "64"))
+RAG_EMBEDDING_THREADS = int(
+    os.getenv("RAG_EMBEDDING_THREADS", str(os.cpu_count() or 1))
+)
+RAG_ONNX_QUANTIZATION = os.getenv("RAG_ONNX_QUANTIZATION", "avx2")
+RAG_MODELS_DIR = os.getenv("RAG_MODELS_DIR", "./models")
+
+# The original store was built with the default OpenAI embedding model in
+# langchain's default collection
+DEFAULT_COLLECTION_NAME = "langchain"
+
+
+def resolve_device() -> str:
+    """Return the best available torch device for embeddings."""
+    try:
+        import torch
+
+        if torch.cuda.is_available():
+            return "cuda"
+    except Exception:
+        pass
+    return "cpu"
+
+
+def get_embedding_backend(backend: Optional[str] = None) -> str:
+    """Validate and return the configured backend name"""
+    backend = (backend or RAG_EMBEDDING_BACKEND).lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown RAG_EMBEDDING_BACKEND '{backend}'. "
+            f"Choose one of: {', '.join(EMBEDDING_BACKENDS)}"
+        )
+    return backend
+
+
+def _model_slug(model_name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9]+", "-", model_name.split("/")[-1]).strip("-").lower()
+
+
+def get_collection_name(backend: Optional[str] = None) -> str:
+    """Chroma collection that holds vectors for `backend`"""
+    backend = get_embedding_backend(backend)
+    if backend == "openai":
+        if RAG_OPENAI_EMBEDDING_MODEL == DEFAULT_OPENAI_EMBEDDING_MODEL:
+            return DEFAULT_COLLECTION_NAME
+        model = RAG_OPENAI_EMBEDDING_MODEL
+    else:
+        model = RAG_LOCAL_EMBEDDING_MODEL
+    return f"rag-{backend}-{_model_slug(model)}"[:63]
+
+
+def collection_file_path(persist_dir: str, filename: str, collection_name: str) -> str:
+    """
+    Per-collection sidecar file (BM25 index, ingestion state) in `persist_dir`.
+    The default collection keeps the original un-suffixed file names.
+    """
+    if collection_name == DEFAULT_COLLECTION_NAME:
+        return os.path.join(persist_dir, filename)
+    stem, ext = os.path.splitext(filename)
+    return os.path.join(persist_dir, f"{stem}.{collection_name}{ext}")
+
+
+def _sentence_transformer_kwargs():
+    return {
+        "encode_kwargs": {
+            "batch_size": RAG_EMBEDDING_BATCH_SIZE,
+            "normalize_embeddings": True,
+            "prompt": "passage: ",
+        },
+        "query_encode_kwargs": {
+            "normalize_embeddings": True,
+            "prompt": "query: ",
+        },
+    }
+
+
+def _quantized_onnx_model_dir() -> str:
+    """
+    Export + int8-quantize the local model once and cache it under
+    RAG_MODELS_DIR; returns the directory to load it from.
+    """
+    model_dir = os.path.join(
+        RAG_MODELS_DIR,
+        f"{_model_slug(RAG_LOCAL_EMBEDDING_MODEL)}-onnx-{RAG_ONNX_QUANTIZATION}",
+    )
+    quantized_file = os.path.join(
+        model_dir, "onnx", f"model_qint8_{RAG_ONNX_QUANTIZATION}.onnx"
+    )
+    if os.path.exists(quantized_file):
+        return model_dir
+
+    from sentence_transformers import (
+        SentenceTransformer,
+        export_dynamic_quantized_onnx_model,
+    )
+
+    logger.info("Exporting quantized ONNX model to %s (one-time)...", model_dir)
+    model = SentenceTransformer(RAG_LOCAL_EMBEDDING_MODEL, backend="onnx", device="cpu")
+    model.save_pretrained(model_dir)
+    export_dynamic_quantized_onnx_model(model, RAG_ONNX_QUANTIZATION, model_dir)
+    return model_dir
+
+
+def get_embeddings(
+    backend: Optional[str] = None,
+    api_key: Optional[str] = None,
+    device: Optional[str] = None,
+):
+    """Build the langchain Embeddings object for `backend`"""
+    backend = get_embedding_backend(backend)
+
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(model=RAG_OPENAI_EMBEDDING_MODEL, api_key=api_key)
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if backend == "local":
+        import torch
+
+        torch.set_num_threads(RAG_EMBEDDING_THREADS)
+        return HuggingFaceEmbeddings(
+            model_name=RAG_LOCAL_EMBEDDING_MODEL,
+            model_kwargs={"device": device or resolve_device()},
+            **_sentence_transformer_kwargs(),
+        )
+
+    # onnx: CPU-only int8 model; onnxruntime uses all physical cores by default
+    return HuggingFaceEmbeddings(
+        model_name=_quantized_onnx_model_dir(),
+        model_kwargs={
+            "device": "cpu",
+            "backend": "onnx",
+            "model_kwargs": {
+                "file_name": f"onnx/model_qint8_{RAG_ONNX_QUANTIZATION}.onnx",
+                "provider": "CPUExecutionProvider",
+            },
+        },
+        **_sentence_transformer_kwargs(),
+    )
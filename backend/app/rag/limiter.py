@@ -0,0 +1,154 @@
+"""
+Adaptive concurrency limiter for LLM-bound chatbot requests
+
+AIMD: every successful upstream call raises the concurrency limit by about
+one per limit's worth of calls; a rate-limit (429) or timeout cuts it by
+half. Requests over the limit wait in a short bounded FIFO queue; when the
+queue is full, or a request waits longer than the queue timeout, it is
+rejected immediately so the caller can answer 503 + Retry-After instead of
+piling more load onto the provider.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+RAG_LLM_CONCURRENCY = int(os.getenv("RAG_LLM_CONCURRENCY", "8"))
+RAG_LLM_MIN_CONCURRENCY = int(os.getenv("RAG_LLM_MIN_CONCURRENCY", "1"))
+RAG_LLM_MAX_CONCURRENCY = int(os.getenv("RAG_LLM_MAX_CONCURRENCY", "32"))
+RAG_LLM_QUEUE_SIZE = int(os.getenv("RAG_LLM_QUEUE_SIZE", "16"))
+RAG_LLM_QUEUE_TIMEOUT = float(os.getenv("RAG_LLM_QUEUE_TIMEOUT", "2.0"))
+
+# Multiplicative decrease on overload
+BACKOFF_FACTOR = 0.5
+# Weight of the newest call in the latency estimate used for Retry-After
+LATENCY_EWMA_ALPHA = 0.2
+
+
+class LimiterSaturated(Exception):
+    """No slot became available; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial: int = RAG_LLM_CONCURRENCY,
+        min_limit: int = RAG_LLM_MIN_CONCURRENCY,
+        max_limit: int = RAG_LLM_MAX_CONCURRENCY,
+        queue_size: int = RAG_LLM_QUEUE_SIZE,
+        queue_timeout: float = RAG_LLM_QUEUE_TIMEOUT,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._latency = None
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "overloads": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def saturated(self) -> bool:
+        """True when a new request would be rejected right away"""
+        return self.in_flight >= int(self.limit) and self.queue_depth >= self.queue_size
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained"""
+        latency = self._latency or 5.0
+        rounds = (self.queue_depth + 1) / max(int(self.limit), 1)
+        return max(1, math.ceil(latency * rounds))
+
+    def _reject(self):
+        self.stats["rejected"] += 1
+        raise LimiterSaturated(self.retry_after())
+
+    async def acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            return
+        if self.queue_depth >= self.queue_size:
+            self._reject()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release(None)
+            else:
+                self._waiters.remove(waiter)
+            self._reject()
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release(None)
+            else:
+                self._waiters.remove(waiter)
+            raise
+        self.stats["admitted"] += 1
+
+    def release(self, overloaded, latency: float = None) -> None:
+        """
+        Return a slot. `overloaded` True = provider pushed back (429 or
+        timeout), False = success, None = neither (do not adapt).
+        """
+        self.in_flight -= 1
+        if overloaded:
+            self.stats["overloads"] += 1
+            self.limit = max(self.min_limit, self.limit * BACKOFF_FACTOR)
+        elif overloaded is False:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            if latency is not None:
+                if self._latency is None:
+                    self._latency = latency
+                else:
+                    self._latency += LATENCY_EWMA_ALPHA * (latency - self._latency)
+
+        # Hand freed slots straight to queued requests, oldest first
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, is_overload=lambda e: False):
+        """
+        Hold a slot for the duration of the block. `is_overload(exc)`
+        decides whether an exception counts as provider overload.
+        """
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.release(True if is_overload(e) else None)
+            raise
+        except BaseException:
+            self.release(None)
+            raise
+        else:
+            self.release(False, time.monotonic() - started)
+
+    def metrics(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            **self.stats,
+        }
@@ -0,0 +1,219 @@
+"""
+Pluggable chat-completion providers for the RAG chatbot
+
+Providers (RAG_LLM_PROVIDER):
+- openai: OpenAI chat completions (default, needs network + key)
+- local:  any OpenAI-compatible server (vLLM, llama.cpp, Ollama, ...) at
+          RAG_LLM_BASE_URL
+- fake:   deterministic offline replies with configurable first-token
+          latency and token rate, for load tests and benchmarks
+
+All providers are blocking (call them from a worker thread) and raise
+LLMError with the HTTP status the chatbot should answer.
+"""
+
+import hashlib
+import os
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional
+
+LLM_PROVIDERS = ("openai", "local", "fake")
+
+RAG_LLM_PROVIDER = os.getenv("RAG_LLM_PROVIDER", "openai").lower()
+RAG_LLM_MODEL = os.getenv("RAG_LLM_MODEL", "gpt-4o-mini")
+RAG_LLM_BASE_URL = os.getenv("RAG_LLM_BASE_URL", "http://127.0.0.1:8080/v1")
+RAG_LLM_TIMEOUT = float(os.getenv("RAG_LLM_TIMEOUT", "30"))
+
+# Fake provider: time to first token, then a steady token rate
+RAG_FAKE_LLM_LATENCY_MS = float(os.getenv("RAG_FAKE_LLM_LATENCY_MS", "400"))
+RAG_FAKE_LLM_TOKENS_PER_SECOND = float(
+    os.getenv("RAG_FAKE_LLM_TOKENS_PER_SECOND", "60")
+)
+RAG_FAKE_LLM_REPLY_TOKENS = int(os.getenv("RAG_FAKE_LLM_REPLY_TOKENS", "150"))
+
+
+class LLMError(Exception):
+    """A failed completion, with the HTTP status to report for it"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class LLMProvider(ABC):
+    """Interface: blocking complete() and stream() over chat messages"""
+
+    name = ""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @abstractmethod
+    def complete(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+    ) -> str:
+        """The whole reply text"""
+
+    @abstractmethod
+    def stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+    ) -> Iterator[str]:
+        """Yield reply text deltas"""
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+    # Newer OpenAI models only accept max_completion_tokens
+    max_tokens_param = "max_completion_tokens"
+
+    def __init__(
+        self,
+        model: str = RAG_LLM_MODEL,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout: float = RAG_LLM_TIMEOUT,
+    ):
+        import openai
+
+        super().__init__(model)
+        # One client per process keeps its HTTP connection pool warm
+        self.client = openai.OpenAI(api_key=api_key, base_url=base_url, timeout=timeout)
+
+    def _request(self, messages, max_tokens, temperature) -> dict:
+        kwargs = {"model": self.model, "messages": messages}
+        if max_tokens is not None:
+            kwargs[self.max_tokens_param] = max_tokens
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        return kwargs
+
+    def complete(self, messages, max_tokens=None, temperature=None) -> str:
+        try:
+            resp = self.client.chat.completions.create(
+                **self._request(messages, max_tokens, temperature)
+            )
+            return resp.choices[0].message.content or ""
+        except Exception as e:
+            raise _llm_error(e)
+
+    def stream(self, messages, max_tokens=None, temperature=None) -> Iterator[str]:
+        try:
+            stream = self.client.chat.completions.create(
+                **self._request(messages, max_tokens, temperature), stream=True
+            )
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        except Exception as e:
+            raise _llm_error(e)
+
+
+class LocalProvider(OpenAIProvider):
+    """OpenAI-compatible server; most of them take the classic max_tokens"""
+
+    name = "local"
+    max_tokens_param = "max_tokens"
+
+    def __init__(
+        self,
+        model: str = RAG_LLM_MODEL,
+        base_url: str = RAG_LLM_BASE_URL,
+        api_key: Optional[str] = None,
+        timeout: float = RAG_LLM_TIMEOUT,
+    ):
+        # The client insists on a key; local servers ignore it
+        super().__init__(model, api_key or "local", base_url, timeout)
+
+
+class FakeProvider(LLMProvider):
+    """
+    Deterministic replies built from the words of the prompt: the same
+    messages always give the same reply, with realistic pacing.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        model: str = "fake",
+        latency_ms: float = RAG_FAKE_LLM_LATENCY_MS,
+        tokens_per_second: float = RAG_FAKE_LLM_TOKENS_PER_SECOND,
+        reply_tokens: int = RAG_FAKE_LLM_REPLY_TOKENS,
+    ):
+        super().__init__(model)
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+
+    def _tokens(self, messages, max_tokens) -> List[str]:
+        prompt = "\n".join(m.get("content") or "" for m in messages)
+        rng = random.Random(hashlib.sha1(prompt.encode("utf-8")).hexdigest())
+        words = re.findall(r"\w+", prompt) or ["ok"]
+        count = min(self.reply_tokens, max_tokens or self.reply_tokens)
+        return [("" if i == 0 else " ") + rng.choice(words) for i in range(count)]
+
+    def stream(self, messages, max_tokens=None, temperature=None) -> Iterator[str]:
+        time.sleep(self.latency_ms / 1000)
+        interval = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        for token in self._tokens(messages, max_tokens):
+            if interval:
+                time.sleep(interval)
+            yield token
+
+    def complete(self, messages, max_tokens=None, temperature=None) -> str:
+        return "".join(self.stream(messages, max_tokens, temperature))
+
+
+def _llm_error(e: Exception) -> LLMError:
+    """Map an OpenAI client error to the status returned to the app"""
+    import openai
+
+    if isinstance(e, openai.APITimeoutError):
+        return LLMError(
+            408,
+            "Request timeout. AI service took too long to respond. Please try again.",
+        )
+    if isinstance(e, openai.RateLimitError):
+        return LLMError(
+            429, "Rate limit exceeded. Please wait a moment before trying again."
+        )
+    if isinstance(e, openai.APIConnectionError):
+        return LLMError(503, "Connection error with AI service. Please try again.")
+    if isinstance(e, openai.AuthenticationError):
+        return LLMError(500, "API authentication failed. Please contact support.")
+    if isinstance(e, openai.OpenAIError):
+        # Truncate long errors
+        return LLMError(500, f"AI service error: {str(e)[:100]}...")
+    return LLMError(500, "Unexpected error occurred. Please try again.")
+
+
+def get_llm_provider_name(provider: Optional[str] = None) -> str:
+    """Validate and return the configured provider name"""
+    provider = (provider or RAG_LLM_PROVIDER).lower()
+    if provider not in LLM_PROVIDERS:
+        raise ValueError(
+            f"Unknown RAG_LLM_PROVIDER '{provider}'. "
+            f"Choose one of: {', '.join(LLM_PROVIDERS)}"
+        )
+    return provider
+
+
+def get_llm(provider: Optional[str] = None, api_key: Optional[str] = None):
+    """Build the chat-completion provider for `provider`"""
+    provider = get_llm_provider_name(provider)
+    if provider == "openai":
+        return OpenAIProvider(api_key=api_key)
+    if provider == "local":
+        return LocalProvider(api_key=api_key)
+    return FakeProvider()
@@ -0,0 +1,188 @@
+"""
+Optional cross-encoder rerank stage for the RAG retriever
+
+The hybrid retriever fetches ~RAG_RERANK_CANDIDATES fused candidates, a
+small multilingual cross-encoder rescores (query, chunk) pairs on CPU, and
+only the best RAG_RERANK_TOP_N chunks go on to the prompt packer. Scores are
+cached by query + chunk hash. When the estimated rerank time exceeds
+RAG_RERANK_BUDGET_MS (e.g. under load) the stage is skipped and the fused
+order is used as-is; every RAG_RERANK_PROBE_EVERY skips one rerank runs
+anyway to re-measure, so the estimate recovers once load drops.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Set RAG_RERANK=1 to enable (needs sentence-transformers)
+RAG_RERANK = os.getenv("RAG_RERANK", "0") == "1"
+RAG_RERANK_MODEL = os.getenv(
+    "RAG_RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+)
+RAG_RERANK_CANDIDATES = int(os.getenv("RAG_RERANK_CANDIDATES", "30"))
+RAG_RERANK_TOP_N = int(os.getenv("RAG_RERANK_TOP_N", "3"))
+RAG_RERANK_BATCH_SIZE = int(os.getenv("RAG_RERANK_BATCH_SIZE", "16"))
+# Skip reranking when it is expected to take longer than this (0 = never skip)
+RAG_RERANK_BUDGET_MS = float(os.getenv("RAG_RERANK_BUDGET_MS", "300"))
+RAG_RERANK_CACHE_SIZE = int(os.getenv("RAG_RERANK_CACHE_SIZE", "20000"))
+# After this many consecutive skips, rerank once (when idle) to re-measure
+RAG_RERANK_PROBE_EVERY = int(os.getenv("RAG_RERANK_PROBE_EVERY", "20"))
+
+# Weight of the newest measurement in the per-pair latency estimate
+LATENCY_EWMA_ALPHA = 0.2
+
+
+def _normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+def _pair_key(query: str, doc: Document) -> str:
+    digest = hashlib.sha1(query.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(doc.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CrossEncoderReranker:
+    """Batched CPU cross-encoder with a score cache and a latency budget"""
+
+    def __init__(
+        self,
+        model_name: str = RAG_RERANK_MODEL,
+        top_n: int = RAG_RERANK_TOP_N,
+        candidates: int = RAG_RERANK_CANDIDATES,
+        batch_size: int = RAG_RERANK_BATCH_SIZE,
+        budget_ms: float = RAG_RERANK_BUDGET_MS,
+        cache_size: int = RAG_RERANK_CACHE_SIZE,
+        probe_every: int = RAG_RERANK_PROBE_EVERY,
+    ):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device="cpu", max_length=512)
+        self.top_n = top_n
+        self.candidates = candidates
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self.probe_every = probe_every
+
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+        self._ms_per_pair: Optional[float] = None
+        # The first predict (often the warm-up query) is cold; not sampled
+        self._cold = True
+        self._in_flight = 0
+        self._skips_in_row = 0
+        self.stats = {"reranked": 0, "skipped": 0, "cache_hits": 0, "pairs_scored": 0}
+
+    def _over_budget(self, pairs: int) -> bool:
+        """
+        Estimated time to score `pairs` now. Concurrent reranks share the
+        CPU, so the estimate scales with how many are already running.
+        """
+        if not self.budget_ms or self._ms_per_pair is None or not pairs:
+            return False
+        estimate = self._ms_per_pair * pairs * (self._in_flight + 1)
+        if estimate <= self.budget_ms:
+            return False
+        # Let a probe through now and then so one slow sample (or a past
+        # burst of load) cannot keep reranking switched off for good
+        if (
+            self.probe_every
+            and self._in_flight == 0
+            and self._skips_in_row >= self.probe_every
+        ):
+            return False
+        return True
+
+    def _cached_scores(self, keys: List[str]) -> dict:
+        with self._lock:
+            found = {}
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+            return found
+
+    def _store_scores(self, scores: dict) -> None:
+        with self._lock:
+            self._cache.update(scores)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def rerank(self, query: str, docs: List[Document]) -> List[Document]:
+        """
+        Return the `top_n` best of `docs` for `query`, or the first `top_n`
+        in their original order if reranking is over the latency budget.
+        """
+        if len(docs) <= 1:
+            return docs[: self.top_n]
+
+        query = _normalize_query(query)
+        keys = [_pair_key(query, doc) for doc in docs]
+        scores = self._cached_scores(keys)
+        missing = [i for i, key in enumerate(keys) if key not in scores]
+
+        if missing and self._over_budget(len(missing)):
+            self.stats["skipped"] += 1
+            self._skips_in_row += 1
+            return docs[: self.top_n]
+
+        if missing:
+            with self._lock:
+                self._in_flight += 1
+            started = time.perf_counter()
+            try:
+                predicted = self.model.predict(
+                    [(query, docs[i].page_content) for i in missing],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False,
+                )
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            self._skips_in_row = 0
+            per_pair = elapsed_ms / len(missing)
+            if self._cold:
+                self._cold = False
+            elif self._ms_per_pair is None:
+                self._ms_per_pair = per_pair
+            else:
+                self._ms_per_pair += LATENCY_EWMA_ALPHA * (per_pair - self._ms_per_pair)
+
+            fresh = {keys[i]: float(score) for i, score in zip(missing, predicted)}
+            self._store_scores(fresh)
+            scores.update(fresh)
+            self.stats["pairs_scored"] += len(missing)
+
+        self.stats["cache_hits"] += len(docs) - len(missing)
+        self.stats["reranked"] += 1
+        # Stable sort keeps the fused order among equal scores
+        ranked = sorted(range(len(docs)), key=lambda i: -scores[keys[i]])
+        return [docs[i] for i in ranked[: self.top_n]]
+
+
+@lru_cache(maxsize=1)
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """Shared reranker (the model loads once per process), or None if disabled"""
+    if not RAG_RERANK:
+        return None
+    try:
+        reranker = CrossEncoderReranker()
+    except Exception as e:
+        logger.warning("Reranker unavailable (%s); using fused retrieval order.", e)
+        return None
+    logger.info("Cross-encoder reranker loaded: %s", RAG_RERANK_MODEL)
+    return reranker
@@ -0,0 +1,150 @@
+"""
+Hybrid (BM25 + dense) retriever for the RAG chatbot
+Fuses Chroma similarity search with the local BM25 index via reciprocal rank fusion,
+then optionally reranks the fused candidates with a cross-encoder
+"""
+
+import hashlib
+import logging
+import os
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from app.rag.bm25 import BM25_INDEX_FILENAME, BM25Index, reciprocal_rank_fusion
+from app.rag.embeddings import DEFAULT_COLLECTION_NAME, collection_file_path
+from app.rag.rerank import CrossEncoderReranker, get_reranker
+
+logger = logging.getLogger(__name__)
+
+# Chunks returned per query; the prompt packer picks the final few from these
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "6"))
+# Candidates pulled from each of the dense and BM25 rankings before fusion
+RAG_FETCH_K = int(os.getenv("RAG_FETCH_K", "20"))
+# Set RAG_HYBRID=0 to fall back to pure dense search
+RAG_HYBRID = os.getenv("RAG_HYBRID", "1") != "0"
+RRF_K = 60
+
+
+def _doc_key(doc: Document) -> str:
+    """Stable identity for a retrieved chunk (Chroma id, else content hash)"""
+    doc_id = getattr(doc, "id", None)
+    if doc_id:
+        return doc_id
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def close_chroma(vectorstore) -> None:
+    """
+    Stop a langchain Chroma store's client and drop it from chromadb's
+    per-path system cache, so its HNSW index and SQLite handle are freed and
+    opening the same path again starts a fresh client.
+    """
+    system = getattr(getattr(vectorstore, "_client", None), "_system", None)
+    if system is None:
+        return
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+
+        cache = SharedSystemClient._identifier_to_system
+    except ImportError:
+        # chromadb < 0.5
+        from chromadb.api.client import SharedSystemClient
+
+        cache = SharedSystemClient._identifer_to_system
+    for identifier, cached in list(cache.items()):
+        if cached is system:
+            del cache[identifier]
+    system.stop()
+
+
+def load_bm25_index(
+    persist_dir: str, collection_name: str = DEFAULT_COLLECTION_NAME
+) -> Optional[BM25Index]:
+    """Load the BM25 index written by rag_system.py, or None if absent/corrupt"""
+    path = collection_file_path(persist_dir, BM25_INDEX_FILENAME, collection_name)
+    if not os.path.exists(path):
+        logger.warning("No BM25 index at %s; using dense retrieval only.", path)
+        return None
+    try:
+        return BM25Index.load(path)
+    except Exception as e:
+        logger.warning("Failed to load BM25 index (%s); using dense retrieval only.", e)
+        return None
+
+
+class HybridRetriever:
+    """Retriever with the same `invoke(query)` interface as a langchain retriever"""
+
+    def __init__(
+        self,
+        vectorstore,
+        bm25_index: Optional[BM25Index] = None,
+        k: int = RAG_TOP_K,
+        fetch_k: int = RAG_FETCH_K,
+        rrf_k: int = RRF_K,
+        reranker: Optional[CrossEncoderReranker] = None,
+    ):
+        self.vectorstore = vectorstore
+        self.bm25_index = bm25_index
+        self.k = k
+        self.fetch_k = fetch_k
+        self.rrf_k = rrf_k
+        self.reranker = reranker
+
+    def _keyword_search(self, query: str) -> List[Document]:
+        hits = self.bm25_index.search(query, k=self.fetch_k)
+        if not hits:
+            return []
+
+        ids = [doc_id for doc_id, _ in hits]
+        found = self.vectorstore.get(ids=ids, include=["documents", "metadatas"])
+        by_id = {
+            doc_id: Document(id=doc_id, page_content=text or "", metadata=meta or {})
+            for doc_id, text, meta in zip(
+                found["ids"], found["documents"], found["metadatas"]
+            )
+        }
+        # Chroma does not preserve the requested order
+        return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
+
+    def _finalize(self, query: str, candidates: List[Document]) -> List[Document]:
+        if self.reranker is None:
+            return candidates[: self.k]
+        return self.reranker.rerank(query, candidates[: self.reranker.candidates])
+
+    def invoke(self, query: str) -> List[Document]:
+        dense_docs = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        if not RAG_HYBRID or not self.bm25_index or not len(self.bm25_index):
+            return self._finalize(query, dense_docs)
+
+        keyword_docs = self._keyword_search(query)
+
+        docs_by_key: Dict[str, Document] = {}
+        rankings = []
+        for docs in (dense_docs, keyword_docs):
+            ranking = []
+            for doc in docs:
+                key = _doc_key(doc)
+                docs_by_key.setdefault(key, doc)
+                ranking.append(key)
+            rankings.append(ranking)
+
+        fused = reciprocal_rank_fusion(rankings, k=self.rrf_k)
+        return self._finalize(query, [docs_by_key[key] for key, _ in fused])
+
+    def close(self) -> None:
+        """Release the Chroma client and BM25 index (IndexManager eviction)"""
+        close_chroma(self.vectorstore)
+        self.bm25_index = None
+
+
+def build_retriever(
+    vectorstore, persist_dir: str, collection_name: str = DEFAULT_COLLECTION_NAME
+) -> HybridRetriever:
+    """Wrap a Chroma collection with the BM25 index that lives next to it"""
+    return HybridRetriever(
+        vectorstore,
+        bm25_index=load_bm25_index(persist_dir, collection_name),
+        reranker=get_reranker(),
+    )
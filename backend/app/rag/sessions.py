@@ -0,0 +1,152 @@
+"""
+Server-side chatbot conversations
+
+Clients send a session id plus only the new message; the history lives
+here. Once the stored turns outgrow RAG_SESSION_SUMMARY_TRIGGER_TOKENS, the
+older ones are folded into a rolling summary (by an LLM call, off the
+request path) and only the most recent RAG_SESSION_KEEP_TOKENS of turns
+are kept verbatim, so prompt and payload size stay bounded per session.
+
+Sessions are kept in process memory with an idle TTL and an LRU cap.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.rag.context import MESSAGE_OVERHEAD_TOKENS, count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+RAG_SESSION_TTL_SECONDS = int(os.getenv("RAG_SESSION_TTL_SECONDS", str(6 * 3600)))
+RAG_MAX_SESSIONS = int(os.getenv("RAG_MAX_SESSIONS", "10000"))
+RAG_SESSION_SUMMARY_TRIGGER_TOKENS = int(
+    os.getenv("RAG_SESSION_SUMMARY_TRIGGER_TOKENS", "1200")
+)
+RAG_SESSION_KEEP_TOKENS = int(os.getenv("RAG_SESSION_KEEP_TOKENS", "500"))
+RAG_SESSION_SUMMARY_TOKENS = int(os.getenv("RAG_SESSION_SUMMARY_TOKENS", "300"))
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a citizen and an "
+    "assistant about government procedures, documents and fees in Nepal. Update the "
+    "summary with the new turns below. Keep facts the citizen shared (their situation, "
+    "office, amounts, dates) and what the assistant already explained. Write at most "
+    "a short paragraph, in the language of the conversation.\n\n"
+)
+
+
+def _message_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+@dataclass
+class Conversation:
+    id: str
+    summary: str = ""
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    updated_at: float = field(default_factory=time.monotonic)
+    # One turn at a time per conversation
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    compacting: bool = False
+
+
+class ConversationStore:
+    def __init__(
+        self,
+        summarize: Callable[[str, List[Dict[str, str]]], Awaitable[str]],
+        ttl_seconds: int = RAG_SESSION_TTL_SECONDS,
+        max_sessions: int = RAG_MAX_SESSIONS,
+    ):
+        """`summarize(previous_summary, messages)` returns the updated summary"""
+        self.summarize = summarize
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # Least recently used first
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            expired = now - oldest.updated_at > self.ttl_seconds
+            if not expired and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+
+    def get_or_create(self, session_id: Optional[str]) -> Conversation:
+        """Return the live session `session_id`, or a new one if it is unknown/expired"""
+        self._evict()
+        conversation = self._sessions.get(session_id) if session_id else None
+        if conversation is None:
+            conversation = Conversation(id=uuid.uuid4().hex)
+            self._sessions[conversation.id] = conversation
+            self._evict()
+        self._sessions.move_to_end(conversation.id)
+        conversation.updated_at = time.monotonic()
+        return conversation
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def record_turn(
+        self, conversation: Conversation, question: str, reply: str
+    ) -> None:
+        """Store a completed turn and compact the history if it grew too long"""
+        conversation.messages.append({"role": "user", "content": question})
+        conversation.messages.append({"role": "assistant", "content": reply})
+        conversation.updated_at = time.monotonic()
+
+        if (
+            not conversation.compacting
+            and _message_tokens(conversation.messages)
+            > RAG_SESSION_SUMMARY_TRIGGER_TOKENS
+        ):
+            conversation.compacting = True
+            asyncio.ensure_future(self._compact(conversation))
+
+    async def _compact(self, conversation: Conversation) -> None:
+        try:
+            # Keep the newest turns that fit the keep budget (whole user/assistant pairs)
+            keep = 0
+            used = 0
+            for i in range(len(conversation.messages) - 2, -1, -2):
+                pair_tokens = _message_tokens(conversation.messages[i : i + 2])
+                if used + pair_tokens > RAG_SESSION_KEEP_TOKENS:
+                    break
+                used += pair_tokens
+                keep += 2
+            older = conversation.messages[: len(conversation.messages) - keep]
+            if not older:
+                return
+
+            summary = await self.summarize(conversation.summary, older)
+            summary = truncate_tokens(summary.strip(), RAG_SESSION_SUMMARY_TOKENS)
+
+            async with conversation.lock:
+                # Turns may have been added meanwhile; drop only what was summarized
+                conversation.messages = conversation.messages[len(older) :]
+                conversation.summary = summary
+        except Exception as e:
+            # The full history stays in place; the next turn retries
+            logger.warning("Conversation summary failed: %s", e)
+        finally:
+            conversation.compacting = False
+
+
+def summary_request(previous_summary: str, messages: List[Dict[str, str]]) -> str:
+    """Prompt text asking the LLM to fold `messages` into `previous_summary`"""
+    lines = [f"{m['role'].upper()}: {m['content']}" for m in messages]
+    previous = previous_summary or "(none yet)"
+    return (
+        f"{SUMMARY_PROMPT}CURRENT SUMMARY:\n{previous}\n\nNEW TURNS:\n"
+        + "\n".join(lines)
+        + "\n\nUPDATED SUMMARY:"
+    )
@@ -0,0 +1,118 @@
+"""
+Single-flight request coalescing for the chatbot
+
+Concurrent requests with the same key share one upstream call instead of
+each embedding, retrieving and calling the LLM. Streaming requests share
+one upstream stream: callers that join late are replayed what was already
+produced and then follow it live. Nothing is cached: once the shared call
+finishes, the next request with that key starts a fresh one.
+"""
+
+import asyncio
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+def normalize_query(query: str) -> str:
+    """Coalescing key for a question: case, spacing and trailing ?/। folded"""
+    query = re.sub(r"\s+", " ", query).strip().lower()
+    return query.rstrip(" ?!.।")
+
+
+class SingleFlight:
+    """Share one in-flight awaitable among callers with the same key"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.stats = {"leaders": 0, "joined": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["joined"] += 1
+        # A caller that times out or disconnects must not cancel the shared call
+        return await asyncio.shield(future)
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            # Mark the exception retrieved when every waiter has gone away
+            future.exception()
+
+
+class StreamBroadcast:
+    """Fan one async stream out to any number of subscribers"""
+
+    def __init__(self, source: AsyncIterator[Any]):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[Any]) -> None:
+        try:
+            async for item in source:
+                async with self._changed:
+                    self.items.append(item)
+                    self._changed.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """Everything produced so far, then new items as they arrive"""
+        position = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(
+                    lambda: position < len(self.items) or self.done
+                )
+                new_items = self.items[position:]
+                position = len(self.items)
+                finished = self.done
+
+            for item in new_items:
+                yield item
+            if finished:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class StreamSingleFlight:
+    """Share one upstream stream among concurrent callers with the same key"""
+
+    def __init__(self):
+        self._streams: Dict[str, StreamBroadcast] = {}
+        self.stats = {"leaders": 0, "joined": 0}
+
+    def active(self, key: str) -> bool:
+        """True if a stream for `key` is in flight (a new caller would join it)"""
+        return key in self._streams
+
+    def subscribe(
+        self, key: str, fn: Callable[[], AsyncIterator[Any]]
+    ) -> AsyncIterator[Any]:
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = StreamBroadcast(fn())
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._forget(key, broadcast))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["joined"] += 1
+        return broadcast.subscribe()
+
+    def _forget(self, key: str, broadcast: StreamBroadcast) -> None:
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
@@ -0,0 +1,410 @@
+"""
+Versioned vector-index snapshots with an atomic "current" pointer
+
+    chroma_db/
+      current.json            {"current": "<name>", "previous": "<name>", ...}
+      building.json           {"name": "<working>", "base": ..., "origin": ...} during a run
+      snapshots/<name>/       Chroma files + BM25 index + pdf_state.json
+
+Ingestion copies the current snapshot into a working snapshot and updates
+it. At file checkpoints it publishes copies of the working snapshot (so
+new PDFs become searchable during a long run) and finally publishes the
+working snapshot itself, always by atomically replacing current.json.
+Serving processes only ever open published snapshots, so they never see a
+half-written index. A run that fails leaves its working snapshot in
+building.json, and the next run continues it as long as nothing else was
+published since. A root without current.json is a legacy in-place store
+and is served as-is.
+
+A retriever that drops out of a serving process (neither current nor
+previous) is closed once in-flight requests had RAG_SNAPSHOT_CLOSE_GRACE
+seconds to finish, releasing its Chroma client and BM25 index.
+
+Each serving process records the snapshots it holds in
+readers/<host>-<pid>.json on every poll; pruning never deletes a snapshot
+that a reader acknowledged within RAG_SNAPSHOT_READER_TTL seconds.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOTS_DIRNAME = "snapshots"
+POINTER_FILENAME = "current.json"
+BUILDING_FILENAME = "building.json"
+READERS_DIRNAME = "readers"
+# publish_snapshot() default: keep the version served so far as previous
+_SERVED = object()
+
+# Published snapshots kept on disk (current and previous are never pruned)
+RAG_KEEP_SNAPSHOTS = int(os.getenv("RAG_KEEP_SNAPSHOTS", "3"))
+# How often serving processes check current.json for a new version
+RAG_SNAPSHOT_POLL_SECONDS = float(os.getenv("RAG_SNAPSHOT_POLL_SECONDS", "30"))
+# Seconds an evicted retriever stays open for requests that still use it
+RAG_SNAPSHOT_CLOSE_GRACE = float(os.getenv("RAG_SNAPSHOT_CLOSE_GRACE", "120"))
+# A reader's acknowledgement protects its snapshots for this long; must
+# outlast a poll plus loading a new snapshot
+RAG_SNAPSHOT_READER_TTL = float(
+    os.getenv("RAG_SNAPSHOT_READER_TTL", str(max(10 * RAG_SNAPSHOT_POLL_SECONDS, 600)))
+)
+
+
+def read_pointer(root: str) -> Optional[dict]:
+    """Return the parsed current.json, or None for a legacy store"""
+    try:
+        with open(os.path.join(root, POINTER_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _write_pointer(root: str, pointer: dict) -> None:
+    _write_json(os.path.join(root, POINTER_FILENAME), pointer)
+
+
+def read_building(root: str) -> Optional[dict]:
+    """The working snapshot of an unfinished ingestion run, if any"""
+    try:
+        with open(os.path.join(root, BUILDING_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def mark_building(
+    root: str, name: str, base: Optional[str], origin: Optional[str]
+) -> None:
+    """
+    Record `name` as the working snapshot, in step with published `base`;
+    `origin` is the version the run started from
+    """
+    _write_json(
+        os.path.join(root, BUILDING_FILENAME),
+        {"name": name, "base": base, "origin": origin},
+    )
+
+
+def clear_building(root: str) -> None:
+    try:
+        os.remove(os.path.join(root, BUILDING_FILENAME))
+    except FileNotFoundError:
+        pass
+
+
+def acknowledge_snapshots(root: str, reader: str, names) -> None:
+    """Record that `reader` is using snapshots `names` (refreshes its mtime)"""
+    readers_dir = os.path.join(root, READERS_DIRNAME)
+    os.makedirs(readers_dir, exist_ok=True)
+    _write_json(
+        os.path.join(readers_dir, f"{reader}.json"),
+        {"snapshots": sorted(names), "acknowledged_at": time.time()},
+    )
+
+
+def acknowledged_snapshots(root: str, ttl: float = RAG_SNAPSHOT_READER_TTL) -> set:
+    """Snapshots in use by readers seen within `ttl`; stale reader files go"""
+    readers_dir = os.path.join(root, READERS_DIRNAME)
+    if not os.path.isdir(readers_dir):
+        return set()
+
+    names = set()
+    cutoff = time.time() - ttl
+    for filename in os.listdir(readers_dir):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(readers_dir, filename)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                # Reader exited or hung
+                os.remove(path)
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                names.update(json.load(f).get("snapshots", []))
+        except (OSError, ValueError):
+            continue
+    return names
+
+
+def snapshot_path(root: str, name: Optional[str]) -> str:
+    """Directory of snapshot `name`; the root itself for a legacy store"""
+    if name is None:
+        return root
+    return os.path.join(root, SNAPSHOTS_DIRNAME, name)
+
+
+def current_snapshot(root: str):
+    """Return (name, directory) of the published index"""
+    pointer = read_pointer(root)
+    name = pointer.get("current") if pointer else None
+    return name, snapshot_path(root, name)
+
+
+def _new_snapshot_name(root: str) -> str:
+    """
+    Time-ordered and unique, also for several snapshots in one second; a
+    pruned name is never handed out again (it would sort as the oldest)
+    """
+    while True:
+        now = time.time()
+        name = (
+            f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}"
+            f"-{int(now % 1 * 1e6):06d}-{os.getpid()}"
+        )
+        if not os.path.exists(snapshot_path(root, name)):
+            return name
+
+
+def create_snapshot(root: str, exclude=(), source: Optional[str] = None):
+    """
+    Copy the published index (or the snapshot directory `source`) into a
+    new, unpublished snapshot directory.
+
+    `exclude` holds glob patterns of root-level files that are shared
+    across versions (e.g. caches) and must not be copied.
+    Returns (name, directory).
+    """
+    name = _new_snapshot_name(root)
+    target = snapshot_path(root, name)
+    if source is None:
+        _, source = current_snapshot(root)
+
+    if os.path.isdir(source):
+        ignore = shutil.ignore_patterns(
+            SNAPSHOTS_DIRNAME,
+            READERS_DIRNAME,
+            POINTER_FILENAME,
+            f"{POINTER_FILENAME}.*",
+            BUILDING_FILENAME,
+            f"{BUILDING_FILENAME}.*",
+            *exclude,
+        )
+        shutil.copytree(source, target, ignore=ignore)
+    else:
+        os.makedirs(target)
+    return name, target
+
+
+def publish_snapshot(root: str, name: str, previous=_SERVED) -> None:
+    """
+    Atomically make `name` the served version and prune old snapshots.
+    `previous` (default: the version served so far) is what a rollback
+    returns to; ingestion runs pin it to the version they started from.
+    """
+    if previous is _SERVED:
+        previous, _ = current_snapshot(root)
+    _write_pointer(
+        root,
+        {
+            "current": name,
+            "previous": previous,
+            "published_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+    )
+    prune_snapshots(root)
+
+
+def rollback_snapshot(root: str) -> str:
+    """Swap the current and previous versions; returns the new current name"""
+    pointer = read_pointer(root)
+    if not pointer or not pointer.get("previous"):
+        raise ValueError("No previous snapshot to roll back to")
+    if not os.path.isdir(snapshot_path(root, pointer["previous"])):
+        raise ValueError(f"Snapshot {pointer['previous']} no longer exists")
+
+    _write_pointer(
+        root,
+        {
+            "current": pointer["previous"],
+            "previous": pointer["current"],
+            "published_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+    )
+    return pointer["previous"]
+
+
+def prune_snapshots(root: str, keep: int = RAG_KEEP_SNAPSHOTS) -> None:
+    """
+    Delete the oldest snapshots beyond `keep`. The current and previous
+    versions, the working snapshot of an ingestion run (building.json) and
+    snapshots a serving process still acknowledges are never deleted.
+    """
+    pointer = read_pointer(root) or {}
+    current, previous = pointer.get("current"), pointer.get("previous")
+    snapshots_dir = os.path.join(root, SNAPSHOTS_DIRNAME)
+    if not current or not os.path.isdir(snapshots_dir):
+        return
+
+    building = read_building(root)
+    others = sorted(
+        name
+        for name in os.listdir(snapshots_dir)
+        if name not in (current, previous)
+        and not (building and name == building["name"])
+    )
+    spare = max(keep - (2 if previous else 1), 0)
+    in_use = acknowledged_snapshots(root)
+    for name in others[: max(len(others) - spare, 0)]:
+        if name in in_use:
+            logger.info("Keeping snapshot %s: still served by a reader.", name)
+            continue
+        shutil.rmtree(os.path.join(snapshots_dir, name), ignore_errors=True)
+
+
+def page_in(path: str, suffixes=(".bin",)) -> int:
+    """
+    Read the index files under `path` once so the OS page cache holds them
+    (Chroma's HNSW segments are *.bin). Returns the number of bytes read.
+    """
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            if not filename.endswith(tuple(suffixes)):
+                continue
+            with open(os.path.join(dirpath, filename), "rb") as f:
+                while True:
+                    block = f.read(1 << 20)
+                    if not block:
+                        break
+                    total += len(block)
+    return total
+
+
+class IndexManager:
+    """
+    Holds the retriever for the published snapshot and hot-swaps it when
+    current.json changes. Requests keep using whichever retriever they
+    fetched, so a swap never interrupts them. The previous retriever stays
+    loaded, so rolling back to it is instant. Older retrievers are closed
+    (through their `close()`, if the loader's objects have one) after
+    `close_grace` seconds.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        loader: Callable[[str], object],
+        poll_seconds: float = RAG_SNAPSHOT_POLL_SECONDS,
+        close_grace: float = RAG_SNAPSHOT_CLOSE_GRACE,
+    ):
+        self.root = root
+        self.loader = loader
+        self.poll_seconds = poll_seconds
+        self.close_grace = close_grace
+        self.reader = f"{socket.gethostname()}-{os.getpid()}"
+        self._load_lock = threading.Lock()
+        # (snapshot name, retriever); name is None for a legacy store
+        self.current = None
+        self.previous = None
+        # Evicted retrievers by snapshot name: (close after, retriever)
+        self._retired: Dict[Optional[str], Tuple[float, object]] = {}
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.current[0] if self.current else None
+
+    def acknowledge(self) -> None:
+        """Protect the loaded snapshots from pruning by ingestion runs"""
+        names = [s[0] for s in (self.current, self.previous) if s and s[0]]
+        names += [name for name in self._retired if name]
+        if not names:
+            return
+        try:
+            acknowledge_snapshots(self.root, self.reader, names)
+        except OSError as e:
+            logger.warning("Could not acknowledge index snapshots: %s", e)
+
+    def get(self):
+        """Retriever for the published snapshot (loaded on first use)"""
+        current = self.current
+        if current is None:
+            self.refresh()
+            current = self.current
+        return current[1]
+
+    def refresh(self) -> bool:
+        """Load and swap in the published snapshot if it changed"""
+        # One loader at a time; requests keep using self.current meanwhile
+        with self._load_lock:
+            name, path = current_snapshot(self.root)
+            if self.current is not None and self.current[0] == name:
+                return False
+
+            if self.previous is not None and self.previous[0] == name:
+                loaded = self.previous
+            elif name in self._retired:
+                # Rolled back to a version awaiting close: its client may
+                # be the one Chroma would hand out again, so reuse it
+                loaded = (name, self._retired.pop(name)[1])
+            else:
+                loaded = (name, self.loader(path))
+
+            evicted = self.previous
+            if evicted is not None and evicted[0] != name:
+                self._retired[evicted[0]] = (
+                    time.monotonic() + self.close_grace,
+                    evicted[1],
+                )
+            self.previous, self.current = self.current, loaded
+            self.acknowledge()
+            logger.info("Serving index snapshot %s.", name or "(legacy)")
+            return True
+
+    def close_retired(self, force: bool = False) -> int:
+        """Close evicted retrievers whose grace period is over; returns the count"""
+        with self._load_lock:
+            now = time.monotonic()
+            due = [
+                name
+                for name, (deadline, _) in self._retired.items()
+                if force or deadline <= now
+            ]
+            retrievers = [self._retired.pop(name)[1] for name in due]
+        for name, retriever in zip(due, retrievers):
+            close = getattr(retriever, "close", None)
+            if close is None:
+                continue
+            try:
+                close()
+                logger.info("Closed index snapshot %s.", name or "(legacy)")
+            except Exception as e:
+                logger.warning("Failed to close index snapshot %s: %s", name, e)
+        return len(due)
+
+    def rollback(self) -> str:
+        """Switch back to the previous snapshot, here and for other processes"""
+        name = rollback_snapshot(self.root)
+        self.refresh()
+        return name
+
+    async def watch(self) -> None:
+        """Poll current.json and reload in a worker thread when it changes"""
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            if self._retired:
+                await asyncio.to_thread(self.close_retired)
+            if self.current is None:
+                continue
+            # Before refresh(): loading a new version can take a while
+            self.acknowledge()
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                # Keep serving the loaded version
+                logger.error("Failed to load new index snapshot: %s", e)
@@ -0,0 +1,95 @@
+"""
+Admin operations: sampling profiles of the live worker and statistics rebuilds
+"""
+
+import asyncio
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response
+
+from app.auth.dependencies import get_admin_user
+from app.database.service import DatabaseService
+from app.models.schemas import User
+from app.profiling import (
+    PROFILE_INTERVAL_MS,
+    PROFILE_MAX_SECONDS,
+    ProfilerBusy,
+    get_request_profile,
+    profile_process,
+    render_profile,
+)
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["Admin"],
+    responses={404: {"description": "Not found"}},
+)
+
+PROFILE_FORMATS = "^(speedscope|collapsed)$"
+
+
+def _profile_response(profile, fmt: str, filename: str) -> Response:
+    body, media_type, extension = render_profile(profile, fmt)
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{extension}"'
+        },
+    )
+
+
+@router.post("/profile")
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(PROFILE_INTERVAL_MS, ge=1, le=100),
+    format: str = Query("speedscope", pattern=PROFILE_FORMATS),
+    admin_user: User = Depends(get_admin_user),
+):
+    """
+    Sample every thread of this worker for `seconds` and return the profile
+    (speedscope JSON or collapsed stacks for flamegraph tools).
+    """
+    try:
+        profile = await asyncio.to_thread(profile_process, seconds, interval_ms)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _profile_response(profile, format, f"profile-{int(profile.started)}")
+
+
+@router.get("/profile/requests/{profile_id}")
+async def get_request_profile_file(
+    profile_id: str,
+    format: str = Query("speedscope", pattern=PROFILE_FORMATS),
+    admin_user: User = Depends(get_admin_user),
+):
+    """
+    Download the profile of a request sent with `X-Profile: 1` (the id is in
+    its `X-Profile-Id` response header). Only recent profiles are kept.
+    """
+    profile = get_request_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return _profile_response(profile, format, f"request-{profile_id}")
+
+
+@router.post("/statistics/rebuild")
+async def rebuild_statistics(
+    parallel: int = Query(1, ge=1, le=8),
+    ministry: Optional[List[str]] = Query(None),
+    admin_user: User = Depends(get_admin_user),
+):
+    """
+    Recalculate project_statistics from the citizen reports in one set-based
+    pass, for all projects or those of the given ministries. `parallel` > 1
+    rebuilds per-ministry chunks concurrently.
+    """
+    result = await DatabaseService.rebuild_all_statistics(
+        parallel=parallel, ministries=ministry
+    )
+    return {
+        "projects": result.projects,
+        "chunks": result.chunks,
+        "seconds": round(result.seconds, 2),
+    }
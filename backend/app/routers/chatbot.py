@@ -0,0 +1,664 @@
+"""
+RAG chatbot endpoints
+
+Heavy dependencies (Chroma, langchain, torch via the embedding backends,
+the OpenAI client) are imported only when the index or the LLM provider is
+first needed, so importing this router costs the core API next to nothing.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.auth.dependencies import get_admin_user
+from app.metrics import observe_rag_stage, rag_stage
+from app.models.schemas import User
+from app.rag.context import pack_prompt
+from app.rag.limiter import AdaptiveLimiter, LimiterSaturated
+from app.rag.llm import LLMError, get_llm, get_llm_provider_name
+from app.rag.sessions import (
+    RAG_SESSION_SUMMARY_TOKENS,
+    ConversationStore,
+    summary_request,
+)
+from app.rag.singleflight import SingleFlight, StreamSingleFlight, normalize_query
+from app.rag.snapshots import IndexManager, page_in
+
+router = APIRouter(tags=["chatbot"])
+
+logger = logging.getLogger(__name__)
+
+RAG_PERSIST_DIR = "./chroma_db"
+
+rag_embedding = None
+rag_index = None
+chat_llm = None
+rag_watch_task = None
+rag_warmup_task = None
+
+# Set RAG_WARMUP=0 to skip warm-up (the first request then pays for it)
+RAG_WARMUP = os.getenv("RAG_WARMUP", "1") == "1"
+# Reported by /ready: pending -> warming -> ready | failed
+warmup_state: Dict[str, Any] = {"status": "pending"}
+
+# Overall time limit of a chatbot request, streamed or not
+CHATBOT_TIMEOUT_SECONDS = 45.0
+CHATBOT_TIMEOUT_DETAIL = (
+    "Request timeout. The AI assistant is taking too long to respond. "
+    "Please try again with a shorter message."
+)
+
+# Concurrent identical first-turn questions share one retrieval + completion
+chat_singleflight = SingleFlight()
+chat_stream_singleflight = StreamSingleFlight()
+# Caps concurrent upstream LLM calls; sheds load with 503 when saturated
+chat_limiter = AdaptiveLimiter()
+
+
+def get_openai_api_key() -> str:
+    """Use MATE if set, otherwise fall back to OPENAI_API_KEY."""
+    key = os.getenv("RAG_KEY")
+    if not key:
+        raise HTTPException(
+            status_code=500,
+            detail="No API key found. Set MATE or OPENAI_API_KEY in your .env.",
+        )
+    return key
+
+
+def _load_rag_retriever(persist_dir: str):
+    """Open Chroma + the BM25 index of one index snapshot."""
+    global rag_embedding
+
+    from app.rag.embeddings import (
+        get_collection_name,
+        get_embedding_backend,
+        get_embeddings,
+        resolve_device,
+    )
+
+    # Use same embedding backend/collection as ingestion
+    backend = get_embedding_backend()
+    if rag_embedding is None:
+        device = resolve_device()
+        logger.info("Embedding backend: %s, device: %s", backend, device)
+        api_key = get_openai_api_key() if backend == "openai" else None
+        rag_embedding = get_embeddings(backend, api_key=api_key, device=device)
+    collection_name = get_collection_name(backend)
+
+    from langchain_chroma import Chroma
+
+    from app.rag.retriever import build_retriever
+
+    vectorstore = Chroma(
+        collection_name=collection_name,
+        persist_directory=persist_dir,
+        embedding_function=rag_embedding,
+    )
+    retriever = build_retriever(vectorstore, persist_dir, collection_name)
+
+    if RAG_WARMUP:
+        # Warm the snapshot before it is served (also on hot-swaps): pull the
+        # HNSW files into the page cache, then let one query load the index
+        paged = page_in(persist_dir)
+        retriever.invoke("warm-up")
+        logger.info("Warmed index %s (%.0f MB paged in).", persist_dir, paged / 1e6)
+    return retriever
+
+
+def get_rag_index() -> IndexManager:
+    """Index manager that hot-swaps published snapshots of RAG_PERSIST_DIR."""
+    global rag_index
+
+    if not os.path.exists(RAG_PERSIST_DIR):
+        raise HTTPException(
+            status_code=500,
+            detail=f"Vector DB not found at {RAG_PERSIST_DIR}. Run your ingestion script first.",
+        )
+    if rag_index is None:
+        rag_index = IndexManager(RAG_PERSIST_DIR, _load_rag_retriever)
+    return rag_index
+
+
+def get_rag_retriever():
+    """Retriever for the currently published index snapshot (loaded lazily)."""
+    return get_rag_index().get()
+
+
+def _warm_up_blocking() -> None:
+    get_rag_retriever()
+    get_chat_llm()
+    # Token counting loads its encoder on first use
+    pack_prompt(RAG_SYSTEM_PROMPT, [], [{"role": "user", "content": "warm-up"}])
+
+
+async def warm_up() -> None:
+    """Open the index, run one query and create clients before taking traffic."""
+    started = asyncio.get_running_loop().time()
+    try:
+        await asyncio.to_thread(_warm_up_blocking)
+    except Exception as e:
+        # Stay up; requests retry initialization and report the error
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        warmup_state.update(status="failed", error=detail)
+        logger.error("Warm-up failed: %s", detail)
+        return
+    seconds = round(asyncio.get_running_loop().time() - started, 2)
+    warmup_state.update(status="ready", seconds=seconds)
+    logger.info("Warm-up finished in %ss.", seconds)
+
+
+def ready() -> bool:
+    """True once warm-up has finished (or was skipped)."""
+    return warmup_state["status"] in ("ready", "failed")
+
+
+def start() -> None:
+    """Start background work (call from the app's startup hook)."""
+    global rag_watch_task, rag_warmup_task
+
+    if RAG_WARMUP:
+        warmup_state.update(status="warming")
+        rag_warmup_task = asyncio.create_task(warm_up())
+    else:
+        warmup_state.update(status="ready")
+
+    # Pick up index snapshots published by the ingestion script
+    if os.path.exists(RAG_PERSIST_DIR):
+        rag_watch_task = asyncio.create_task(get_rag_index().watch())
+
+
+def stop() -> None:
+    for task in (rag_warmup_task, rag_watch_task):
+        if task is not None:
+            task.cancel()
+
+
+def stats() -> Dict[str, Any]:
+    """Chatbot load figures for /health."""
+    return {
+        "warmup": warmup_state,
+        "limiter": chat_limiter.metrics(),
+        "coalesced": chat_singleflight.stats["joined"]
+        + chat_stream_singleflight.stats["joined"],
+        "sessions": len(chat_sessions),
+    }
+
+
+def _latest_user_text(messages) -> str:
+    """Extract latest user message content from chat history."""
+    for m in reversed(messages):
+        if m.get("role") == "user":
+            return (m.get("content") or "").strip()
+    return ""
+
+
+# Instructions for the chatbot; the packed CONTEXT block is appended per request
+RAG_SYSTEM_PROMPT = (
+    "You are an assistant that helps people understand official government procedures, "
+    "required documents, and official fees in Nepal. Your main goal is to prevent citizens "
+    "from being exploited, overcharged, or misled by bureaucrats.\n\n"
+    "You are given some legal and procedural context below (laws, regulations, notices, "
+    "and guidelines). Treat this a primary reference.\n\n"
+    "When you answer questions:\n"
+    "- Focus on explaining:\n"
+    "  • What the process is (step by step).\n"
+    "  • Which office or authority is responsible.\n"
+    "  • What documents are required.\n"
+    "  • What are the costs to be paid if any.\n"
+    #    "- If the context clearly states the fee or required documents, use those exact details.\n"
+    #    "- If the context is partial or does not mention everything, use your general understanding "
+    #    "  of Nepal’s administrative practices to give a helpful and realistic answer.\n"
+    "- Always make it clear that only officially prescribed fees should be paid. Politely remind "
+    "  users that they are not required to pay any extra or unofficial amount beyond the official "
+    "  government fee, and that they should always ask for an official receipt.\n"
+    "- If a user describes a situation that looks like bribery, overcharging, or harassment, "
+    "  calmly explain that such demands are not legal and suggest that they can:\n"
+    "  • Refuse to pay unofficial fees.\n"
+    "  • Ask for written/official notice of any fee.\n"
+    "  • Record details (date, office, name of officer, amount asked).\n"
+    "  • Contact the appropriate complaint or anti-corruption channel in Nepal.\n"
+    "- If the question is clearly unrelated to government procedures, laws or corruption, answer "
+    "  briefly or explain that you are focused on administrative and legal information.\n\n"
+    "Style guidelines:\n"
+    "- Answer using the language of the user content (English or Nepali).\n"
+    "- Prefer bullet points and short steps instead of long paragraphs.\n"
+    "- Mention, where possible, which law, rule, or type of official document your answer is based on.\n"
+    "- Answer must be consise and when used with tts , it must answer under 1 minutes"
+    "Below is the context you can use:\n\n"
+)
+
+
+@router.post("/chatbot")
+async def rag_chatbot_endpoint(request: Request):
+    """
+    RAG-enabled chatbot with timeout handling.
+
+    Request JSON (server-side session; omit session_id to start one):
+      {
+        "session_id": "...",
+        "message": "...",
+        "stream": false  # true = server-sent events: sources, token..., done
+      }
+
+    Response JSON:
+      {
+        "session_id": "...",
+        "response": "...",
+        "sources": [
+          {"source": "file.pdf", "page": 3},
+          ...
+        ]
+      }
+
+    Legacy clients may still send the full history as
+    {"messages": [{"role": "user", "content": "..."}, ...]} and get it back
+    under "messages".
+    """
+    try:
+        # Streamed answers return at once and enforce the limit per event
+        return await asyncio.wait_for(
+            _process_chatbot_request(request), timeout=CHATBOT_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=408, detail=CHATBOT_TIMEOUT_DETAIL)
+
+
+async def _process_chatbot_request(request: Request):
+    """
+    Dispatch one chatbot request by payload format.
+
+    Session turn (the format clients should use), handled by
+    _process_session_turn:
+      request:  {"session_id": "..." (optional), "message": "...", "stream": false}
+      response: {"session_id": "...", "response": "...", "sources": [...]}
+
+    Legacy full-history request, answered here:
+      request:  {"messages": [{"role": "user", "content": "..."}, ...],
+                 "stream": false}
+      response: {"response": "...",
+                 "messages": [..., {"role": "assistant", "content": "..."}],
+                 "sources": [...]}
+
+    With "stream": true either format answers with server-sent events:
+    `sources`, `token`..., then `done` (the fields above except "sources")
+    or `error`.
+    """
+    try:
+        data = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+
+    if "message" in data:
+        return await _process_session_turn(data)
+
+    messages = data.get("messages")
+    if messages is None or not isinstance(messages, list) or not messages:
+        raise HTTPException(
+            status_code=400,
+            detail="'messages' must be a non-empty list of chat messages.",
+        )
+
+    # Extract latest user query
+    query = _latest_user_text(messages)
+    if not query:
+        raise HTTPException(
+            status_code=400,
+            detail="No user message found in 'messages'.",
+        )
+
+    key = _coalescing_key(messages, query)
+
+    if data.get("stream"):
+        joining = key is not None and chat_stream_singleflight.active(key)
+        if not joining and chat_limiter.saturated():
+            raise _busy_error(chat_limiter.retry_after())
+        return StreamingResponse(
+            _chatbot_events(messages, query, key), media_type="text/event-stream"
+        )
+
+    if key is None:
+        reply, sources = await _answer(messages, query)
+    else:
+        reply, sources = await chat_singleflight.do(
+            key, lambda: _answer(messages, query)
+        )
+
+    # Append the assistant's reply to the conversation
+    messages.append({"role": "assistant", "content": reply})
+
+    return JSONResponse(
+        {
+            "response": reply,  # For compatibility with existing client
+            "messages": messages,
+            "sources": sources,
+        }
+    )
+
+
+async def _process_session_turn(data: Dict[str, Any]):
+    """One turn of a server-side conversation: only the new message travels."""
+    message = data.get("message")
+    if not isinstance(message, str) or not message.strip():
+        raise HTTPException(
+            status_code=400, detail="'message' must be a non-empty string."
+        )
+    query = message.strip()
+    session_id = data.get("session_id")
+    conversation = chat_sessions.get_or_create(
+        session_id if isinstance(session_id, str) else None
+    )
+
+    if data.get("stream"):
+        if chat_limiter.saturated():
+            raise _busy_error(chat_limiter.retry_after())
+        return StreamingResponse(
+            _session_events(conversation, query), media_type="text/event-stream"
+        )
+
+    # One turn at a time per conversation, so history stays in order
+    async with conversation.lock:
+        messages = conversation.messages + [{"role": "user", "content": query}]
+        key = None if conversation.summary else _coalescing_key(messages, query)
+        if key is None:
+            reply, sources = await _answer(messages, query, conversation.summary)
+        else:
+            reply, sources = await chat_singleflight.do(
+                key, lambda: _answer(messages, query)
+            )
+        chat_sessions.record_turn(conversation, query, reply)
+
+    return JSONResponse(
+        {"session_id": conversation.id, "response": reply, "sources": sources}
+    )
+
+
+def _coalescing_key(messages, query: str) -> Optional[str]:
+    """Only first-turn questions (no prior history) can share an answer."""
+    turns = [
+        m
+        for m in messages
+        if isinstance(m, dict) and m.get("role") in ("user", "assistant")
+    ]
+    if len(turns) != 1:
+        return None
+    return normalize_query(query)
+
+
+def _retrieve_and_pack(messages, query: str, summary: str = ""):
+    """RAG retrieval + prompt packing (blocking; runs in a worker thread)."""
+    retriever = get_rag_retriever()
+    try:
+        with rag_stage("retrieve"):
+            docs = retriever.invoke(query)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving context from vector DB: {e}",
+        )
+
+    # Pack system prompt, retrieved chunks and recent history into the token budget
+    with rag_stage("pack"):
+        return pack_prompt(RAG_SYSTEM_PROMPT, docs, messages, summary=summary)
+
+
+def _sources(docs) -> List[Dict[str, Any]]:
+    """Sources as a separate list (for UI if needed)."""
+    return [
+        {
+            "source": d.metadata.get("source", "Unknown"),
+            "page": d.metadata.get("page", -1),
+        }
+        for d in docs
+    ]
+
+
+def get_chat_llm():
+    """Chat-completion provider selected by RAG_LLM_PROVIDER (created once)."""
+    global chat_llm
+
+    if chat_llm is None:
+        provider = get_llm_provider_name()
+        api_key = get_openai_api_key() if provider == "openai" else None
+        chat_llm = get_llm(provider, api_key=api_key)
+        logger.info("Chat provider: %s (%s)", chat_llm.name, chat_llm.model)
+    return chat_llm
+
+
+def _llm_http_error(e: LLMError) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+# Defaults for chatbot answers; callers may override per call
+COMPLETION_OPTIONS = {"max_tokens": 1500, "temperature": 0.7}
+
+
+def _complete(formatted_messages, **overrides) -> str:
+    """Blocking completion through the configured provider."""
+    try:
+        return get_chat_llm().complete(
+            formatted_messages, **{**COMPLETION_OPTIONS, **overrides}
+        )
+    except LLMError as e:
+        raise _llm_http_error(e)
+
+
+def _stream_completion(formatted_messages):
+    """Yield reply text deltas from a streamed completion (blocking)."""
+    started = time.perf_counter()
+    first = True
+    try:
+        for delta in get_chat_llm().stream(formatted_messages, **COMPLETION_OPTIONS):
+            if first:
+                observe_rag_stage("llm_first_token", time.perf_counter() - started)
+                first = False
+            yield delta
+    except LLMError as e:
+        raise _llm_http_error(e)
+    observe_rag_stage("llm_stream", time.perf_counter() - started)
+
+
+async def _iterate_in_thread(make_iterator):
+    """Consume a blocking iterator in a worker thread without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    def pump():
+        try:
+            for item in make_iterator():
+                loop.call_soon_threadsafe(items.put_nowait, item)
+            loop.call_soon_threadsafe(items.put_nowait, finished)
+        except BaseException as e:
+            loop.call_soon_threadsafe(items.put_nowait, e)
+
+    worker = loop.run_in_executor(None, pump)
+    while True:
+        item = await items.get()
+        if item is finished:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+    await worker
+
+
+async def _summarize_conversation(previous_summary: str, messages) -> str:
+    """Fold older session turns into the rolling summary (shares the LLM limiter)."""
+    prompt = [{"role": "user", "content": summary_request(previous_summary, messages)}]
+    async with chat_limiter.slot(_is_provider_overload):
+        with rag_stage("summarize"):
+            return await asyncio.to_thread(
+                _complete,
+                prompt,
+                max_tokens=RAG_SESSION_SUMMARY_TOKENS,
+                temperature=0.2,
+            )
+
+
+# Server-side chat histories, addressed by session id
+chat_sessions = ConversationStore(summarize=_summarize_conversation)
+
+
+def _busy_error(retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="The assistant is handling too many requests. Please try again shortly.",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+def _is_provider_overload(e: Exception) -> bool:
+    """Upstream rate limit or timeout: shrink the concurrency limit."""
+    return isinstance(e, HTTPException) and e.status_code in (408, 429)
+
+
+async def _answer(messages, query: str, summary: str = ""):
+    """Retrieve, pack and complete; returns (reply, sources)."""
+    try:
+        async with chat_limiter.slot(_is_provider_overload):
+            packed = await asyncio.to_thread(
+                _retrieve_and_pack, messages, query, summary
+            )
+            with rag_stage("llm"):
+                reply = await asyncio.to_thread(_complete, packed.messages)
+    except LimiterSaturated as e:
+        raise _busy_error(e.retry_after)
+    return reply, _sources(packed.docs)
+
+
+async def _answer_stream(messages, query: str, summary: str = ""):
+    """Streaming variant of _answer: yields {"sources": ...} then {"delta": ...} items."""
+    try:
+        async with chat_limiter.slot(_is_provider_overload):
+            packed = await asyncio.to_thread(
+                _retrieve_and_pack, messages, query, summary
+            )
+            yield {"sources": _sources(packed.docs)}
+            async for delta in _iterate_in_thread(
+                lambda: _stream_completion(packed.messages)
+            ):
+                yield {"delta": delta}
+    except LimiterSaturated as e:
+        raise _busy_error(e.retry_after)
+
+
+def _sse(event: str, payload: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def _until(items, deadline: float):
+    """Yield from async iterator `items`, raising TimeoutError past `deadline`."""
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            try:
+                yield await asyncio.wait_for(items.__anext__(), timeout=remaining)
+            except StopAsyncIteration:
+                return
+    finally:
+        # Leaves the limiter slot / single-flight subscription
+        await items.aclose()
+
+
+async def _answer_events(
+    messages,
+    query: str,
+    key: Optional[str],
+    summary: str = "",
+    deadline: Optional[float] = None,
+):
+    """
+    (event, payload) pairs for a streamed answer: `sources`, then `token`
+    deltas, then `done` with the full reply (or `error`). Requests that share
+    a key join the same upstream stream, replayed from the start. Past
+    `deadline` (time.monotonic(); default CHATBOT_TIMEOUT_SECONDS from now)
+    the stream ends with a 408 `error`; a shared upstream stream is bounded
+    by its first caller's deadline.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + CHATBOT_TIMEOUT_SECONDS
+    if key is None:
+        items = _answer_stream(messages, query, summary)
+    else:
+        items = chat_stream_singleflight.subscribe(
+            key, lambda: _until(_answer_stream(messages, query), deadline)
+        )
+
+    reply = []
+    try:
+        async for item in _until(items, deadline):
+            if "sources" in item:
+                yield "sources", {"sources": item["sources"]}
+            else:
+                reply.append(item["delta"])
+                yield "token", {"delta": item["delta"]}
+    except asyncio.TimeoutError:
+        yield "error", {"status": 408, "detail": CHATBOT_TIMEOUT_DETAIL}
+        return
+    except HTTPException as e:
+        error = {"status": e.status_code, "detail": e.detail}
+        if e.headers and "Retry-After" in e.headers:
+            error["retry_after"] = int(e.headers["Retry-After"])
+        yield "error", error
+        return
+    except Exception:
+        yield "error", {
+            "status": 500,
+            "detail": "Unexpected error occurred. Please try again.",
+        }
+        return
+
+    yield "done", {"response": "".join(reply)}
+
+
+async def _chatbot_events(messages, query: str, key: Optional[str]):
+    """Server-sent events for a legacy (client-held history) request."""
+    async for event, payload in _answer_events(messages, query, key):
+        if event == "done":
+            messages.append({"role": "assistant", "content": payload["response"]})
+            payload["messages"] = messages
+        yield _sse(event, payload)
+
+
+async def _session_events(conversation, query: str):
+    """Server-sent events for a session turn; `done` carries the session id."""
+    # Time spent waiting for the previous turn counts against the limit
+    deadline = time.monotonic() + CHATBOT_TIMEOUT_SECONDS
+    async with conversation.lock:
+        messages = conversation.messages + [{"role": "user", "content": query}]
+        key = None if conversation.summary else _coalescing_key(messages, query)
+        async for event, payload in _answer_events(
+            messages, query, key, conversation.summary, deadline
+        ):
+            if event == "done":
+                chat_sessions.record_turn(conversation, query, payload["response"])
+                payload["session_id"] = conversation.id
+            yield _sse(event, payload)
+
+
+@router.delete("/chatbot/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    """Forget a server-side conversation (e.g. when the user starts over)"""
+    if not chat_sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"status": "deleted", "session_id": session_id}
+
+
+@router.post("/api/rag/rollback")
+async def rollback_rag_index(admin_user: User = Depends(get_admin_user)):
+    """Serve the previous index snapshot again (admin only)"""
+    index = get_rag_index()
+    try:
+        version = await asyncio.to_thread(index.rollback)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "rolled_back", "version": version}
@@ -5,6 +5,7 @@ from app.models.schemas import (
     CitizenReport,
     ProjectStatus,
     ProcurementMethod,
+    ProjectBatchRequest,
 )
 from app.database.service import DatabaseService
 from datetime import datetime
@@ -45,6 +46,29 @@ async def get_projects(
     return projects
 
 
+@router.post("/batch", response_model=dict)
+async def get_projects_batch(request: ProjectBatchRequest):
+    """
+    Get several projects in one request.
+
+    Takes up to 200 project IDs and, optionally, the fields to return
+    (`id` is always included; default: everything the project detail
+    returns) and a limit on citizen reports per project. Projects come back
+    in the order requested; unknown IDs are listed in `missing`.
+    """
+    project_ids = list(dict.fromkeys(request.ids))
+    projects = await DatabaseService.get_projects_by_ids(
+        project_ids,
+        fields=[field.value for field in request.fields] if request.fields else None,
+        reports_limit=request.reports_limit,
+    )
+
+    return {
+        "projects": [projects[pid] for pid in project_ids if pid in projects],
+        "missing": [pid for pid in project_ids if pid not in projects],
+    }
+
+
 @router.get("/{project_id}", response_model=dict)
 async def get_project(project_id: str):
     """
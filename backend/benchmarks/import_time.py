@@ -0,0 +1,118 @@
+"""
+Import-time regression check for the API
+
+Imports app.main in a fresh interpreter under `python -X importtime` and
+reports the total import time, peak RSS and the slowest modules. Fails
+(exit code 1) when a module that only the chatbot needs is imported at
+startup, or when the import takes longer than --max-ms.
+
+Usage (from backend/):
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 5 --max-ms 2500 --top 20
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Loaded lazily by the chatbot; importing app.main must not pull them in
+LAZY_MODULES = (
+    "torch",
+    "openai",
+    "langchain_chroma",
+    "langchain_openai",
+    "langchain_core",
+    "langchain_huggingface",
+    "chromadb",
+    "sentence_transformers",
+    "tiktoken",
+)
+
+PROBE = (
+    "import resource, sys\n"
+    "import app.main\n"
+    "print('RSS_KB', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    "print('LOADED', ','.join(sorted(m for m in sys.modules if '.' not in m)))\n"
+)
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+
+
+def run_once(env):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise SystemExit("app.main failed to import")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us)))
+
+    rss_kb = loaded = None
+    for line in result.stdout.splitlines():
+        if line.startswith("RSS_KB "):
+            rss_kb = int(line.split()[1])
+        elif line.startswith("LOADED "):
+            loaded = set(line.split(" ", 1)[1].split(","))
+    return modules, rss_kb, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules shown")
+    parser.add_argument(
+        "--max-ms", type=float, default=0, help="Fail above this median (0 = off)"
+    )
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR))
+    totals = []
+    for _ in range(args.runs):
+        modules, rss_kb, loaded = run_once(env)
+        app_main = next(m for m in modules if m[0] == "app.main")
+        totals.append(app_main[2] / 1000)
+
+    median_ms = statistics.median(totals)
+    print(f"import app.main: median {median_ms:.0f} ms over {args.runs} runs")
+    print(f"Peak RSS after import: {rss_kb / 1024:.0f} MB")
+
+    print("\nSlowest modules by self time (last run):")
+    slowest = sorted(modules, key=lambda m: -m[1])[: args.top]
+    for name, self_us, cumulative_us in slowest:
+        print(
+            f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cum  {name}"
+        )
+
+    failures = []
+    eager = sorted(m for m in LAZY_MODULES if m in loaded)
+    if eager:
+        failures.append(f"chatbot-only modules imported at startup: {', '.join(eager)}")
+    if args.max_ms and median_ms > args.max_ms:
+        failures.append(f"import took {median_ms:.0f} ms (budget {args.max_ms:.0f} ms)")
+
+    if failures:
+        print("\nFAIL")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
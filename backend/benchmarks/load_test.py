@@ -0,0 +1,284 @@
+"""
+Endpoint load test
+
+Runs scripted scenarios against a running API (load the synthetic dataset
+first, see synthetic_data.py) and reports throughput and p50/p95/p99
+latency per scenario. Each scenario runs on its own for --duration seconds
+with --concurrency clients, after --warmup seconds whose requests are not
+counted.
+
+Scenarios:
+    list    GET /api/projects/ with random status/fiscal year/ministry filters
+    search  GET /api/projects/?search=...
+    detail  GET /api/projects/{id} (project with all its reports)
+    submit  POST /api/reviews/{id}/submit (writes reports and statistics)
+    stats   GET /api/projects/stats/overview and /api/reviews/{id}/summary
+    auth    POST /api/auth/login, then GET /api/auth/me with the token
+
+Usage (from backend/):
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000
+    python benchmarks/load_test.py -s detail -s search --concurrency 32 --output after.json
+    python benchmarks/load_test.py --compare before.json --output after.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic_data import (
+    DEFAULT_PROJECTS,
+    FISCAL_YEARS,
+    REPORT_SENTENCES,
+    SEARCH_TERMS,
+    STATUSES,
+    project_id,
+)
+
+# Demo account created by migrate_database.py / synthetic_data.py
+DEMO_EMAIL = "citizen@example.com"
+DEMO_PASSWORD = "password123"
+
+
+@dataclass
+class Result:
+    scenario: str
+    requests: int = 0
+    errors: int = 0
+    duration: float = 0.0
+    latencies_ms: List[float] = field(default_factory=list, repr=False)
+
+    def percentile(self, p: float) -> float:
+        """Nearest-rank percentile of the recorded latencies"""
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        rank = max(math.ceil(p / 100 * len(ordered)), 1)
+        return ordered[rank - 1]
+
+    def summary(self) -> dict:
+        return {
+            "scenario": self.scenario,
+            "requests": self.requests,
+            "errors": self.errors,
+            "throughput": (
+                round(self.requests / self.duration, 1) if self.duration else 0.0
+            ),
+            "p50_ms": round(self.percentile(50), 1),
+            "p95_ms": round(self.percentile(95), 1),
+            "p99_ms": round(self.percentile(99), 1),
+            "max_ms": round(max(self.latencies_ms, default=0.0), 1),
+        }
+
+
+class Scenarios:
+    """One method per scenario; each issues one logical operation"""
+
+    def __init__(self, client: httpx.AsyncClient, projects: int):
+        self.client = client
+        self.projects = projects
+
+    def _project(self, rng: random.Random) -> str:
+        return project_id(rng.randrange(self.projects))
+
+    async def list(self, rng):
+        params = {}
+        if rng.random() < 0.5:
+            params["status"] = rng.choice(STATUSES)[0]
+        if rng.random() < 0.3:
+            params["fiscal_year"] = rng.choice(FISCAL_YEARS)
+        if rng.random() < 0.2:
+            params["ministry"] = rng.choice(["Health", "Education", "Municipality"])
+        return [await self.client.get("/api/projects/", params=params)]
+
+    async def search(self, rng):
+        return [
+            await self.client.get(
+                "/api/projects/", params={"search": rng.choice(SEARCH_TERMS)}
+            )
+        ]
+
+    async def detail(self, rng):
+        return [await self.client.get(f"/api/projects/{self._project(rng)}")]
+
+    async def submit(self, rng):
+        review_type = rng.choice(sorted(REPORT_SENTENCES))
+        data = {
+            "reporter_name": "Load Test",
+            "review_type": review_type,
+            "review_text": " ".join(REPORT_SENTENCES[review_type][:2]).format(pct=50),
+            "work_completed": "false",
+            "quality_rating": str(rng.randint(1, 5)),
+            "latitude": str(round(rng.uniform(26.4, 30.4), 4)),
+            "longitude": str(round(rng.uniform(80.1, 88.2), 4)),
+        }
+        return [
+            await self.client.post(
+                f"/api/reviews/{self._project(rng)}/submit", data=data
+            )
+        ]
+
+    async def stats(self, rng):
+        if rng.random() < 0.5:
+            return [await self.client.get("/api/projects/stats/overview")]
+        return [await self.client.get(f"/api/reviews/{self._project(rng)}/summary")]
+
+    async def auth(self, rng):
+        login = await self.client.post(
+            "/api/auth/login", json={"email": DEMO_EMAIL, "password": DEMO_PASSWORD}
+        )
+        if login.status_code != 200:
+            return [login]
+        token = login.json()["access_token"]
+        me = await self.client.get(
+            "/api/auth/me", headers={"Authorization": f"Bearer {token}"}
+        )
+        return [login, me]
+
+
+SCENARIOS = ("list", "search", "detail", "submit", "stats", "auth")
+
+
+async def run_scenario(
+    name: str,
+    base_url: str,
+    projects: int,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    seed: int,
+) -> Result:
+    result = Result(scenario=name)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60
+    ) as client:
+        operation = getattr(Scenarios(client, projects), name)
+        started = time.perf_counter()
+        measure_from = started + warmup
+        stop_at = measure_from + duration
+
+        async def worker(worker_id: int):
+            rng = random.Random(f"{seed}-{name}-{worker_id}")
+            while True:
+                begin = time.perf_counter()
+                if begin >= stop_at:
+                    return
+                try:
+                    responses = await operation(rng)
+                    failed = any(r.status_code >= 400 for r in responses)
+                except httpx.HTTPError:
+                    failed = True
+                end = time.perf_counter()
+                if begin >= measure_from:
+                    result.requests += 1
+                    result.errors += failed
+                    result.latencies_ms.append((end - begin) * 1000)
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        result.duration = time.perf_counter() - measure_from
+    return result
+
+
+def print_report(summaries: List[dict], baseline: Dict[str, dict]) -> None:
+    header = (
+        f"{'scenario':<8} {'requests':>9} {'errors':>7} {'req/s':>9}"
+        f" {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for s in summaries:
+        print(
+            f"{s['scenario']:<8} {s['requests']:>9} {s['errors']:>7}"
+            f" {s['throughput']:>9.1f} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f}"
+            f" {s['p99_ms']:>9.1f} {s['max_ms']:>9.1f}"
+        )
+        before = baseline.get(s["scenario"])
+        if before:
+            print(
+                f"{'  vs base':<8} {'':>9} {'':>7}"
+                f" {_change(before['throughput'], s['throughput']):>9}"
+                f" {_change(before['p50_ms'], s['p50_ms']):>9}"
+                f" {_change(before['p95_ms'], s['p95_ms']):>9}"
+                f" {_change(before['p99_ms'], s['p99_ms']):>9}"
+            )
+
+
+def _change(before: float, after: float) -> str:
+    if not before:
+        return "-"
+    return f"{(after - before) / before * 100:+.0f}%"
+
+
+async def run(args) -> List[dict]:
+    summaries = []
+    for name in args.scenario or SCENARIOS:
+        print(f"Running {name} ...", flush=True)
+        result = await run_scenario(
+            name,
+            args.base_url,
+            args.projects,
+            args.concurrency,
+            args.duration,
+            args.warmup,
+            args.seed,
+        )
+        summaries.append(result.summary())
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument(
+        "-s",
+        "--scenario",
+        action="append",
+        choices=SCENARIOS,
+        help="Scenario to run (repeatable, default: all)",
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds")
+    parser.add_argument(
+        "--projects",
+        type=int,
+        default=DEFAULT_PROJECTS,
+        help="Synthetic projects loaded (ids SYN-0000001 ...)",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text())
+        baseline = {s["scenario"]: s for s in previous["results"]}
+
+    summaries = asyncio.run(run(args))
+    print()
+    print_report(summaries, baseline)
+
+    if args.output:
+        config = {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+        Path(args.output).write_text(
+            json.dumps({"config": config, "results": summaries}, indent=2)
+        )
+
+    if any(s["errors"] for s in summaries):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
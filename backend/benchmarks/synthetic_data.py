@@ -0,0 +1,401 @@
+"""
+Synthetic dataset for benchmarks
+
+Generates projects and citizen reports in the mock_data format and loads
+them through the same code path as migrate_database.py (create_tables,
+import_ministries, import_projects), so the benchmark database has the
+production schema and the statistics rows the API reads.
+
+Everything is derived from --seed: project i is always the same, so load
+tests can address projects by id (SYN-0000001 ...) without a lookup.
+Report counts per project are skewed (a few projects get most of the
+reports), like real traffic.
+
+Usage (from backend/, against an empty benchmark database):
+    python benchmarks/synthetic_data.py                      # 100k projects, 5M reports
+    python benchmarks/synthetic_data.py --projects 1000 --reports 50000
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+DEFAULT_PROJECTS = 100_000
+DEFAULT_REPORTS = 5_000_000
+
+FISCAL_YEARS = [f"{year}/{(year + 1) % 100:02d}" for year in range(2070, 2082)]
+STATUSES = [
+    ("Planning", 8),
+    ("Tender Open", 6),
+    ("Evaluation", 4),
+    ("Awarded", 5),
+    ("In Progress", 40),
+    ("Completed", 28),
+    ("Delayed", 7),
+    ("Disputed", 2),
+]
+PROCUREMENT_METHODS = [
+    "Works-NCB",
+    "Works-ICB",
+    "Works-Limited",
+    "Goods-NCB",
+    "Goods-ICB",
+    "Consulting-QCBS",
+]
+CONTRACT_TYPES = [
+    "Lump Sum",
+    "Unit Price",
+    "Fixed Price",
+    "Turnkey",
+    "Time-based",
+    "Supply Contract",
+]
+REVIEW_TYPES = [
+    ("Progress Update", 55),
+    ("Quality Issue", 18),
+    ("Completion Verification", 14),
+    ("Delay Report", 10),
+    ("Fraud Alert", 3),
+]
+
+PLACES = [
+    "Kathmandu",
+    "Lalitpur",
+    "Bhaktapur",
+    "Pokhara",
+    "Biratnagar",
+    "Birgunj",
+    "Dharan",
+    "Butwal",
+    "Hetauda",
+    "Janakpur",
+    "Nepalgunj",
+    "Dhangadhi",
+    "Itahari",
+    "Bharatpur",
+    "Tansen",
+    "Gorkha",
+    "Ilam",
+    "Jumla",
+    "Surkhet",
+    "Dolakha",
+    "Khamti",
+    "Baglung",
+    "Damak",
+    "Rajbiraj",
+]
+WORKS = [
+    "Khanapani Yojana",
+    "Road Upgrading",
+    "Bridge Construction",
+    "School Building Construction",
+    "Primary Health Center",
+    "Irrigation Canal Rehabilitation",
+    "Drainage Improvement",
+    "Community Building",
+    "Solar Street Lighting",
+    "River Embankment",
+    "Hospital Equipment Supply",
+    "Ward Office Construction",
+]
+CONTRACTORS = [
+    "Himalayan Construction Pvt. Ltd.",
+    "Everest Builders",
+    "Sagarmatha Nirman Sewa",
+    "Annapurna Engineering",
+    "Gandaki Infrastructure",
+    "Koshi Developers",
+    "Lumbini Construction Co.",
+    "Mechi Traders",
+    "Karnali Nirman",
+    "Janaki Suppliers",
+]
+FIRST_NAMES = [
+    "Ram",
+    "Sita",
+    "Hari",
+    "Gita",
+    "Krishna",
+    "Laxmi",
+    "Bishnu",
+    "Sarita",
+    "Dipak",
+    "Anita",
+    "Suman",
+    "Pooja",
+]
+LAST_NAMES = [
+    "Bahadur",
+    "Shrestha",
+    "Thapa",
+    "Gurung",
+    "Tamang",
+    "Rai",
+    "Sharma",
+    "Adhikari",
+    "Karki",
+    "Yadav",
+]
+REPORT_SENTENCES = {
+    "Progress Update": [
+        "Work is progressing steadily at the site.",
+        "Foundation work has been completed this week.",
+        "Around {pct}% of the work looks complete.",
+        "Workers and machinery were present during my visit.",
+    ],
+    "Quality Issue": [
+        "The materials used look substandard.",
+        "Cracks have appeared in the newly built section.",
+        "Drainage was not built as shown on the plan.",
+        "The road surface is already damaged after the rain.",
+    ],
+    "Completion Verification": [
+        "The work has been completed and handed over.",
+        "The facility is now in use by the community.",
+        "Final inspection was done in presence of ward members.",
+    ],
+    "Delay Report": [
+        "No work has happened at the site for several weeks.",
+        "The contractor has left the site unattended.",
+        "Work is behind the schedule announced on the notice board.",
+    ],
+    "Fraud Alert": [
+        "Payment was released but the work was not done.",
+        "The measurements in the bill do not match the site.",
+        "Materials were taken away from the site at night.",
+    ],
+}
+
+# Nepal's bounding box
+LAT_RANGE = (26.4, 30.4)
+LNG_RANGE = (80.1, 88.2)
+
+# Search terms that match synthetic projects, for the load test
+SEARCH_TERMS = PLACES[:8] + WORKS[:6] + [c.split()[0] for c in CONTRACTORS[:5]]
+
+
+def project_id(index: int) -> str:
+    return f"SYN-{index + 1:07d}"
+
+
+def ministries() -> list:
+    """Ministries from mock_data plus local bodies, so the filters have spread"""
+    from app.data.mock_data import get_ministries
+
+    return get_ministries() + [
+        f"{place} {kind}"
+        for place in PLACES
+        for kind in ("Municipality", "Rural Municipality")
+    ]
+
+
+def report_counts(projects: int, reports: int, seed: int) -> list:
+    """Reports per project: Pareto-skewed, summing exactly to `reports`"""
+    rng = random.Random(f"{seed}-counts")
+    weights = [rng.paretovariate(1.5) for _ in range(projects)]
+    total = sum(weights)
+    counts = [int(reports * w / total) for w in weights]
+    for i in range(reports - sum(counts)):
+        counts[i % projects] += 1
+    return counts
+
+
+def _date(day: datetime) -> str:
+    return day.strftime("%d-%m-%Y")
+
+
+def _coordinates(rng: random.Random):
+    return round(rng.uniform(*LAT_RANGE), 4), round(rng.uniform(*LNG_RANGE), 4)
+
+
+def _pick(rng: random.Random, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+
+def generate_report(rng: random.Random, project: dict, index: int, start: datetime):
+    review_type = _pick(rng, REVIEW_TYPES)
+    sentences = rng.sample(
+        REPORT_SENTENCES[review_type], k=min(2, len(REPORT_SENTENCES[review_type]))
+    )
+    text = " ".join(sentences).format(pct=rng.randrange(5, 100, 5))
+    location = project["location"]
+    anonymous = rng.random() < 0.3
+    return {
+        "review_id": f"REV-{project['id']}-{index + 1:05d}",
+        "reporter_name": (
+            "Anonymous"
+            if anonymous
+            else f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        ),
+        "reporter_contact": (
+            None if anonymous else f"+977-98{rng.randrange(10**8):08d}"
+        ),
+        "review_type": review_type,
+        "report_text": text,
+        "work_completed": review_type == "Completion Verification"
+        or rng.random() < 0.2,
+        "quality_rating": rng.randint(1, 5) if rng.random() < 0.7 else None,
+        "geolocation": {
+            "lat": round(location["lat"] + rng.uniform(-0.01, 0.01), 6),
+            "lng": round(location["lng"] + rng.uniform(-0.01, 0.01), 6),
+        },
+        "photo_urls": [
+            f"uploads/{rng.getrandbits(128):032x}.jpg"
+            for _ in range(rng.choices(range(6), (40, 25, 15, 10, 6, 4))[0])
+        ],
+        "verified": rng.random() < 0.25,
+        "timestamp": (
+            start + timedelta(minutes=rng.randrange(60 * 24 * 900))
+        ).isoformat(),
+    }
+
+
+def generate_project(index: int, report_count: int, seed: int, ministry_names: list):
+    """Project `index` in mock_data format, with `report_count` citizen reports"""
+    rng = random.Random(f"{seed}-{index}")
+    place = rng.choice(PLACES)
+    work = rng.choice(WORKS)
+    fiscal_year = rng.choice(FISCAL_YEARS)
+    status = _pick(rng, STATUSES)
+    approval = datetime(2023, 1, 1) + timedelta(days=rng.randrange(1000))
+    lat, lng = _coordinates(rng)
+
+    project = {
+        "id": project_id(index),
+        "fiscal_year": fiscal_year,
+        "ministry": rng.choice(ministry_names),
+        "budget_subtitle": f"{fiscal_year.split('/')[0]}-{rng.randrange(10, 40)}-{rng.randrange(1, 20):02d}",
+        "procurement_plan": {
+            "sl_no": index + 1,
+            "project_type": rng.choice(["Estimated", "Approved"]),
+            "details_of_work": f"{place} {work}-{rng.randrange(1, 15)}",
+            "date_of_approval": _date(approval),
+            "procurement_method": rng.choice(PROCUREMENT_METHODS),
+            "no_of_package": rng.randrange(0, 4),
+            "type_of_contract": rng.choice(CONTRACT_TYPES),
+            "tender_documents": {
+                "prepared_date": _date(approval + timedelta(days=3)),
+                "approved_date": _date(approval + timedelta(days=5)),
+            },
+            "date_of_agreement": _date(approval + timedelta(days=60)),
+            "tender": {
+                "invitation_date": _date(approval + timedelta(days=7)),
+                "open_date": _date(approval + timedelta(days=37)),
+                "evaluation_completion_date": _date(approval + timedelta(days=45)),
+                "proposal_consent_received": "",
+            },
+            "date_of_approval_tender": _date(approval + timedelta(days=50)),
+            "date_of_signing_contract": _date(approval + timedelta(days=60)),
+            "date_of_initiation": _date(approval + timedelta(days=62)),
+            "date_of_completion": _date(
+                approval + timedelta(days=62 + rng.randrange(90, 900))
+            ),
+            "contractor_name": rng.choice(CONTRACTORS),
+            "contract_number": f"SYN/{fiscal_year.split('/')[0]}/{index + 1:07d}",
+            "contract_amount": round(rng.lognormvariate(15.5, 1.2), 2),
+        },
+        "signatures": {
+            "preparing_officer": {
+                "signature": "signed",
+                "designation": "Procurement Officer",
+                "date": _date(approval),
+            },
+            "chief_of_office": {
+                "signature": "signed",
+                "designation": "Chief Administrative Officer",
+                "date": _date(approval + timedelta(days=1)),
+            },
+        },
+        "status": status,
+        "progress_percentage": (
+            100 if status == "Completed" else rng.randrange(0, 100, 5)
+        ),
+        "location": {
+            "lat": lat,
+            "lng": lng,
+            "address": f"{place}, Ward {rng.randrange(1, 20)}",
+        },
+    }
+    start = approval + timedelta(days=62)
+    project["citizen_reports"] = [
+        generate_report(rng, project, i, start) for i in range(report_count)
+    ]
+    return project
+
+
+async def load(projects: int, reports: int, seed: int, batch_size: int, jobs: int):
+    import migrate_database
+    from app.auth.service_db import create_demo_users
+    from app.database.config import database
+
+    migrate_database.create_tables()
+    ministry_names = ministries()
+    counts = report_counts(projects, reports, seed)
+
+    await database.connect()
+    try:
+        await migrate_database.import_ministries(ministry_names)
+
+        loaded_projects = 0
+        loaded_reports = 0
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(jobs)
+
+        async def load_batch(first: int):
+            nonlocal loaded_projects, loaded_reports
+            async with semaphore:
+                batch = [
+                    generate_project(i, counts[i], seed, ministry_names)
+                    for i in range(first, min(first + batch_size, projects))
+                ]
+                loaded_reports += await migrate_database.import_projects(batch)
+                loaded_projects += len(batch)
+                elapsed = time.perf_counter() - started
+                print(
+                    f"  {loaded_projects:>9,} projects  {loaded_reports:>11,} reports"
+                    f"  {loaded_reports / elapsed:>9,.0f} reports/s",
+                    flush=True,
+                )
+
+        await asyncio.gather(
+            *(load_batch(first) for first in range(0, projects, batch_size))
+        )
+        create_demo_users()
+    finally:
+        await database.disconnect()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Loaded {loaded_projects:,} projects and {loaded_reports:,} reports"
+        f" in {elapsed:.0f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--projects", type=int, default=DEFAULT_PROJECTS)
+    parser.add_argument("--reports", type=int, default=DEFAULT_REPORTS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--batch-size", type=int, default=200, help="Projects per transaction"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=4, help="Batches loaded concurrently"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(
+        load(args.projects, args.reports, args.seed, args.batch_size, args.jobs)
+    )
+
+
+if __name__ == "__main__":
+    main()
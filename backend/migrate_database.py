@@ -22,6 +22,7 @@ from app.database.models import (
     UploadedImage,
 )
 from app.data.mock_data import mock_projects, get_ministries
+from app.database.statistics import refresh_statistics
 from app.auth.service_db import create_demo_users
 import json
 from datetime import datetime
@@ -35,6 +36,129 @@ def create_tables():
     print("✅ Database tables created successfully!")
 
 
+PROJECT_UPSERT = """
+    INSERT INTO projects 
+    (id, fiscal_year, ministry, budget_subtitle, procurement_plan, 
+     signatures, status, progress_percentage, location, created_at, updated_at) 
+    VALUES (:id, :fiscal_year, :ministry, :budget_subtitle, :procurement_plan,
+            :signatures, :status, :progress_percentage, :location, :created_at, :updated_at)
+    ON CONFLICT (id) DO UPDATE SET
+        fiscal_year = EXCLUDED.fiscal_year,
+        ministry = EXCLUDED.ministry,
+        budget_subtitle = EXCLUDED.budget_subtitle,
+        procurement_plan = EXCLUDED.procurement_plan,
+        signatures = EXCLUDED.signatures,
+        status = EXCLUDED.status,
+        progress_percentage = EXCLUDED.progress_percentage,
+        location = EXCLUDED.location,
+        updated_at = EXCLUDED.updated_at
+"""
+
+REPORT_UPSERT = """
+    INSERT INTO citizen_reports 
+    (review_id, project_id, reporter_name, reporter_contact, review_type,
+     review_text, work_completed, quality_rating, geolocation, photo_urls,
+     verified, created_at, updated_at) 
+    VALUES (:review_id, :project_id, :reporter_name, :reporter_contact, :review_type,
+            :review_text, :work_completed, :quality_rating, :geolocation, :photo_urls,
+            :verified, :created_at, :updated_at)
+    ON CONFLICT (review_id) DO UPDATE SET
+        reporter_name = EXCLUDED.reporter_name,
+        reporter_contact = EXCLUDED.reporter_contact,
+        review_type = EXCLUDED.review_type,
+        review_text = EXCLUDED.review_text,
+        work_completed = EXCLUDED.work_completed,
+        quality_rating = EXCLUDED.quality_rating,
+        geolocation = EXCLUDED.geolocation,
+        photo_urls = EXCLUDED.photo_urls,
+        verified = EXCLUDED.verified,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+def parse_timestamp(timestamp_str):
+    """Report timestamps are ISO strings, sometimes with a trailing Z"""
+    try:
+        return datetime.fromisoformat(timestamp_str.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return datetime.now()
+
+
+def project_values(project_data):
+    """Row values for a project in mock_data format"""
+    return {
+        "id": project_data["id"],
+        "fiscal_year": project_data["fiscal_year"],
+        "ministry": project_data["ministry"],
+        "budget_subtitle": project_data["budget_subtitle"],
+        "procurement_plan": json.dumps(project_data["procurement_plan"]),
+        "signatures": json.dumps(project_data.get("signatures")),
+        "status": project_data["status"],
+        "progress_percentage": project_data["progress_percentage"],
+        "location": json.dumps(project_data.get("location")),
+        "created_at": datetime.now(),
+        "updated_at": datetime.now(),
+    }
+
+
+def report_values(project_id, index, report):
+    """Row values for the index-th citizen report of a project"""
+    return {
+        # Generate review_id if not present
+        "review_id": report.get("review_id", f"REV-{project_id}-{index+1:03d}"),
+        "project_id": project_id,
+        "reporter_name": report.get("reporter_name"),
+        "reporter_contact": report.get("reporter_contact"),
+        "review_type": report.get("review_type", "Progress Update"),
+        "review_text": report.get("report_text", ""),
+        "work_completed": report.get("work_completed", False),
+        "quality_rating": report.get("quality_rating"),
+        "geolocation": json.dumps(report.get("geolocation")),
+        "photo_urls": json.dumps(report.get("photo_urls", [])),
+        "verified": report.get("verified", False),
+        "created_at": parse_timestamp(
+            report.get("timestamp", datetime.now().isoformat())
+        ),
+        "updated_at": datetime.now(),
+    }
+
+
+async def import_ministries(ministry_names):
+    """Insert ministries that do not exist yet"""
+    await database.execute_many(
+        query="""
+            INSERT INTO ministries (name, created_at) 
+            VALUES (:name, :created_at) 
+            ON CONFLICT (name) DO NOTHING
+        """,
+        values=[
+            {"name": name, "created_at": datetime.now()} for name in ministry_names
+        ],
+    )
+
+
+async def import_projects(projects):
+    """
+    Upsert a batch of projects in mock_data format, with their citizen
+    reports and statistics, in one transaction. Returns the report count.
+    """
+    reports = [
+        report_values(project_data["id"], i, report)
+        for project_data in projects
+        for i, report in enumerate(project_data.get("citizen_reports", []))
+    ]
+    async with database.transaction():
+        await database.execute_many(
+            query=PROJECT_UPSERT, values=[project_values(p) for p in projects]
+        )
+        if reports:
+            await database.execute_many(query=REPORT_UPSERT, values=reports)
+        await refresh_statistics(
+            "p.id = ANY(:ids)", {"ids": [p["id"] for p in projects]}
+        )
+    return len(reports)
+
+
 async def import_mock_data():
     """Import mock data into the database"""
     print("Importing mock data...")
@@ -45,209 +169,16 @@ async def import_mock_data():
         # 1. Import ministries
         print("Importing ministries...")
         ministries_list = get_ministries()
-
-        for ministry_name in ministries_list:
-            query = """
-                INSERT INTO ministries (name, created_at) 
-                VALUES (:name, :created_at) 
-                ON CONFLICT (name) DO NOTHING
-            """
-            await database.execute(
-                query=query,
-                values={"name": ministry_name, "created_at": datetime.now()},
-            )
-
+        await import_ministries(ministries_list)
         print(f"✅ Imported {len(ministries_list)} ministries")
 
-        # 2. Import projects
+        # 2. Import projects, their citizen reports and statistics
         print("Importing projects...")
-
-        for project_data in mock_projects:
-            # Insert project (ON CONFLICT for PostgreSQL instead of INSERT OR REPLACE)
-            query = """
-                INSERT INTO projects 
-                (id, fiscal_year, ministry, budget_subtitle, procurement_plan, 
-                 signatures, status, progress_percentage, location, created_at, updated_at) 
-                VALUES (:id, :fiscal_year, :ministry, :budget_subtitle, :procurement_plan,
-                        :signatures, :status, :progress_percentage, :location, :created_at, :updated_at)
-                ON CONFLICT (id) DO UPDATE SET
-                    fiscal_year = EXCLUDED.fiscal_year,
-                    ministry = EXCLUDED.ministry,
-                    budget_subtitle = EXCLUDED.budget_subtitle,
-                    procurement_plan = EXCLUDED.procurement_plan,
-                    signatures = EXCLUDED.signatures,
-                    status = EXCLUDED.status,
-                    progress_percentage = EXCLUDED.progress_percentage,
-                    location = EXCLUDED.location,
-                    updated_at = EXCLUDED.updated_at
-            """
-
-            await database.execute(
-                query=query,
-                values={
-                    "id": project_data["id"],
-                    "fiscal_year": project_data["fiscal_year"],
-                    "ministry": project_data["ministry"],
-                    "budget_subtitle": project_data["budget_subtitle"],
-                    "procurement_plan": json.dumps(project_data["procurement_plan"]),
-                    "signatures": json.dumps(project_data.get("signatures")),
-                    "status": project_data["status"],
-                    "progress_percentage": project_data["progress_percentage"],
-                    "location": json.dumps(project_data.get("location")),
-                    "created_at": datetime.now(),
-                    "updated_at": datetime.now(),
-                },
-            )
-
-            # 3. Import citizen reports for this project
-            citizen_reports = project_data.get("citizen_reports", [])
-            for i, report in enumerate(citizen_reports):
-                # Generate review_id if not present
-                review_id = report.get(
-                    "review_id", f"REV-{project_data['id']}-{i+1:03d}"
-                )
-
-                query = """
-                    INSERT INTO citizen_reports 
-                    (review_id, project_id, reporter_name, reporter_contact, review_type,
-                     review_text, work_completed, quality_rating, geolocation, photo_urls,
-                     verified, created_at, updated_at) 
-                    VALUES (:review_id, :project_id, :reporter_name, :reporter_contact, :review_type,
-                            :review_text, :work_completed, :quality_rating, :geolocation, :photo_urls,
-                            :verified, :created_at, :updated_at)
-                    ON CONFLICT (review_id) DO UPDATE SET
-                        reporter_name = EXCLUDED.reporter_name,
-                        reporter_contact = EXCLUDED.reporter_contact,
-                        review_type = EXCLUDED.review_type,
-                        review_text = EXCLUDED.review_text,
-                        work_completed = EXCLUDED.work_completed,
-                        quality_rating = EXCLUDED.quality_rating,
-                        geolocation = EXCLUDED.geolocation,
-                        photo_urls = EXCLUDED.photo_urls,
-                        verified = EXCLUDED.verified,
-                        updated_at = EXCLUDED.updated_at
-                """
-
-                # Parse timestamp properly
-                timestamp_str = report.get("timestamp", datetime.now().isoformat())
-                try:
-                    if timestamp_str.endswith("Z"):
-                        timestamp_str = timestamp_str[:-1] + "+00:00"
-                    created_at = datetime.fromisoformat(
-                        timestamp_str.replace("Z", "+00:00")
-                    )
-                except:
-                    created_at = datetime.now()
-
-                await database.execute(
-                    query=query,
-                    values={
-                        "review_id": review_id,
-                        "project_id": project_data["id"],
-                        "reporter_name": report.get("reporter_name"),
-                        "reporter_contact": report.get("reporter_contact"),
-                        "review_type": report.get("review_type", "Progress Update"),
-                        "review_text": report.get("report_text", ""),
-                        "work_completed": report.get("work_completed", False),
-                        "quality_rating": report.get("quality_rating"),
-                        "geolocation": json.dumps(report.get("geolocation")),
-                        "photo_urls": json.dumps(report.get("photo_urls", [])),
-                        "verified": report.get("verified", False),
-                        "created_at": created_at,
-                        "updated_at": datetime.now(),
-                    },
-                )
-
+        total_reports = await import_projects(mock_projects)
         print(f"✅ Imported {len(mock_projects)} projects with their citizen reports")
-
-        # 4. Calculate and insert project statistics
-        print("Calculating project statistics...")
-
-        for project_data in mock_projects:
-            project_id = project_data["id"]
-            reports = project_data.get("citizen_reports", [])
-
-            # Calculate statistics
-            total_reviews = len(reports)
-            work_completed_count = sum(
-                1 for r in reports if r.get("work_completed", False)
-            )
-            work_completed_percentage = (
-                (work_completed_count / total_reviews * 100) if total_reviews > 0 else 0
-            )
-
-            ratings = [
-                r.get("quality_rating") for r in reports if r.get("quality_rating")
-            ]
-            avg_rating = sum(ratings) / len(ratings) if ratings else None
-
-            reviews_with_images = sum(1 for r in reports if r.get("photo_urls"))
-            verified_reviews = sum(1 for r in reports if r.get("verified", False))
-
-            # Count review types
-            review_type_counts = {
-                "progress_updates": 0,
-                "quality_issues": 0,
-                "completion_verifications": 0,
-                "delay_reports": 0,
-                "fraud_alerts": 0,
-            }
-
-            for report in reports:
-                review_type = (
-                    report.get("review_type", "Progress Update")
-                    .lower()
-                    .replace(" ", "_")
-                )
-                if review_type in review_type_counts:
-                    review_type_counts[review_type] += 1
-
-            # Insert statistics (PostgreSQL style)
-            query = """
-                INSERT INTO project_statistics 
-                (project_id, total_reviews, work_completed_percentage, average_quality_rating,
-                 reviews_with_images, verified_reviews, progress_updates, quality_issues,
-                 completion_verifications, delay_reports, fraud_alerts, last_calculated) 
-                VALUES (:project_id, :total_reviews, :work_completed_percentage, :average_quality_rating,
-                        :reviews_with_images, :verified_reviews, :progress_updates, :quality_issues,
-                        :completion_verifications, :delay_reports, :fraud_alerts, :last_calculated)
-                ON CONFLICT (project_id) DO UPDATE SET
-                    total_reviews = EXCLUDED.total_reviews,
-                    work_completed_percentage = EXCLUDED.work_completed_percentage,
-                    average_quality_rating = EXCLUDED.average_quality_rating,
-                    reviews_with_images = EXCLUDED.reviews_with_images,
-                    verified_reviews = EXCLUDED.verified_reviews,
-                    progress_updates = EXCLUDED.progress_updates,
-                    quality_issues = EXCLUDED.quality_issues,
-                    completion_verifications = EXCLUDED.completion_verifications,
-                    delay_reports = EXCLUDED.delay_reports,
-                    fraud_alerts = EXCLUDED.fraud_alerts,
-                    last_calculated = EXCLUDED.last_calculated
-            """
-
-            await database.execute(
-                query=query,
-                values={
-                    "project_id": project_id,
-                    "total_reviews": total_reviews,
-                    "work_completed_percentage": work_completed_percentage,
-                    "average_quality_rating": avg_rating,
-                    "reviews_with_images": reviews_with_images,
-                    "verified_reviews": verified_reviews,
-                    "progress_updates": review_type_counts["progress_updates"],
-                    "quality_issues": review_type_counts["quality_issues"],
-                    "completion_verifications": review_type_counts[
-                        "completion_verifications"
-                    ],
-                    "delay_reports": review_type_counts["delay_reports"],
-                    "fraud_alerts": review_type_counts["fraud_alerts"],
-                    "last_calculated": datetime.now(),
-                },
-            )
-
         print(f"✅ Calculated statistics for {len(mock_projects)} projects")
 
-        # 5. Create demo users for authentication testing
+        # 3. Create demo users for authentication testing
         print("Creating demo users for authentication...")
         create_demo_users()
         print("✅ Demo users created successfully!")
@@ -256,8 +187,6 @@ async def import_mock_data():
         print(f"📊 Database Summary:")
         print(f"   - {len(ministries_list)} ministries")
         print(f"   - {len(mock_projects)} projects")
-
-        total_reports = sum(len(p.get("citizen_reports", [])) for p in mock_projects)
         print(f"   - {total_reports} citizen reports")
 
     except Exception as e:
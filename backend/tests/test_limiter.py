@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+from app.rag.limiter import BACKOFF_FACTOR, AdaptiveLimiter, LimiterSaturated
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class Overload(Exception):
+    pass
+
+
+def test_success_grows_limit_additively():
+    limiter = AdaptiveLimiter(initial=4, min_limit=1, max_limit=8)
+
+    async def go():
+        for _ in range(4):
+            async with limiter.slot():
+                pass
+
+    run(go())
+    # +1/limit per success: about one step per limit's worth of calls
+    assert 4.9 < limiter.limit < 5.0
+    assert limiter.in_flight == 0
+    assert limiter.stats["admitted"] == 4
+
+
+def test_growth_stops_at_max_limit():
+    limiter = AdaptiveLimiter(initial=2, min_limit=1, max_limit=3)
+
+    async def go():
+        for _ in range(50):
+            async with limiter.slot():
+                pass
+
+    run(go())
+    assert limiter.limit == 3
+
+
+def test_overload_halves_limit_down_to_min():
+    limiter = AdaptiveLimiter(initial=8, min_limit=3, max_limit=8)
+
+    async def overloaded_call():
+        with pytest.raises(Overload):
+            async with limiter.slot(lambda e: isinstance(e, Overload)):
+                raise Overload()
+
+    run(overloaded_call())
+    assert limiter.limit == 8 * BACKOFF_FACTOR
+    run(overloaded_call())
+    assert limiter.limit == 3
+    assert limiter.stats["overloads"] == 2
+    assert limiter.in_flight == 0
+
+
+def test_other_errors_leave_limit_alone():
+    limiter = AdaptiveLimiter(initial=4)
+
+    async def go():
+        with pytest.raises(ValueError):
+            async with limiter.slot(lambda e: isinstance(e, Overload)):
+                raise ValueError()
+
+    run(go())
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+
+def test_queued_requests_are_admitted_in_fifo_order():
+    limiter = AdaptiveLimiter(initial=1, max_limit=1, queue_size=5, queue_timeout=5)
+    admitted = []
+
+    async def request(name, hold):
+        async with limiter.slot():
+            admitted.append(name)
+            await hold.wait()
+
+    async def go():
+        holds = {name: asyncio.Event() for name in "abcd"}
+        tasks = []
+        for name in "abcd":
+            tasks.append(asyncio.create_task(request(name, holds[name])))
+            await asyncio.sleep(0)
+        assert admitted == ["a"]
+        assert limiter.queue_depth == 3
+        for name in "abcd":
+            holds[name].set()
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+
+    run(go())
+    assert admitted == ["a", "b", "c", "d"]
+    assert limiter.stats["queued"] == 3
+    assert limiter.in_flight == 0 and limiter.queue_depth == 0
+
+
+def test_full_queue_rejects_immediately():
+    limiter = AdaptiveLimiter(initial=1, max_limit=1, queue_size=1, queue_timeout=5)
+
+    async def go():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.saturated()
+        with pytest.raises(LimiterSaturated) as excinfo:
+            await limiter.acquire()
+        assert excinfo.value.retry_after >= 1
+        limiter.release(False)
+        await waiter
+        limiter.release(False)
+
+    run(go())
+    assert limiter.stats["rejected"] == 1
+    assert limiter.in_flight == 0
+
+
+def test_queue_timeout_rejects_and_leaves_the_queue():
+    limiter = AdaptiveLimiter(initial=1, max_limit=1, queue_size=4, queue_timeout=0.05)
+
+    async def go():
+        await limiter.acquire()
+        with pytest.raises(LimiterSaturated):
+            await limiter.acquire()
+        assert limiter.queue_depth == 0
+        limiter.release(False)
+
+    run(go())
+    assert limiter.stats["rejected"] == 1
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    limiter = AdaptiveLimiter(initial=1, max_limit=1, queue_size=4, queue_timeout=5)
+
+    async def go():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.queue_depth == 0
+        limiter.release(False)
+        # The slot is free again for the next caller
+        await asyncio.wait_for(limiter.acquire(), 1)
+        limiter.release(False)
+
+    run(go())
+    assert limiter.in_flight == 0
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from app.rag import sessions
+from app.rag.sessions import ConversationStore
+
+
+async def _no_summary(previous, messages):
+    raise AssertionError("summarize should not be called")
+
+
+@pytest.fixture
+def word_tokens(monkeypatch):
+    """One token per word and no per-message overhead, small budgets"""
+    monkeypatch.setattr(sessions, "count_tokens", lambda text: len(text.split()))
+    monkeypatch.setattr(sessions, "MESSAGE_OVERHEAD_TOKENS", 0)
+    monkeypatch.setattr(sessions, "RAG_SESSION_SUMMARY_TRIGGER_TOKENS", 10)
+    monkeypatch.setattr(sessions, "RAG_SESSION_KEEP_TOKENS", 5)
+
+
+def test_unknown_session_id_starts_a_new_conversation():
+    store = ConversationStore(_no_summary)
+    first = store.get_or_create(None)
+    assert store.get_or_create(first.id) is first
+    other = store.get_or_create("no-such-session")
+    assert other is not first and other.id != "no-such-session"
+    assert len(store) == 2
+
+
+def test_idle_sessions_expire():
+    store = ConversationStore(_no_summary, ttl_seconds=60)
+    conversation = store.get_or_create(None)
+    conversation.updated_at -= 61
+    assert store.get_or_create(conversation.id) is not conversation
+    assert len(store) == 1
+
+
+def test_least_recently_used_session_is_evicted_at_the_cap():
+    store = ConversationStore(_no_summary, max_sessions=2)
+    a = store.get_or_create(None)
+    b = store.get_or_create(None)
+    store.get_or_create(a.id)  # a is now the most recently used
+    c = store.get_or_create(None)
+    assert len(store) == 2
+    assert store.get_or_create(a.id) is a
+    assert store.get_or_create(c.id) is c
+    assert store.get_or_create(b.id) is not b
+
+
+def test_delete():
+    store = ConversationStore(_no_summary)
+    conversation = store.get_or_create(None)
+    assert store.delete(conversation.id)
+    assert not store.delete(conversation.id)
+    assert len(store) == 0
+
+
+async def _until_compacted(conversation):
+    for _ in range(100):
+        await asyncio.sleep(0)
+        if not conversation.compacting:
+            return
+    raise AssertionError("compaction did not finish")
+
+
+def test_long_history_is_folded_into_a_summary(word_tokens):
+    summarized = []
+
+    async def summarize(previous, messages):
+        summarized.append((previous, [m["content"] for m in messages]))
+        return "  they asked about passports  "
+
+    async def go():
+        store = ConversationStore(summarize)
+        conversation = store.get_or_create(None)
+        store.record_turn(conversation, "one two three", "four five six")
+        assert not conversation.compacting  # 6 tokens, under the trigger
+        store.record_turn(conversation, "seven eight nine", "ten eleven")
+        assert conversation.compacting  # 11 tokens
+        await _until_compacted(conversation)
+        return conversation
+
+    conversation = asyncio.run(go())
+    # The newest pair (5 tokens) fits the keep budget; older turns were summarized
+    assert summarized == [("", ["one two three", "four five six"])]
+    assert conversation.summary == "they asked about passports"
+    assert [m["content"] for m in conversation.messages] == [
+        "seven eight nine",
+        "ten eleven",
+    ]
+
+
+def test_turns_recorded_during_summarizing_are_kept(word_tokens):
+    release = None
+
+    async def summarize(previous, messages):
+        await release.wait()
+        return "summary"
+
+    async def go():
+        nonlocal release
+        release = asyncio.Event()
+        store = ConversationStore(summarize)
+        conversation = store.get_or_create(None)
+        store.record_turn(conversation, "a b c d", "e f g h")
+        store.record_turn(conversation, "i j", "k l")
+        await asyncio.sleep(0)
+        assert conversation.compacting
+        store.record_turn(conversation, "new", "turn")
+        release.set()
+        await _until_compacted(conversation)
+        return conversation
+
+    conversation = asyncio.run(go())
+    assert conversation.summary == "summary"
+    assert [m["content"] for m in conversation.messages] == [
+        "i j",
+        "k l",
+        "new",
+        "turn",
+    ]
+
+
+def test_failed_summary_keeps_the_full_history(word_tokens):
+    async def summarize(previous, messages):
+        raise RuntimeError("provider down")
+
+    async def go():
+        store = ConversationStore(summarize)
+        conversation = store.get_or_create(None)
+        store.record_turn(conversation, "a b c d", "e f g h")
+        store.record_turn(conversation, "i j", "k l")
+        await _until_compacted(conversation)
+        return conversation
+
+    conversation = asyncio.run(go())
+    assert conversation.summary == ""
+    assert len(conversation.messages) == 4
+    assert not conversation.compacting
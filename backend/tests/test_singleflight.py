@@ -0,0 +1,172 @@
+import asyncio
+
+import pytest
+
+from app.rag.singleflight import (
+    SingleFlight,
+    StreamBroadcast,
+    StreamSingleFlight,
+    normalize_query,
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_normalize_query_folds_case_spacing_and_trailing_marks():
+    assert (
+        normalize_query("  How do I   renew a Passport? ")
+        == "how do i renew a passport"
+    )
+    assert normalize_query("नागरिकता कसरी बनाउने।") == "नागरिकता कसरी बनाउने"
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def answer():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "reply"
+
+    async def go():
+        results = await asyncio.gather(*(flight.do("q", answer) for _ in range(5)))
+        assert results == ["reply"] * 5
+        # Nothing is cached: the next request starts a fresh call
+        assert await flight.do("q", answer) == "reply"
+
+    run(go())
+    assert calls == 2
+    assert flight.stats == {"leaders": 2, "joined": 4}
+
+
+def test_different_keys_do_not_share():
+    flight = SingleFlight()
+
+    async def go():
+        return await asyncio.gather(
+            flight.do("a", lambda: asyncio.sleep(0, "A")),
+            flight.do("b", lambda: asyncio.sleep(0, "B")),
+        )
+
+    assert run(go()) == ["A", "B"]
+    assert flight.stats["leaders"] == 2
+
+
+def test_error_reaches_every_caller_and_key_is_released():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def go():
+        results = await asyncio.gather(
+            *(flight.do("q", failing) for _ in range(3)), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert await flight.do("q", lambda: asyncio.sleep(0, "ok")) == "ok"
+
+    run(go())
+
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    flight = SingleFlight()
+    finished = []
+
+    async def answer():
+        await asyncio.sleep(0.02)
+        finished.append(True)
+        return "reply"
+
+    async def go():
+        first = asyncio.create_task(flight.do("q", answer))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flight.do("q", answer))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "reply"
+
+    run(go())
+    assert finished == [True]
+
+
+async def _gated_source(gates, items, error=None):
+    for gate, item in zip(gates, items):
+        await gate.wait()
+        yield item
+    if error is not None:
+        raise error
+
+
+def test_late_subscriber_is_replayed_from_the_start():
+    async def go():
+        gates = [asyncio.Event() for _ in range(3)]
+        broadcast = StreamBroadcast(_gated_source(gates, ["a", "b", "c"]))
+
+        async def collect(seen):
+            async for item in broadcast.subscribe():
+                seen.append(item)
+
+        early = []
+        early_task = asyncio.create_task(collect(early))
+        gates[0].set()
+        gates[1].set()
+        await asyncio.sleep(0.01)
+        assert early == ["a", "b"]
+
+        late = []
+        late_task = asyncio.create_task(collect(late))
+        await asyncio.sleep(0.01)
+        assert late == ["a", "b"]
+
+        gates[2].set()
+        await asyncio.gather(early_task, late_task)
+        return early, late
+
+    early, late = run(go())
+    assert early == late == ["a", "b", "c"]
+
+
+def test_stream_error_is_raised_after_the_items():
+    async def go():
+        gate = asyncio.Event()
+        gate.set()
+        broadcast = StreamBroadcast(
+            _gated_source([gate], ["a"], error=RuntimeError("boom"))
+        )
+        seen = []
+        with pytest.raises(RuntimeError, match="boom"):
+            async for item in broadcast.subscribe():
+                seen.append(item)
+        return seen
+
+    assert run(go()) == ["a"]
+
+
+def test_stream_single_flight_runs_one_upstream_per_key():
+    flight = StreamSingleFlight()
+    started = 0
+
+    async def upstream():
+        nonlocal started
+        started += 1
+        for item in ("x", "y"):
+            await asyncio.sleep(0.01)
+            yield item
+
+    async def collect():
+        return [item async for item in flight.subscribe("q", upstream)]
+
+    async def go():
+        results = await asyncio.gather(collect(), collect(), collect())
+        await asyncio.sleep(0)
+        assert not flight.active("q")
+        return results
+
+    assert run(go()) == [["x", "y"]] * 3
+    assert started == 1
+    assert flight.stats == {"leaders": 1, "joined": 2}
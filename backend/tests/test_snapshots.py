@@ -0,0 +1,223 @@
+import os
+import time
+
+import pytest
+
+from app.rag import snapshots
+from app.rag.snapshots import (
+    IndexManager,
+    acknowledge_snapshots,
+    clear_building,
+    create_snapshot,
+    current_snapshot,
+    mark_building,
+    prune_snapshots,
+    publish_snapshot,
+    read_pointer,
+    rollback_snapshot,
+)
+
+
+def _names(root):
+    return sorted(os.listdir(os.path.join(root, snapshots.SNAPSHOTS_DIRNAME)))
+
+
+def _publish(root, content=None, **kwargs):
+    name, directory = create_snapshot(str(root))
+    if content is not None:
+        with open(os.path.join(directory, "index.bin"), "w") as f:
+            f.write(content)
+    publish_snapshot(str(root), name, **kwargs)
+    return name
+
+
+class FakeRetriever:
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class CountingLoader:
+    def __init__(self):
+        self.loaded = []
+
+    def __call__(self, path):
+        self.loaded.append(os.path.basename(path))
+        return FakeRetriever(path)
+
+
+def test_legacy_store_is_served_in_place(tmp_path):
+    assert current_snapshot(str(tmp_path)) == (None, str(tmp_path))
+
+
+def test_new_snapshot_copies_the_published_one(tmp_path):
+    first = _publish(tmp_path, "v1")
+    name, directory = create_snapshot(str(tmp_path))
+    assert name > first
+    with open(os.path.join(directory, "index.bin")) as f:
+        assert f.read() == "v1"
+    # Not published until publish_snapshot()
+    assert current_snapshot(str(tmp_path))[0] == first
+
+
+def test_snapshot_names_sort_by_creation_within_one_second(tmp_path):
+    created = [create_snapshot(str(tmp_path))[0] for _ in range(12)]
+    assert sorted(created) == created
+    assert len(set(created)) == 12
+
+
+def test_pruned_names_are_not_reused(tmp_path):
+    published = [_publish(tmp_path) for _ in range(5)]
+    newest = _publish(tmp_path)
+    assert newest > max(published)
+    assert current_snapshot(str(tmp_path))[0] == newest
+
+
+def test_publish_and_rollback_swap_current_and_previous(tmp_path):
+    root = str(tmp_path)
+    first = _publish(tmp_path)
+    second = _publish(tmp_path)
+    assert read_pointer(root)["current"] == second
+    assert read_pointer(root)["previous"] == first
+
+    assert rollback_snapshot(root) == first
+    assert current_snapshot(root)[0] == first
+    assert read_pointer(root)["previous"] == second
+
+
+def test_rollback_needs_a_previous_snapshot(tmp_path):
+    _publish(tmp_path, previous=None)
+    with pytest.raises(ValueError):
+        rollback_snapshot(str(tmp_path))
+
+
+def test_publish_can_pin_previous_to_the_run_origin(tmp_path):
+    origin = _publish(tmp_path)
+    _publish(tmp_path, previous=origin)
+    last = _publish(tmp_path, previous=origin)
+    assert read_pointer(str(tmp_path)) | {"published_at": None} == {
+        "current": last,
+        "previous": origin,
+        "published_at": None,
+    }
+
+
+def test_prune_keeps_current_previous_and_spares(tmp_path):
+    published = [_publish(tmp_path) for _ in range(6)]
+    # Default keep=3: current, previous and the newest spare
+    assert _names(tmp_path) == published[-3:]
+
+
+def test_prune_never_deletes_the_working_snapshot(tmp_path):
+    root = str(tmp_path)
+    origin = _publish(tmp_path)
+    working, _ = create_snapshot(root)
+    mark_building(root, working, origin, origin)
+    for _ in range(4):
+        _publish(tmp_path, previous=origin)
+    assert working in _names(tmp_path)
+    assert origin in _names(tmp_path)
+
+    clear_building(root)
+    prune_snapshots(root, keep=2)
+    assert working not in _names(tmp_path)
+
+
+def test_prune_skips_snapshots_a_reader_still_acknowledges(tmp_path):
+    root = str(tmp_path)
+    served = _publish(tmp_path)
+    acknowledge_snapshots(root, "api-1", [served])
+    for _ in range(4):
+        _publish(tmp_path)
+    prune_snapshots(root, keep=2)
+    assert served in _names(tmp_path)
+
+    # A reader that stopped acknowledging no longer protects anything
+    reader_file = os.path.join(root, snapshots.READERS_DIRNAME, "api-1.json")
+    stale = time.time() - snapshots.RAG_SNAPSHOT_READER_TTL - 1
+    os.utime(reader_file, (stale, stale))
+    prune_snapshots(root, keep=2)
+    assert served not in _names(tmp_path)
+    assert not os.path.exists(reader_file)
+
+
+def test_index_manager_loads_once_and_hot_swaps(tmp_path):
+    root = str(tmp_path)
+    loader = CountingLoader()
+    first = _publish(tmp_path)
+    manager = IndexManager(root, loader)
+
+    retriever = manager.get()
+    assert manager.get() is retriever
+    assert manager.refresh() is False
+    assert loader.loaded == [first]
+
+    second = _publish(tmp_path)
+    assert manager.refresh() is True
+    assert manager.version == second
+    assert manager.get() is not retriever
+    assert loader.loaded == [first, second]
+
+
+def test_index_manager_acknowledges_what_it_holds(tmp_path):
+    root = str(tmp_path)
+    first = _publish(tmp_path)
+    manager = IndexManager(root, CountingLoader())
+    manager.get()
+    second = _publish(tmp_path)
+    manager.refresh()
+    assert snapshots.acknowledged_snapshots(root) == {first, second}
+
+
+def test_rollback_to_previous_reuses_the_loaded_retriever(tmp_path):
+    root = str(tmp_path)
+    loader = CountingLoader()
+    first = _publish(tmp_path)
+    manager = IndexManager(root, loader)
+    old = manager.get()
+    _publish(tmp_path)
+    manager.refresh()
+
+    assert manager.rollback() == first
+    assert manager.get() is old
+    assert len(loader.loaded) == 2
+
+
+def test_evicted_retriever_is_closed_after_the_grace_period(tmp_path):
+    root = str(tmp_path)
+    manager = IndexManager(root, CountingLoader(), close_grace=60)
+    _publish(tmp_path)
+    oldest = manager.get()
+    _publish(tmp_path)
+    manager.refresh()
+    _publish(tmp_path)
+    manager.refresh()  # oldest drops out of current/previous
+
+    assert manager.close_retired() == 0
+    assert not oldest.closed
+    assert manager.close_retired(force=True) == 1
+    assert oldest.closed
+    assert manager.previous[1].closed is False
+
+
+def test_republished_retired_snapshot_is_reused_not_closed(tmp_path):
+    root = str(tmp_path)
+    loader = CountingLoader()
+    manager = IndexManager(root, loader, close_grace=60)
+    first = _publish(tmp_path)
+    oldest = manager.get()
+    _publish(tmp_path)
+    manager.refresh()
+    _publish(tmp_path)
+    manager.refresh()
+
+    # e.g. an operator points current.json back at it before the close
+    publish_snapshot(root, first)
+    manager.refresh()
+    assert manager.get() is oldest
+    assert len(loader.loaded) == 3
+    manager.close_retired(force=True)
+    assert not oldest.closed
@@ -1,22 +1,33 @@
 import os
-import json
-import torch
-import openai
-import torch
+import sys
+import asyncio
+import logging
+from pathlib import Path
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 
+# Shared RAG helpers live in the backend package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from app.rag.context import pack_prompt
+from app.rag.embeddings import get_collection_name, get_embedding_backend, get_embeddings
+from app.rag.llm import LLMError, get_llm, get_llm_provider_name
+from app.rag.retriever import build_retriever
+from app.rag.snapshots import IndexManager
+from app.logging_config import RequestIdMiddleware, setup_logging
 
 load_dotenv()
+setup_logging()
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="RAG Chat API",
     version="0.1.0",
     docs_url="/",  # swagger at root, like your working app
 )
+app.add_middleware(RequestIdMiddleware)
 
 
 # -------------------------------------------------------------------
@@ -25,8 +36,9 @@ app = FastAPI(
 
 RAG_PERSIST_DIR = "./chroma_db"
 
-rag_vectorstore = None
-rag_retriever = None
+rag_embedding = None
+rag_index = None
+chat_llm = None
 
 
 def get_openai_api_key() -> str:
@@ -37,38 +49,55 @@ def get_openai_api_key() -> str:
             status_code=500,
             detail="No API key found. Set MATE or OPENAI_API_KEY in your .env.",
         )
-    print(key)
     return key
 
 
-def get_rag_retriever():
-    """Lazy-load Chroma + HuggingFaceEmbeddings and return a retriever."""
-    global rag_vectorstore, rag_retriever
+def _load_rag_retriever(persist_dir: str):
+    """Open Chroma + the BM25 index of one index snapshot."""
+    global rag_embedding
+
+    backend = get_embedding_backend()
+    if rag_embedding is None:
+        api_key = get_openai_api_key() if backend == "openai" else None
+        rag_embedding = get_embeddings(backend, api_key=api_key)
+    collection_name = get_collection_name(backend)
+
+    vectorstore = Chroma(
+        collection_name=collection_name,
+        persist_directory=persist_dir,
+        embedding_function=rag_embedding,
+    )
+    return build_retriever(vectorstore, persist_dir, collection_name)
+
 
-    if rag_retriever is not None:
-        return rag_retriever
+def get_rag_index() -> IndexManager:
+    """Index manager that hot-swaps published snapshots of RAG_PERSIST_DIR."""
+    global rag_index
 
     if not os.path.exists(RAG_PERSIST_DIR):
         raise HTTPException(
             status_code=500,
             detail=f"Vector DB not found at {RAG_PERSIST_DIR}. Run your ingestion script first.",
         )
-    
+    if rag_index is None:
+        rag_index = IndexManager(RAG_PERSIST_DIR, _load_rag_retriever)
+    return rag_index
 
-    embedding = OpenAIEmbeddings(
-        model="text-embedding-3-small",   
-        api_key=get_openai_api_key()
-    )
 
+def get_rag_retriever():
+    """Retriever for the currently published index snapshot (loaded lazily)."""
+    return get_rag_index().get()
 
-    rag_vectorstore = Chroma(
-        persist_directory=RAG_PERSIST_DIR,
-        embedding_function=embedding,
-    )
 
-    rag_retriever = rag_vectorstore.as_retriever(search_kwargs={"k": 3})
-    print("[RAG] Retriever initialized.")
-    return rag_retriever
+def get_chat_llm():
+    """Chat-completion provider selected by RAG_LLM_PROVIDER (created once)."""
+    global chat_llm
+
+    if chat_llm is None:
+        provider = get_llm_provider_name()
+        api_key = get_openai_api_key() if provider == "openai" else None
+        chat_llm = get_llm(provider, api_key=api_key)
+    return chat_llm
 
 
 def _latest_user_text(messages) -> str:
@@ -79,14 +108,39 @@ def _latest_user_text(messages) -> str:
     return ""
 
 
-def _format_context(docs) -> str:
-    """Turn Chroma documents into a context block for the system prompt."""
-    parts = []
-    for d in docs:
-        source = d.metadata.get("source", "Unknown")
-        page = d.metadata.get("page", "Unknown")
-        parts.append(f"Source: {source}, Page: {page}\n{d.page_content}")
-    return "\n\n---\n\n".join(parts)
+# Instructions for the chatbot; the packed CONTEXT block is appended per request
+RAG_SYSTEM_PROMPT = (
+    "You are an assistant that helps people understand official government procedures, "
+    "required documents, and official fees in Nepal. Your main goal is to prevent citizens "
+    "from being exploited, overcharged, or misled by bureaucrats.\n\n"
+    "You are given some legal and procedural context below (laws, regulations, notices, "
+    "and guidelines). Treat this a primary reference.\n\n"
+    "When you answer questions:\n"
+    "- Focus on explaining:\n"
+    "  • What the process is (step by step).\n"
+    "  • Which office or authority is responsible.\n"
+    "  • What documents are required.\n"
+    "  • What are the costs to be paid if any.\n"
+#    "- If the context clearly states the fee or required documents, use those exact details.\n"
+#    "- If the context is partial or does not mention everything, use your general understanding "
+#    "  of Nepal’s administrative practices to give a helpful and realistic answer.\n"
+    "- Always make it clear that only officially prescribed fees should be paid. Politely remind "
+    "  users that they are not required to pay any extra or unofficial amount beyond the official "
+    "  government fee, and that they should always ask for an official receipt.\n"
+    "- If a user describes a situation that looks like bribery, overcharging, or harassment, "
+    "  calmly explain that such demands are not legal and suggest that they can:\n"
+    "  • Refuse to pay unofficial fees.\n"
+    "  • Ask for written/official notice of any fee.\n"
+    "  • Record details (date, office, name of officer, amount asked).\n"
+    "  • Contact the appropriate complaint or anti-corruption channel in Nepal.\n"
+    "- If the question is clearly unrelated to government procedures, laws or corruption, answer "
+    "  briefly or explain that you are focused on administrative and legal information.\n\n"
+    "Style guidelines:\n"
+    "- Answer using the language of the user content (English or Nepali).\n"
+    "- Prefer bullet points and short steps instead of long paragraphs.\n"
+    "- Mention, where possible, which law, rule, or type of official document your answer is based on.\n"
+    "Below is the context you can use:\n\n"
+)
 
 
 # -------------------------------------------------------------------
@@ -98,10 +152,14 @@ def _format_context(docs) -> str:
 async def startup_event():
     try:
         get_rag_retriever()
-        print("[RAG] Startup: retriever ready.")
-    except Exception as e:
+        logger.info("Startup: retriever ready.")
+    except Exception:
         # Don't crash on startup; endpoint will still try to initialize later
-        print(f"[RAG] Failed to initialize retriever on startup: {e}")
+        logger.exception("Failed to initialize retriever on startup")
+        return
+
+    # Hot-swap to snapshots published by rag_system.py while serving
+    asyncio.create_task(get_rag_index().watch())
 
 
 # -------------------------------------------------------------------
@@ -160,67 +218,16 @@ async def rag_chatbot_endpoint(request: Request):
             detail=f"Error retrieving context from vector DB: {e}",
         )
 
-    context_text = _format_context(docs)
-
-    # 2) Build RAG-aware system prompt
-    system_prompt = (
-    "You are an assistant that helps people understand official government procedures, "
-    "required documents, and official fees in Nepal. Your main goal is to prevent citizens "
-    "from being exploited, overcharged, or misled by bureaucrats.\n\n"
-    "You are given some legal and procedural context below (laws, regulations, notices, "
-    "and guidelines). Treat this a primary reference.\n\n"
-    "When you answer questions:\n"
-    "- Focus on explaining:\n"
-    "  • What the process is (step by step).\n"
-    "  • Which office or authority is responsible.\n"
-    "  • What documents are required.\n"
-    "  • What are the costs to be paid if any.\n"
-#    "- If the context clearly states the fee or required documents, use those exact details.\n"
-#    "- If the context is partial or does not mention everything, use your general understanding "
-#    "  of Nepal’s administrative practices to give a helpful and realistic answer.\n"
-    "- Always make it clear that only officially prescribed fees should be paid. Politely remind "
-    "  users that they are not required to pay any extra or unofficial amount beyond the official "
-    "  government fee, and that they should always ask for an official receipt.\n"
-    "- If a user describes a situation that looks like bribery, overcharging, or harassment, "
-    "  calmly explain that such demands are not legal and suggest that they can:\n"
-    "  • Refuse to pay unofficial fees.\n"
-    "  • Ask for written/official notice of any fee.\n"
-    "  • Record details (date, office, name of officer, amount asked).\n"
-    "  • Contact the appropriate complaint or anti-corruption channel in Nepal.\n"
-    "- If the question is clearly unrelated to government procedures, laws or corruption, answer "
-    "  briefly or explain that you are focused on administrative and legal information.\n\n"
-    "Style guidelines:\n"
-    "- Answer using the language of the user content (English or Nepali).\n"
-    "- Prefer bullet points and short steps instead of long paragraphs.\n"
-    "- Mention, where possible, which law, rule, or type of official document your answer is based on.\n"
-    "Below is the context you can use:\n\n"
-    "CONTEXT:\n"
-    f"{context_text}\n\n"
-    )
-
-
-
-
-    # Compose final messages: system + existing conversation
-    full_messages = [
-        {"role": "system", "content": system_prompt},
-    ] + messages
-
-    # 3) Call OpenAI directly (no helper)
-    api_key = get_openai_api_key()
-    client = openai.OpenAI(api_key=api_key)
+    # 2) Pack system prompt, retrieved chunks and recent history into the token budget
+    packed = pack_prompt(RAG_SYSTEM_PROMPT, docs, messages)
+    full_messages = packed.messages
+    docs = packed.docs
 
+    # 3) Complete with the configured provider (RAG_LLM_PROVIDER / RAG_LLM_MODEL)
     try:
-        resp = client.chat.completions.create(
-            model="gpt-5-mini-2025-08-07",
-            messages=full_messages,
-            top_p=1,
-            presence_penalty=0,
-            frequency_penalty=0,
-        )
-        reply = resp.choices[0].message.content
-    except openai.OpenAIError as e:
-        raise HTTPException(status_code=500, detail=f"OpenAI API error: {e}")
+        reply = get_chat_llm().complete(full_messages)
+    except LLMError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
     # Append the assistant's reply to the conversation
     messages.append({"role": "assistant", "content": reply})
@@ -0,0 +1,72 @@
+"""
+Persistent chunk-hash -> embedding cache for ingestion
+
+Stored in SQLite next to the Chroma store, one file per collection (and so
+per embedding backend). Chunks whose text was embedded before - in an
+earlier run, another file or an older version of the same file - are
+never sent to the embedding model again.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+
+EMBEDDING_CACHE_FILENAME = "embedding_cache.sqlite3"
+
+
+def content_hash(text):
+    """Cache key for a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Thread-safe SQLite store of float32 vectors keyed by content hash."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(content_hash TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys that are cached."""
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                part = keys[start : start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings "
+                    f"WHERE content_hash IN ({placeholders})",
+                    part,
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        return found
+
+    def put_many(self, items):
+        """Store {key: vector} pairs."""
+        rows = [(key, array("f", vector).tobytes()) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (content_hash, vector) VALUES (?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,174 @@
+"""
+Rate-aware embedding executor for bulk ingestion
+
+- token-aware batching: batches are cut by both chunk count and token budget
+- bounded async concurrency: at most N embedding requests in flight
+- client-side requests/min and tokens/min buckets (optional)
+- exponential backoff with full jitter on 429 / 5xx / timeouts; a 429
+  pauses every in-flight worker, not just the one that hit it
+"""
+
+import asyncio
+import os
+import random
+import time
+
+from app.rag.context import count_tokens
+
+# OpenAI caps one embeddings request at 300k tokens; stay well below it
+RAG_EMBED_BATCH_TOKENS = int(os.getenv("RAG_EMBED_BATCH_TOKENS", "100000"))
+# Provider limits for the key (0 = no client-side limit, rely on backoff)
+RAG_EMBED_RPM = int(os.getenv("RAG_EMBED_RPM", "0"))
+RAG_EMBED_TPM = int(os.getenv("RAG_EMBED_TPM", "0"))
+RAG_EMBED_MAX_RETRIES = int(os.getenv("RAG_EMBED_MAX_RETRIES", "6"))
+RAG_EMBED_BACKOFF_BASE = float(os.getenv("RAG_EMBED_BACKOFF_BASE", "1.0"))
+RAG_EMBED_BACKOFF_MAX = float(os.getenv("RAG_EMBED_BACKOFF_MAX", "60"))
+
+_RETRYABLE_ERRORS = ("RateLimitError", "APITimeoutError", "APIConnectionError", "Timeout")
+
+
+def token_batches(token_counts, max_tokens=RAG_EMBED_BATCH_TOKENS, max_items=64):
+    """
+    Split items with the given token counts into consecutive (start, end)
+    slices of at most `max_items` items and `max_tokens` tokens. An item
+    larger than `max_tokens` gets a batch of its own.
+    """
+    batches = []
+    start, tokens = 0, 0
+    for i, count in enumerate(token_counts):
+        if i > start and (i - start >= max_items or tokens + count > max_tokens):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += count
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _is_retryable(error):
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in _RETRYABLE_ERRORS
+
+
+def _retry_after(error):
+    """Seconds from a Retry-After header, if the provider sent one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Async token bucket refilled at `per_minute` units per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        if self.rate <= 0:
+            return
+        amount = min(amount, self.capacity)
+        # Waiters queue on the lock, so the bucket is drained in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+
+class EmbeddingExecutor:
+    """
+    Runs `embedding.aembed_documents` calls with bounded concurrency, rate
+    limits and retries. Create it inside the event loop that will use it.
+    """
+
+    def __init__(
+        self,
+        embedding,
+        concurrency=4,
+        requests_per_minute=RAG_EMBED_RPM,
+        tokens_per_minute=RAG_EMBED_TPM,
+        max_retries=RAG_EMBED_MAX_RETRIES,
+        backoff_base=RAG_EMBED_BACKOFF_BASE,
+        backoff_max=RAG_EMBED_BACKOFF_MAX,
+    ):
+        self.embedding = embedding
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._requests = RateLimiter(requests_per_minute)
+        self._tokens = RateLimiter(tokens_per_minute)
+        self._paused_until = 0.0
+
+        self.stats = {"requests": 0, "tokens": 0, "retries": 0, "rate_limited": 0}
+
+    def _backoff(self, attempt, error):
+        delay = _retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        else:
+            # Spread out workers that all got the same Retry-After
+            delay += random.uniform(0, self.backoff_base)
+        return delay
+
+    async def _wait_if_paused(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def embed(self, texts, tokens=None):
+        """Embed `texts` in one request; `tokens` is their token count, if known."""
+        if not texts:
+            return []
+        if tokens is None:
+            tokens = sum(count_tokens(t) for t in texts)
+
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                await self._wait_if_paused()
+                await self._requests.acquire(1)
+                await self._tokens.acquire(tokens)
+                try:
+                    vectors = await self.embedding.aembed_documents(texts)
+                except Exception as e:
+                    if attempt >= self.max_retries or not _is_retryable(e):
+                        raise
+                    delay = self._backoff(attempt, e)
+                    self.stats["retries"] += 1
+                    if _status_code(e) == 429 or type(e).__name__ == "RateLimitError":
+                        # Back the whole executor off, not just this request
+                        self.stats["rate_limited"] += 1
+                        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                    print(
+                        f"  Embedding request failed ({type(e).__name__}); "
+                        f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+                    )
+                else:
+                    self.stats["requests"] += 1
+                    self.stats["tokens"] += tokens
+                    return vectors
+
+            # Sleep outside the semaphore so other requests can proceed
+            attempt += 1
+            await asyncio.sleep(delay)
@@ -0,0 +1,622 @@
+"""
+Pipelined PDF ingestion used by rag_system.py
+
+    page windows -> parse pool (processes) -> embed queue
+                 -> embedding executor (asyncio thread)
+                 -> write queue -> single writer thread
+
+PDFs are read lazily a window of pages at a time, with a bounded number of
+windows and batches in flight, so memory stays flat however large a
+gazette is and its chunks land in Chroma while later pages are still
+being parsed. PDF parsing and splitting run on every core, embedding requests run with
+bounded concurrency under the provider's rate limits, and only the writer
+thread touches Chroma, the BM25 index and pdf_state.json, so per-file
+checkpoints stay consistent.
+
+Image-only PDFs go through the optional OCR stage (ocr.py) once text
+parsing is done, and their page text is split and embedded the same way.
+
+Every committed batch is durable: chunk ids are deterministic, so after an
+interrupted run the next one only embeds the chunks that never made it in.
+Chunks are written to rag_system.py's working snapshot; they become
+searchable when a file checkpoint publishes it (see `on_checkpoint`).
+"""
+
+import asyncio
+import hashlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+from app.rag.context import count_tokens
+from embedding_cache import content_hash
+from embedding_executor import RAG_EMBED_BATCH_TOKENS, EmbeddingExecutor, token_batches
+from ocr import RAG_OCR, ocr_available, ocr_pdf
+
+RAG_PARSE_WORKERS = int(os.getenv("RAG_PARSE_WORKERS", str(os.cpu_count() or 1)))
+# Pages parsed per process-pool task; bounds per-task memory on huge PDFs
+RAG_PAGES_PER_TASK = int(os.getenv("RAG_PAGES_PER_TASK", "16"))
+RAG_EMBED_CONCURRENCY = int(os.getenv("RAG_EMBED_CONCURRENCY", "4"))
+RAG_EMBED_BATCH_CHUNKS = int(os.getenv("RAG_EMBED_BATCH_CHUNKS", "64"))
+# Max embedding batches waiting in each queue (bounds memory / backpressure)
+RAG_QUEUE_BATCHES = int(os.getenv("RAG_QUEUE_BATCHES", "16"))
+
+_STOP = object()
+
+
+def make_text_splitter():
+    """Splitter shared by every ingestion path."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=2000,   # or 1500–2500
+        chunk_overlap=300,
+        separators=["\n\n", "\n", "।", ".", " ", ""],  # add Nepali sentence delimiter "।"
+    )
+
+
+def assign_chunk_ids(chunks):
+    """
+    Give each chunk a deterministic id: source + page + content hash.
+    Identical text repeated on one page gets an occurrence suffix.
+    """
+    seen = {}
+    for chunk in chunks:
+        source = str(chunk.metadata.get("source", ""))
+        page = chunk.metadata.get("page", "")
+        source_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+        content_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()[:16]
+
+        base = f"{source_hash}:{page}:{content_hash}"
+        occurrence = seen.get(base, 0)
+        seen[base] = occurrence + 1
+        chunk.id = base if occurrence == 0 else f"{base}:{occurrence}"
+    return chunks
+
+
+def iter_pdf_pages(full_path, filename, start=0, end=None):
+    """
+    Lazily yield one Document per page in [start, end), shaped like
+    PyPDFLoader's output (which extracts every page up front).
+    """
+    reader = PdfReader(full_path)
+    page_count = len(reader.pages)
+    end = page_count if end is None else min(end, page_count)
+    for page_number in range(start, end):
+        yield Document(
+            page_content=reader.pages[page_number].extract_text(),
+            metadata={"source": filename, "page": page_number},
+        )
+
+
+def parse_pages(full_path, filename, start, end):
+    """
+    Process-pool worker: load and split pages [start, end) of one PDF.
+
+    Pages are split one at a time, exactly as split_documents() would, so
+    chunks and their deterministic ids do not depend on the window size.
+    """
+    splitter = make_text_splitter()
+    chunks = []
+    for page in iter_pdf_pages(full_path, filename, start, end):
+        chunks.extend(splitter.split_documents([page]))
+    return assign_chunk_ids(chunks)
+
+
+def get_source_chunk_ids(vectorstore, source):
+    """Ids of every chunk currently stored for `source`."""
+    return set(vectorstore._collection.get(where={"source": source}, include=[])["ids"])
+
+
+def delete_source_chunks(vectorstore, bm25_index, source):
+    """Remove all chunks of `source` from Chroma and the BM25 index."""
+    ids = list(get_source_chunk_ids(vectorstore, source))
+    if ids:
+        vectorstore._collection.delete(ids=ids)
+    bm25_index.remove_source(source)
+    return len(ids)
+
+
+def rename_source_chunks(vectorstore, bm25_index, old_source, new_source):
+    """
+    Move a renamed PDF's chunks to its new filename, reusing the stored
+    embeddings instead of re-parsing and re-embedding the file.
+    """
+    stored = vectorstore._collection.get(
+        where={"source": old_source},
+        include=["documents", "metadatas", "embeddings"],
+    )
+    if not stored["ids"]:
+        return 0
+
+    chunks = [
+        Document(page_content=text, metadata={**meta, "source": new_source})
+        for text, meta in zip(stored["documents"], stored["metadatas"])
+    ]
+    assign_chunk_ids(chunks)
+
+    vectorstore._collection.upsert(
+        ids=[c.id for c in chunks],
+        embeddings=[list(v) for v in stored["embeddings"]],
+        documents=[c.page_content for c in chunks],
+        metadatas=[c.metadata for c in chunks],
+    )
+    vectorstore._collection.delete(ids=stored["ids"])
+
+    bm25_index.remove_source(old_source)
+    for chunk in chunks:
+        bm25_index.add(chunk.id, chunk.page_content, new_source)
+    return len(chunks)
+
+
+@dataclass
+class FileJob:
+    filename: str
+    fingerprint: dict
+    new_chunks: int = 0
+    stale_ids: List[str] = field(default_factory=list)
+    # Committed by an interrupted run but not yet in the saved BM25 index
+    unindexed: list = field(default_factory=list)
+    # Set once every page is parsed and new_chunks/stale_ids are final
+    complete: bool = False
+    checkpointed: bool = False
+
+
+@dataclass
+class FileStream:
+    """Parse-side progress of one PDF whose page windows are in flight."""
+
+    full_path: str
+    job: FileJob
+    page_count: int
+    existing: set
+    windows_left: int
+    current: set = field(default_factory=set)
+    chunks: int = 0
+    failed: bool = False
+
+
+@dataclass
+class ChunkBatch:
+    job: FileJob
+    chunks: list
+    tokens: int = 0
+    vectors: Optional[List[List[float]]] = None
+    error: Optional[Exception] = None
+
+
+class IngestPipeline:
+    """Parse, embed and commit a set of PDFs; see module docstring."""
+
+    def __init__(
+        self,
+        vectorstore,
+        embedding,
+        bm25_index,
+        bm25_path,
+        pdf_state,
+        state_file,
+        save_state,
+        empty_log_path="empty.txt",
+        embedding_cache=None,
+        ocr=RAG_OCR,
+        parse_workers=RAG_PARSE_WORKERS,
+        pages_per_task=RAG_PAGES_PER_TASK,
+        embed_concurrency=RAG_EMBED_CONCURRENCY,
+        batch_chunks=RAG_EMBED_BATCH_CHUNKS,
+        batch_tokens=RAG_EMBED_BATCH_TOKENS,
+        queue_batches=RAG_QUEUE_BATCHES,
+        on_checkpoint=None,
+    ):
+        self.vectorstore = vectorstore
+        self.embedding = embedding
+        self.bm25_index = bm25_index
+        self.bm25_path = bm25_path
+        self.pdf_state = pdf_state
+        self.state_file = state_file
+        self.save_state = save_state
+        self.empty_log_path = empty_log_path
+        # Called by the writer thread after each file checkpoint, while
+        # nothing else writes to the store (e.g. to publish a copy of it)
+        self.on_checkpoint = on_checkpoint
+        self.embedding_cache = embedding_cache
+        self.ocr = ocr
+        if ocr:
+            self.ocr, reason = ocr_available()
+            if not self.ocr:
+                print(f"OCR disabled: {reason}.")
+        self.parse_workers = max(1, parse_workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self.embed_concurrency = max(1, embed_concurrency)
+        self.batch_chunks = max(1, batch_chunks)
+        self.batch_tokens = max(1, batch_tokens)
+        self.executor = None
+        # Set if the embed stage itself fails; run() re-raises it
+        self._embed_error = None
+        self._embed_input_done = False
+
+        self.embed_queue = queue.Queue(maxsize=queue_batches)
+        self.write_queue = queue.Queue(maxsize=queue_batches)
+
+        # Image-only PDFs waiting for the OCR stage
+        self._ocr_pending = []
+        self._logged_empty = set()
+        if os.path.exists(empty_log_path):
+            with open(empty_log_path, "r", encoding="utf-8") as f:
+                self._logged_empty = {line.strip() for line in f if line.strip()}
+
+        # Owned by the writer thread
+        self._written = {}
+        self._failed = set()
+        # Embedding workers update the shared counters under this lock
+        self._stats_lock = threading.Lock()
+        self._expected_calls = 0
+        self.summary = {
+            "files_done": 0,
+            "files_failed": 0,
+            "files_empty": 0,
+            "files_ocr": 0,
+            "chunks_written": 0,
+            "chunks_unchanged": 0,
+            "chunks_deleted": 0,
+            "chunks_reused": 0,
+            "embedding_calls": 0,
+            "embedding_calls_saved": 0,
+            "embedding_tokens": 0,
+            "embedding_retries": 0,
+            "rate_limited": 0,
+        }
+
+    # ---------------------------------------------------------------
+    # Stage 1: parse + split (process pool, main thread schedules)
+    # ---------------------------------------------------------------
+
+    def _log_empty(self, filename, reason):
+        print(f"  {filename} {reason}. Logging to {self.empty_log_path} and skipping.")
+        if filename not in self._logged_empty:
+            with open(self.empty_log_path, "a", encoding="utf-8") as f:
+                f.write(filename + "\n")
+            self._logged_empty.add(filename)
+        self.summary["files_empty"] += 1
+
+    def _enqueue_chunks(self, job, chunks, existing):
+        """
+        Queue the chunks of one page window that are not already stored;
+        chunks already in Chroma are skipped (and re-indexed if BM25 lost them).
+        """
+        new_chunks = [c for c in chunks if c.id not in existing]
+        unchanged = len(chunks) - len(new_chunks)
+        job.new_chunks += len(new_chunks)
+        job.unindexed.extend(
+            c for c in chunks if c.id in existing and c.id not in self.bm25_index
+        )
+
+        token_counts = [count_tokens(c.page_content) for c in chunks]
+        # What a from-scratch ingest would have cost, to report calls saved
+        self._expected_calls += len(
+            token_batches(token_counts, self.batch_tokens, self.batch_chunks)
+        )
+        with self._stats_lock:
+            self.summary["chunks_unchanged"] += unchanged
+            self.summary["chunks_reused"] += unchanged
+
+        new_counts = [n for c, n in zip(chunks, token_counts) if c.id not in existing]
+        for start, end in token_batches(new_counts, self.batch_tokens, self.batch_chunks):
+            # Blocks when the embedders fall behind
+            self.embed_queue.put(
+                ChunkBatch(
+                    job=job,
+                    chunks=new_chunks[start:end],
+                    tokens=sum(new_counts[start:end]),
+                )
+            )
+
+    def _finish_job(self, job, existing, current):
+        """
+        All chunks of a file are queued: work out which stored chunks are
+        stale and send an empty marker batch so the writer can checkpoint.
+        """
+        job.stale_ids = sorted(existing - current)
+        unchanged = len(current) - job.new_chunks
+        if existing:
+            print(
+                f"  {job.filename}: {job.new_chunks} new/changed, "
+                f"{len(job.stale_ids)} stale, {unchanged} unchanged chunks."
+            )
+        job.complete = True
+        self.embed_queue.put(ChunkBatch(job=job, chunks=[]))
+
+    def _page_windows(self, files):
+        """Yield (stream, start, end) page windows, opening files lazily."""
+        for full_path, filename, fingerprint in files:
+            try:
+                page_count = len(PdfReader(full_path).pages)
+            except Exception as e:
+                # Errors are not considered "empty" PDFs → just print the error
+                print(f"Error loading {filename}: {e}")
+                self.summary["files_failed"] += 1
+                continue
+
+            if not page_count:
+                self._log_empty(filename, "has 0 pages")
+                continue
+
+            windows = range(0, page_count, self.pages_per_task)
+            stream = FileStream(
+                full_path=full_path,
+                job=FileJob(filename=filename, fingerprint=fingerprint),
+                page_count=page_count,
+                existing=get_source_chunk_ids(self.vectorstore, filename),
+                windows_left=len(windows),
+            )
+            for start in windows:
+                yield stream, start, min(start + self.pages_per_task, page_count)
+
+    def _window_done(self, stream, start, end, future):
+        filename = stream.job.filename
+        stream.windows_left -= 1
+        try:
+            chunks = future.result()
+        except Exception as e:
+            print(f"Error loading {filename} pages {start + 1}-{end}: {e}")
+            stream.failed = True
+            chunks = []
+
+        if chunks and not stream.failed:
+            stream.chunks += len(chunks)
+            stream.current.update(c.id for c in chunks)
+            self._enqueue_chunks(stream.job, chunks, stream.existing)
+
+        if stream.windows_left:
+            return
+
+        # Last window of this file
+        if stream.failed:
+            # Committed windows stay in Chroma; the next run resumes from them
+            self.summary["files_failed"] += 1
+        elif not stream.chunks:
+            if self.ocr:
+                print(f"No text layer in {filename}; queued for OCR.")
+                self._ocr_pending.append(
+                    (stream.full_path, filename, stream.job.fingerprint)
+                )
+            else:
+                self._log_empty(filename, "produced 0 chunks")
+        else:
+            print(f"Parsed {filename}: {stream.page_count} pages, {stream.chunks} chunks.")
+            self._finish_job(stream.job, stream.existing, stream.current)
+
+    def _parse_stage(self, files):
+        windows = self._page_windows(files)
+        pending = {}
+
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+
+            def submit_next():
+                item = next(windows, None)
+                if item is not None:
+                    stream, start, end = item
+                    future = pool.submit(
+                        parse_pages, stream.full_path, stream.job.filename, start, end
+                    )
+                    pending[future] = item
+
+            # Keep a couple of page windows queued per worker, not whole files
+            for _ in range(self.parse_workers * 2):
+                submit_next()
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stream, start, end = pending.pop(future)
+                    submit_next()
+                    self._window_done(stream, start, end, future)
+
+        # Scans run after the text PDFs, with the whole machine to themselves
+        self._ocr_stage()
+
+    def _ocr_stage(self):
+        for full_path, filename, fingerprint in self._ocr_pending:
+            print(f"Running OCR on {filename}...")
+            try:
+                pages = ocr_pdf(
+                    full_path,
+                    filename,
+                    file_key=fingerprint.get("sha256") or content_hash(filename),
+                    workers=self.parse_workers,
+                )
+            except Exception as e:
+                print(f"Error running OCR on {filename}: {e}")
+                self.summary["files_failed"] += 1
+                continue
+
+            chunks = assign_chunk_ids(make_text_splitter().split_documents(pages))
+            if not chunks:
+                self._log_empty(filename, "has no text even after OCR")
+                continue
+
+            print(f"OCR'd {filename}: {len(pages)} pages with text, {len(chunks)} chunks.")
+            self.summary["files_ocr"] += 1
+            job = FileJob(filename=filename, fingerprint=fingerprint)
+            existing = get_source_chunk_ids(self.vectorstore, filename)
+            self._enqueue_chunks(job, chunks, existing)
+            self._finish_job(job, existing, {c.id for c in chunks})
+
+    # ---------------------------------------------------------------
+    # Stage 2: embedding (one asyncio thread, bounded concurrent requests)
+    # ---------------------------------------------------------------
+
+    async def _embed_texts(self, texts, tokens):
+        """Embed `texts`, serving whatever it can from the embedding cache."""
+        if not texts:
+            return []
+        if self.embedding_cache is None:
+            return await self.executor.embed(texts, tokens)
+
+        keys = [content_hash(t) for t in texts]
+        vectors = self.embedding_cache.get_many(keys)
+        missing = list(dict.fromkeys(k for k in keys if k not in vectors))
+        missing_set = set(missing)
+
+        if missing:
+            text_by_key = dict(zip(keys, texts))
+            missing_texts = [text_by_key[k] for k in missing]
+            # Token count is only exact for a full miss; let the executor recount
+            fresh = await self.executor.embed(
+                missing_texts, tokens if len(missing) == len(texts) else None
+            )
+            fresh_by_key = dict(zip(missing, fresh))
+            self.embedding_cache.put_many(fresh_by_key)
+            vectors.update(fresh_by_key)
+
+        with self._stats_lock:
+            self.summary["chunks_reused"] += sum(1 for k in keys if k not in missing_set)
+
+        return [vectors[k] for k in keys]
+
+    async def _embed_batch(self, batch):
+        try:
+            batch.vectors = await self._embed_texts(
+                [c.page_content for c in batch.chunks], batch.tokens
+            )
+        except Exception as e:
+            batch.error = e
+        await asyncio.to_thread(self.write_queue.put, batch)
+
+    async def _embed_loop(self):
+        self.executor = EmbeddingExecutor(self.embedding, concurrency=self.embed_concurrency)
+        tasks = set()
+        while True:
+            batch = await asyncio.to_thread(self.embed_queue.get)
+            if batch is _STOP:
+                self._embed_input_done = True
+                break
+            # Keep a small backlog ready behind the in-flight requests
+            if len(tasks) >= self.embed_concurrency * 2:
+                _, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            tasks.add(asyncio.create_task(self._embed_batch(batch)))
+
+        if tasks:
+            await asyncio.wait(tasks)
+
+    def _embed_stage(self):
+        try:
+            asyncio.run(self._embed_loop())
+        except BaseException as e:
+            self._embed_error = e
+            # Keep the parse stage from blocking on a full embed_queue
+            while not self._embed_input_done:
+                self._embed_input_done = self.embed_queue.get() is _STOP
+        finally:
+            # Always stop the writer, or run() waits on it forever
+            self.write_queue.put(_STOP)
+
+    # ---------------------------------------------------------------
+    # Stage 3: single writer (Chroma + BM25 + pdf_state.json)
+    # ---------------------------------------------------------------
+
+    def _commit(self, batch):
+        if not batch.chunks:
+            return
+        ids = [c.id for c in batch.chunks]
+        self.vectorstore._collection.upsert(
+            ids=ids,
+            embeddings=batch.vectors,
+            documents=[c.page_content for c in batch.chunks],
+            metadatas=[c.metadata for c in batch.chunks],
+        )
+        for chunk_id, chunk in zip(ids, batch.chunks):
+            self.bm25_index.add(chunk_id, chunk.page_content, chunk.metadata.get("source"))
+        self.summary["chunks_written"] += len(ids)
+
+    def _checkpoint(self, job):
+        for chunk in job.unindexed:
+            self.bm25_index.add(chunk.id, chunk.page_content, chunk.metadata.get("source"))
+
+        # Old chunks go only after every replacement chunk is committed
+        if job.stale_ids:
+            self.vectorstore._collection.delete(ids=job.stale_ids)
+            for chunk_id in job.stale_ids:
+                self.bm25_index.remove(chunk_id)
+            self.summary["chunks_deleted"] += len(job.stale_ids)
+
+        self.bm25_index.save(self.bm25_path)
+        self.pdf_state[job.filename] = job.fingerprint
+        self.save_state(self.state_file, self.pdf_state)
+        self.summary["files_done"] += 1
+        print(f"Finished {job.filename} and updated state.")
+        if self.on_checkpoint is not None:
+            try:
+                self.on_checkpoint()
+            except Exception as e:
+                # The file itself is committed; publishing can catch up later
+                print(f"Checkpoint hook failed after {job.filename}: {e}")
+
+    def _writer(self):
+        while True:
+            batch = self.write_queue.get()
+            if batch is _STOP:
+                return
+            filename = batch.job.filename
+            if filename in self._failed:
+                continue
+
+            if batch.error is None:
+                try:
+                    self._commit(batch)
+                    written = self._written.get(filename, 0) + len(batch.chunks)
+                    self._written[filename] = written
+                    job = batch.job
+                    # complete is set once new_chunks is final; the file's
+                    # empty marker batch guarantees a check after that
+                    if job.complete and not job.checkpointed and written >= job.new_chunks:
+                        job.checkpointed = True
+                        self._checkpoint(job)
+                except Exception as e:
+                    batch.error = e
+
+            if batch.error is not None:
+                print(f"Error embedding/writing {filename}: {batch.error}")
+                self._failed.add(filename)
+                self.summary["files_failed"] += 1
+
+    # ---------------------------------------------------------------
+
+    def run(self, files):
+        """
+        Ingest `files` [(full_path, filename, fingerprint), ...], where the
+        fingerprint dict is stored as the file's pdf_state.json entry.
+        Returns a summary dict.
+        """
+        started = time.monotonic()
+
+        embedder = threading.Thread(target=self._embed_stage, daemon=True)
+        writer = threading.Thread(target=self._writer, daemon=True)
+        embedder.start()
+        writer.start()
+
+        try:
+            self._parse_stage(files)
+        finally:
+            self.embed_queue.put(_STOP)
+            embedder.join()
+            writer.join()
+        if self._embed_error is not None:
+            raise self._embed_error
+
+        if self.executor is not None:
+            self.summary["embedding_calls"] = self.executor.stats["requests"]
+            self.summary["embedding_tokens"] = self.executor.stats["tokens"]
+            self.summary["embedding_retries"] = self.executor.stats["retries"]
+            self.summary["rate_limited"] = self.executor.stats["rate_limited"]
+        self.summary["embedding_calls_saved"] = max(
+            self._expected_calls - self.summary["embedding_calls"], 0
+        )
+        self.summary["seconds"] = round(time.monotonic() - started, 1)
+        return self.summary
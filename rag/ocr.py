@@ -0,0 +1,158 @@
+"""
+OCR fallback for scanned (image-only) PDFs
+
+Pages are rendered with pdf2image (poppler) and read by Tesseract in a
+process pool, one page per task. Each page's text is cached on disk under
+RAG_OCR_CACHE_DIR, keyed by the file's content hash, so an interrupted scan
+resumes from the pages it already finished and an unchanged scan is never
+OCR'd twice.
+
+Needs the `tesseract` binary with the nep + eng traineddata, poppler, and
+`pip install pytesseract pdf2image`. Enable with RAG_OCR=1.
+"""
+
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+RAG_OCR = os.getenv("RAG_OCR", "0") == "1"
+RAG_OCR_LANG = os.getenv("RAG_OCR_LANG", "nep+eng")
+RAG_OCR_DPI = int(os.getenv("RAG_OCR_DPI", "300"))
+RAG_OCR_WORKERS = int(os.getenv("RAG_OCR_WORKERS", str(os.cpu_count() or 1)))
+RAG_OCR_CACHE_DIR = os.getenv("RAG_OCR_CACHE_DIR", "./ocr_cache")
+
+# Print progress every this many pages on long scans
+PROGRESS_EVERY = 25
+
+
+def ocr_available():
+    """Return (ok, reason) for whether the OCR toolchain is installed."""
+    try:
+        import pdf2image  # noqa: F401
+        import pytesseract  # noqa: F401
+    except ImportError as e:
+        return False, f"missing Python package ({e.name})"
+    if shutil.which("tesseract") is None:
+        return False, "tesseract binary not found on PATH"
+    if shutil.which("pdftoppm") is None:
+        return False, "poppler (pdftoppm) not found on PATH"
+    return True, ""
+
+
+def ocr_page(full_path, page_number, lang=RAG_OCR_LANG, dpi=RAG_OCR_DPI):
+    """Process-pool worker: render one page (0-based) and OCR it."""
+    import pytesseract
+    from pdf2image import convert_from_path
+
+    images = convert_from_path(
+        full_path, dpi=dpi, first_page=page_number + 1, last_page=page_number + 1
+    )
+    return "\n".join(pytesseract.image_to_string(image, lang=lang) for image in images)
+
+
+class PageCache:
+    """One text file per OCR'd page: {cache_dir}/{file_key}/{page}.{lang}.txt"""
+
+    def __init__(self, cache_dir, file_key, lang):
+        self.dir = os.path.join(cache_dir, file_key)
+        self.lang = lang
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _path(self, page_number):
+        return os.path.join(self.dir, f"{page_number:05d}.{self.lang}.txt")
+
+    def get(self, page_number):
+        try:
+            with open(self._path(page_number), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, page_number, text):
+        path = self._path(page_number)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def ocr_pdf(
+    full_path,
+    filename,
+    file_key,
+    workers=RAG_OCR_WORKERS,
+    lang=RAG_OCR_LANG,
+    dpi=RAG_OCR_DPI,
+    cache_dir=RAG_OCR_CACHE_DIR,
+):
+    """
+    OCR every page of a PDF, page-parallel, reusing cached pages.
+
+    `file_key` identifies the file's content (its sha256) in the cache.
+    Returns page Documents shaped like PyPDFLoader's, for the same splitter.
+    Raises if any page failed; finished pages stay cached for the next run.
+    """
+    page_count = len(PdfReader(full_path).pages)
+    cache = PageCache(cache_dir, file_key, lang)
+
+    texts = {}
+    todo = []
+    for page_number in range(page_count):
+        text = cache.get(page_number)
+        if text is None:
+            todo.append(page_number)
+        else:
+            texts[page_number] = text
+
+    if texts:
+        print(f"  OCR {filename}: resuming, {len(texts)}/{page_count} pages cached.")
+
+    failed = []
+    if todo:
+        todo_iter = iter(todo)
+        pending = {}
+        workers = max(1, workers)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+
+            def submit_next():
+                page_number = next(todo_iter, None)
+                if page_number is not None:
+                    future = pool.submit(ocr_page, full_path, page_number, lang, dpi)
+                    pending[future] = page_number
+
+            # Only a few rendered pages in flight per worker
+            for _ in range(workers * 2):
+                submit_next()
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page_number = pending.pop(future)
+                    submit_next()
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        print(f"  OCR {filename} page {page_number + 1} failed: {e}")
+                        failed.append(page_number)
+                        continue
+                    # Cached as soon as it is done: this is the resume checkpoint
+                    cache.put(page_number, text)
+                    texts[page_number] = text
+                    if len(texts) % PROGRESS_EVERY == 0:
+                        print(f"  OCR {filename}: {len(texts)}/{page_count} pages.")
+
+    if failed:
+        raise RuntimeError(f"OCR failed on {len(failed)} of {page_count} pages")
+
+    return [
+        Document(
+            page_content=texts[page_number],
+            metadata={"source": filename, "page": page_number, "ocr": True},
+        )
+        for page_number in range(page_count)
+        if texts[page_number].strip()
+    ]
@@ -1,45 +1,44 @@
 import os
 import sys
 import json
+import hashlib
+import shutil
+import time
+from pathlib import Path
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 
-
-def load_pdfs(filepaths):
-    """Loads PDFs but logs empty PDFs to empty.txt."""
-    documents = []
-    empty_log_path = "empty.txt"
-
-    for filepath in filepaths:
-        filename = os.path.basename(filepath)
-        print(f"Loading {filename}...")
-
-        try:
-            loader = PyPDFLoader(filepath)
-            docs = loader.load()
-
-            # If PDF parses but contains no text/pages
-            if not docs:
-                print(f"{filename} has 0 pages. Logging to {empty_log_path}")
-                with open(empty_log_path, "a", encoding="utf-8") as f:
-                    f.write(filename + "\n")
-                continue
-
-            # Normal case: attach metadata and keep
-            for d in docs:
-                d.metadata["source"] = filename
-
-            documents.extend(docs)
-
-        except Exception as e:
-            # Errors are not considered "empty" PDFs → just print the error
-            print(f"Error loading {filename}: {e}")
-
-    return documents
+# Before the imports below: their RAG_* settings are read at import time
+load_dotenv()
+
+# Shared RAG helpers live in the backend package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from app.rag.bm25 import BM25_INDEX_FILENAME, BM25Index
+from app.rag.embeddings import (
+    collection_file_path,
+    get_collection_name,
+    get_embedding_backend,
+    get_embeddings,
+)
+from app.logging_config import setup_logging
+from app.rag.snapshots import (
+    clear_building,
+    create_snapshot,
+    current_snapshot,
+    mark_building,
+    publish_snapshot,
+    read_building,
+    rollback_snapshot,
+    snapshot_path,
+)
+from embedding_cache import EMBEDDING_CACHE_FILENAME, EmbeddingCache
+from ocr import RAG_OCR
+from ingest_pipeline import IngestPipeline, delete_source_chunks, rename_source_chunks
+
+# During a run, publish the progress made so far after this many finished
+# files or seconds, whichever comes first (0 = off)
+RAG_PUBLISH_EVERY_FILES = int(os.getenv("RAG_PUBLISH_EVERY_FILES", "20"))
+RAG_PUBLISH_EVERY_SECONDS = float(os.getenv("RAG_PUBLISH_EVERY_SECONDS", "600"))
 
 
 def get_pdf_state(state_path):
@@ -62,19 +61,60 @@ def save_pdf_state(state_path, state):
 
 def get_openai_api_key() -> str:
     """Use MATE if set, otherwise fall back to OPENAI_API_KEY."""
-    key = os.getenv("RAG_KEY")
-    print(key)
-    return key
+    return os.getenv("RAG_KEY")
+
+def load_or_build_bm25_index(vectorstore, index_path, batch_size=1000):
+    """
+    Load the BM25 keyword index, or backfill it from the chunks already in
+    the vector store (stores ingested before the index existed).
+    """
+    if os.path.exists(index_path):
+        try:
+            return BM25Index.load(index_path)
+        except Exception as e:
+            print(f"BM25 index at {index_path} is unreadable ({e}); rebuilding.")
+
+    index = BM25Index()
+    offset = 0
+    while True:
+        batch = vectorstore.get(
+            include=["documents", "metadatas"], limit=batch_size, offset=offset
+        )
+        if not batch["ids"]:
+            break
+        for doc_id, text, meta in zip(
+            batch["ids"], batch["documents"], batch["metadatas"]
+        ):
+            index.add(doc_id, text or "", (meta or {}).get("source"))
+        offset += len(batch["ids"])
+
+    if len(index):
+        print(f"Backfilled BM25 index with {len(index)} existing chunks.")
+        index.save(index_path)
+    return index
+
+def file_sha256(path, block_size=1 << 20):
+    """Content hash of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
 def find_new_or_updated_pdfs(pdf_dir, state, empty_log_path="empty.txt"):
     """
-    Compare files in `pdf_dir` against recorded state.
-    Skips any PDFs listed in empty.txt.
+    Compare files in `pdf_dir` against recorded state by content hash.
+    Skips any PDFs listed in empty.txt unless RAG_OCR is on. Files whose size and mtime still
+    match their recorded entry are trusted without re-hashing.
+
+    Raises FileNotFoundError if `pdf_dir` is missing.
 
-    Returns:
-      - list of tuples: (full_path, filename, mtime)
+    Returns (new_files, renamed, touched):
+      - new_files: [(full_path, filename, fingerprint)] that need ingesting
+      - renamed:   [(old_filename, new_filename, fingerprint)] same content, new name
+      - touched:   {filename: fingerprint} same content, only mtime changed
     """
-    new_files = []
+    new_files, renamed, touched = [], [], {}
 
     # Load list of permanently skipped (empty) PDFs
     empty_skip_list = set()
@@ -82,105 +122,323 @@ def find_new_or_updated_pdfs(pdf_dir, state, empty_log_path="empty.txt"):
         with open(empty_log_path, "r", encoding="utf-8") as f:
             empty_skip_list = {line.strip() for line in f if line.strip()}
 
-    if not os.path.exists(pdf_dir):
-        print(f"Directory {pdf_dir} does not exist.")
-        return new_files
+    if not os.path.isdir(pdf_dir):
+        raise FileNotFoundError(f"PDF directory {pdf_dir} does not exist")
 
-    for filename in os.listdir(pdf_dir):
+    on_disk = set(os.listdir(pdf_dir))
+    # Hashes of recorded files that have disappeared: candidates for renames
+    missing_by_hash = {
+        entry["sha256"]: filename
+        for filename, entry in state.items()
+        if entry.get("sha256") and filename not in on_disk
+    }
+
+    for filename in sorted(on_disk):
         if not filename.lower().endswith(".pdf"):
             continue
 
-        if filename in empty_skip_list:
+        # With OCR enabled, scanned PDFs from empty.txt get another chance
+        if filename in empty_skip_list and not RAG_OCR:
             print(f"Skipping {filename} (listed in empty.txt)")
             continue
 
         full_path = os.path.join(pdf_dir, filename)
         try:
-            mtime = os.path.getmtime(full_path)
+            stat = os.stat(full_path)
         except OSError:
             continue
 
-        prev = state.get(filename)
-        if prev is None or prev.get("mtime") != mtime:
+        prev = state.get(filename) or {}
+        if (
+            prev.get("sha256")
+            and prev.get("mtime") == stat.st_mtime
+            and prev.get("size") == stat.st_size
+        ):
+            continue
+
+        fingerprint = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": file_sha256(full_path),
+        }
+
+        if prev and prev.get("sha256") == fingerprint["sha256"]:
+            touched[filename] = fingerprint
+        elif prev and not prev.get("sha256") and prev.get("mtime") == stat.st_mtime:
+            # Entry from before content hashing: record the hash, nothing to ingest
+            touched[filename] = fingerprint
+        elif not prev and fingerprint["sha256"] in missing_by_hash:
+            old_filename = missing_by_hash.pop(fingerprint["sha256"])
+            renamed.append((old_filename, filename, fingerprint))
+        else:
             # New or modified PDF
-            new_files.append((full_path, filename, mtime))
+            new_files.append((full_path, filename, fingerprint))
+
+    return new_files, renamed, touched
+
+def find_removed_pdfs(pdf_dir, state):
+    """Filenames recorded in state whose PDF no longer exists in `pdf_dir`."""
+    # A missing directory (wrong cwd, unmounted volume) must not read as
+    # "every PDF was deleted", which would publish an empty index
+    if not os.path.isdir(pdf_dir):
+        raise FileNotFoundError(f"PDF directory {pdf_dir} does not exist")
+    return [
+        filename
+        for filename in state
+        if not os.path.exists(os.path.join(pdf_dir, filename))
+    ]
+
+class CheckpointPublisher:
+    """
+    Publishes copies of the working snapshot at file checkpoints, so PDFs
+    become searchable while a long run continues. Called from the pipeline's
+    writer thread, so nothing writes to the working snapshot while it is
+    copied; Chroma replays its own write-ahead log when a copy is opened.
+    """
 
-    return new_files
+    def __init__(
+        self,
+        persist_root,
+        working_name,
+        working_dir,
+        origin,
+        exclude=(),
+        every_files=RAG_PUBLISH_EVERY_FILES,
+        every_seconds=RAG_PUBLISH_EVERY_SECONDS,
+    ):
+        self.persist_root = persist_root
+        self.working_name = working_name
+        self.working_dir = working_dir
+        # Rollbacks go back to the version the run started from
+        self.origin = origin
+        self.exclude = exclude
+        self.every_files = every_files
+        self.every_seconds = every_seconds
+        self.files = 0
+        self.last_published = time.monotonic()
+
+    def __call__(self):
+        self.files += 1
+        due = (self.every_files and self.files >= self.every_files) or (
+            self.every_seconds
+            and time.monotonic() - self.last_published >= self.every_seconds
+        )
+        if not due:
+            return
+        name, _ = create_snapshot(
+            self.persist_root, exclude=self.exclude, source=self.working_dir
+        )
+        publish_snapshot(self.persist_root, name, previous=self.origin)
+        # The working snapshot now continues from the published copy
+        mark_building(self.persist_root, self.working_name, name, self.origin)
+        self.files = 0
+        self.last_published = time.monotonic()
+        print(f"Published progress snapshot {name}.")
 
-def main():
-    load_dotenv()
 
+def main():
+    setup_logging(fmt="text")
     pdf_dir = "pdfs"
-    persist_directory = "./chroma_db"
-    state_file = "./chroma_db/pdf_state.json"
+    # Holds current.json and the versioned snapshots/ served by the APIs
+    persist_root = "./chroma_db"
     empty_log_path = "empty.txt"
 
-    print("Initializing RAG system (incremental, one-file-at-a-time)...")
+    if "--rollback" in sys.argv[1:]:
+        name = rollback_snapshot(persist_root)
+        print(f"Rolled back: serving index snapshot {name}.")
+        return
 
-    # 1. Determine which PDFs are new or changed
-    pdf_state = get_pdf_state(state_file)
-    new_files = find_new_or_updated_pdfs(pdf_dir, pdf_state)
+    print("Initializing RAG system (incremental, pipelined)...")
 
-    if not new_files and not os.path.isdir(persist_directory):
+    # Each embedding backend has its own collection, BM25 index and state file
+    backend = get_embedding_backend()
+    collection_name = get_collection_name(backend)
+    print(f"Embedding backend: {backend} (collection '{collection_name}')")
+
+    if not os.path.isdir(pdf_dir):
+        sys.exit(
+            f"PDF directory {os.path.abspath(pdf_dir)} does not exist; "
+            "aborting without touching the published index."
+        )
+
+    # 1. Continue the working snapshot of an interrupted run, unless another
+    #    version was published (or rolled back to) since
+    current_name, published_dir = current_snapshot(persist_root)
+    resume = None
+    building = read_building(persist_root)
+    if building:
+        working_dir = snapshot_path(persist_root, building["name"])
+        if building.get("base") == current_name and os.path.isdir(working_dir):
+            resume = building["name"]
+        else:
+            print(f"Discarding unfinished snapshot {building['name']} (index changed since).")
+            shutil.rmtree(working_dir, ignore_errors=True)
+            clear_building(persist_root)
+    state_dir = snapshot_path(persist_root, resume) if resume else published_dir
+
+    # 2. Determine which PDFs are new, changed or gone
+    pdf_state = get_pdf_state(
+        collection_file_path(state_dir, "pdf_state.json", collection_name)
+    )
+    new_files, renamed, touched = find_new_or_updated_pdfs(pdf_dir, pdf_state)
+    renamed_from = {old_filename for old_filename, _, _ in renamed}
+    removed = [f for f in find_removed_pdfs(pdf_dir, pdf_state) if f not in renamed_from]
+    bm25_missing = not os.path.exists(
+        collection_file_path(state_dir, BM25_INDEX_FILENAME, collection_name)
+    )
+
+    if not new_files and not os.path.isdir(persist_root):
         print("No PDFs to process and no existing vector store found. Exiting.")
         return
 
+    if not (resume or new_files or renamed or touched or removed or bm25_missing):
+        print("No new, changed or removed PDFs. The published index is up to date.")
+        return
+
     if new_files:
         print(f"Found {len(new_files)} new/updated PDF(s):")
         for _, filename, _ in new_files:
             print(f" - {filename}")
+    elif renamed:
+        print(f"Found {len(renamed)} renamed PDF(s); no new content to embed.")
     else:
         print("No new or updated PDFs. Using existing vector store only.")
 
-    embedding = OpenAIEmbeddings(
-        model="text-embedding-3-small",
-        api_key=get_openai_api_key()
+    # 3. Build the new version in a working copy; the APIs serve the published
+    #    snapshot, plus progress copies published at file checkpoints
+    exclude = (os.path.splitext(EMBEDDING_CACHE_FILENAME)[0] + "*",)
+    if resume:
+        snapshot_name, persist_directory = resume, state_dir
+        origin = building.get("origin", current_name)
+        print(f"Resuming index snapshot {snapshot_name} of an interrupted run...")
+    else:
+        snapshot_name, persist_directory = create_snapshot(persist_root, exclude=exclude)
+        origin = current_name
+        mark_building(persist_root, snapshot_name, current_name, origin)
+        print(f"Building index snapshot {snapshot_name}...")
+    publisher = CheckpointPublisher(
+        persist_root, snapshot_name, persist_directory, origin, exclude=exclude
     )
+    try:
+        update_snapshot(
+            persist_directory,
+            persist_root,
+            backend,
+            collection_name,
+            pdf_state,
+            new_files,
+            renamed,
+            touched,
+            removed,
+            empty_log_path,
+            on_checkpoint=publisher,
+        )
+    except BaseException:
+        # Committed batches stay in the working snapshot for the next run
+        print(f"\nIngestion stopped; the next run continues snapshot {snapshot_name}.")
+        raise
+
+    publish_snapshot(persist_root, snapshot_name, previous=origin)
+    clear_building(persist_root)
+    print(f"\nPublished index snapshot {snapshot_name}.")
+    print("\nRAG System Ready! (Vector store updated.)\n")
+
+
+def update_snapshot(
+    persist_directory,
+    persist_root,
+    backend,
+    collection_name,
+    pdf_state,
+    new_files,
+    renamed,
+    touched,
+    removed,
+    empty_log_path,
+    on_checkpoint=None,
+):
+    """Apply renames, removals and new/changed PDFs to the working snapshot."""
+    state_file = collection_file_path(persist_directory, "pdf_state.json", collection_name)
+
+    api_key = get_openai_api_key() if backend == "openai" else None
+    embedding = get_embeddings(backend, api_key=api_key)
 
     # This will load existing DB if present, or create a new empty one
     vectorstore = Chroma(
+        collection_name=collection_name,
         persist_directory=persist_directory,
         embedding_function=embedding,
     )
 
-    # 3. Process each new/changed PDF ONE BY ONE
+    # Keyword (BM25) index over the same chunks, used for hybrid retrieval
+    bm25_path = collection_file_path(persist_directory, BM25_INDEX_FILENAME, collection_name)
+    bm25_index = load_or_build_bm25_index(vectorstore, bm25_path)
+
+    # Renamed PDFs: move their chunks (and stored embeddings) to the new name
+    for old_filename, filename, fingerprint in renamed:
+        moved = rename_source_chunks(vectorstore, bm25_index, old_filename, filename)
+        print(f"Renamed {old_filename} -> {filename} ({moved} chunks reused).")
+        del pdf_state[old_filename]
+        pdf_state[filename] = fingerprint
+        bm25_index.save(bm25_path)
+        save_pdf_state(state_file, pdf_state)
+
+    # Unchanged content with a new mtime only needs its state refreshed
+    if touched:
+        print(f"{len(touched)} PDF(s) touched but unchanged; skipping re-ingest.")
+        pdf_state.update(touched)
+        save_pdf_state(state_file, pdf_state)
+
+    # Drop chunks of PDFs that were deleted from the corpus
+    for filename in removed:
+        deleted = delete_source_chunks(vectorstore, bm25_index, filename)
+        print(f"Removed {deleted} chunks of deleted PDF {filename}.")
+        del pdf_state[filename]
+        bm25_index.save(bm25_path)
+        save_pdf_state(state_file, pdf_state)
+
+    # Parse new/changed PDFs in parallel, embed in batches, commit per file
     if new_files:
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=2000,   # or 1500–2500
-            chunk_overlap=300,
-            separators=["\n\n", "\n", "।", ".", " ", ""],  # add Nepali sentence delimiter "।"
+        embedding_cache = EmbeddingCache(
+            # Shared by every snapshot
+            collection_file_path(persist_root, EMBEDDING_CACHE_FILENAME, collection_name)
         )
-
-
-        for full_path, filename, mtime in new_files:
-            print(f"\n Processing file: {filename}")
-
-            documents = load_pdfs([full_path])
-            if not documents:
-                print(f"Skipping {filename}: no documents loaded.")
-                continue
-
-            print(f"Loaded {len(documents)} pages from {filename}.")
-
-            splits = text_splitter.split_documents(documents)
-            print(f"Split {filename} into {len(splits)} chunks.")
-
-            # If there are no chunks (e.g. scanned/image-only PDF), skip and log
-            if not splits:
-                print(f"  {filename} produced 0 chunks. Logging to {empty_log_path} and skipping.")
-                with open(empty_log_path, "a", encoding="utf-8") as f:
-                    f.write(filename + "\n")
-                continue  # do NOT call add_documents
-
-            print(f"Adding chunks for {filename} to vector store...")
-            vectorstore.add_documents(splits)
-
-            # Update state for THIS file only and save
-            pdf_state[filename] = {"mtime": mtime}
-            save_pdf_state(state_file, pdf_state)
-            print(f"Finished {filename} and updated state.")
-
-    print("\nRAG System Ready! (Vector store updated.)\n")
+        pipeline = IngestPipeline(
+            vectorstore=vectorstore,
+            embedding=embedding,
+            bm25_index=bm25_index,
+            bm25_path=bm25_path,
+            pdf_state=pdf_state,
+            state_file=state_file,
+            save_state=save_pdf_state,
+            empty_log_path=empty_log_path,
+            embedding_cache=embedding_cache,
+            on_checkpoint=on_checkpoint,
+        )
+        try:
+            summary = pipeline.run(new_files)
+        finally:
+            embedding_cache.close()
+        print(
+            f"\nIngested {summary['files_done']} file(s), "
+            f"{summary['chunks_written']} chunks written, "
+            f"{summary['chunks_unchanged']} unchanged, "
+            f"{summary['chunks_deleted']} stale removed in {summary['seconds']}s "
+            f"({summary['files_ocr']} via OCR, {summary['files_empty']} empty, "
+            f"{summary['files_failed']} failed)."
+        )
+        print(
+            f"Reused {summary['chunks_reused']} chunk embeddings "
+            f"({summary['embedding_calls']} embedding calls made, "
+            f"{summary['embedding_calls_saved']} saved)."
+        )
+        if summary["embedding_calls"]:
+            print(
+                f"Embedded {summary['embedding_tokens']} tokens "
+                f"(~{summary['embedding_tokens'] / max(summary['seconds'], 0.1):.0f} tokens/s), "
+                f"{summary['embedding_retries']} retries, "
+                f"{summary['rate_limited']} rate-limited responses."
+            )
 
 
 if __name__ == "__main__":